@@ -1,14 +1,17 @@
 # app.py
 import os
+import json
+import time
 import uuid
-import shutil
+import asyncio
+import functools
 import logging
-from pathlib import Path
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from typing import Dict, Optional, List, Any
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse
 
 load_dotenv()
 
@@ -17,24 +20,62 @@ GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 if not GOOGLE_API_KEY:
     raise ValueError("GOOGLE_API_KEY environment variable not found. Please set it in your .env file.")
 
-from summarizer import generate_document_summary, extract_last_date, predict_department
-from models import SummaryResponse, KmrlDocSummary, LastDateResponse, ChatRequest, DepartmentPredictionResponse
+from summarizer import agenerate_document_summary, aextract_last_date, apredict_department, warm_up_chains
+from models import SummaryResponse, KmrlDocSummary, LastDateResponse, ChatRequest, AttachDocumentRequest, DepartmentPredictionResponse, AnalyzeResponse
 from utils import extract_text_from_pdf
-from modules.chunking import file_to_chunks
+from modules.chunking import SUPPORTED, DocumentSource, iter_file_pages, pages_to_chunks
+from modules.artifact_store import get_artifact_store
+from modules.chunk_manifest import build_manifest, diff_manifests, legacy_manifest
+from modules.uploads import read_upload
+from modules.ingest_jobs import IngestJob, IngestQueueFull, get_ingest_job_manager
 from modules.embedding_store import (
-    USE_PINECONE,
+    VECTOR_BACKEND,
     upsert_chunks_to_pinecone,
+    fetch_vectors,
+    delete_vectors,
     PINECONE_INDEX_NAME,
+    EMBED_BATCH_SIZE,
+    EMBED_CONCURRENCY,
+    EMBEDDING_DIM,
+)
+from modules.lexical_index import get_lexical_index
+from modules.retriever import aanswer_query, astream_answer_query, get_llm
+from modules.concurrency import run_cpu, run_blocking
+from modules.session_store import get_session_store
+from modules.rate_limiter import CircuitOpenError, is_retryable, limiter_stats
+from modules.namespace_registry import (
+    NAMESPACE_IDLE_TTL_SECONDS,
+    NAMESPACE_MAX_TOTAL_VECTORS,
+    NAMESPACE_SWEEP_INTERVAL_SECONDS,
+    get_namespace_registry,
+    sweep_namespaces,
 )
-from modules.retriever import answer_query
-from modules.chatbot import init_chat, add_user_message, add_bot_message
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-db_session: Dict[str, dict] = {}
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the model clients and LLM chains before the first request instead of during it
+    elapsed = await run_cpu(warm_up_chains, GOOGLE_API_KEY)
+    await run_cpu(get_llm)
+    logger.info(f"Warmed up LLM chains in {elapsed * 1000:.0f} ms")
+    sweeper = asyncio.create_task(_sweep_namespaces_forever())
+    yield
+    sweeper.cancel()
+
+async def _sweep_namespaces_forever():
+    # Expires idle vector namespaces so the index (and query latency) stays bounded
+    registry = get_namespace_registry()
+    while True:
+        try:
+            await run_blocking("vector", sweep_namespaces, registry)
+        except Exception as e:
+            logger.error(f"Namespace sweep failed: {e}", exc_info=True)
+        await asyncio.sleep(NAMESPACE_SWEEP_INTERVAL_SECONDS)
+
+app = FastAPI(lifespan=lifespan)
 
 origins = ["*"]
 app.add_middleware(
@@ -49,67 +90,348 @@ app.add_middleware(
 def read_root():
     return {"message": "Welcome to LegalDoc-GenAI FastAPI backend!"}
 
+def _ingest_document(doc_hash: str, filename: str, source: DocumentSource, job: Optional[IngestJob] = None) -> dict:
+    """Extracts, chunks, embeds and stores a new document under its content-hash namespace."""
+    # Marks the namespace as in use, in case a stale registry entry for it is about to expire
+    get_namespace_registry().touch(doc_hash)
+    text, chunks, chunk_metadatas = pages_to_chunks(iter_file_pages(source, filename))
+    if not chunks:
+        raise ValueError("The document is empty or could not be processed.")
+    if job:
+        job.set_total(len(chunks))
+
+    embed_requests = -(-len(chunks) // EMBED_BATCH_SIZE)
+    print(f"Processing {len(chunks)} chunks in {embed_requests} embedding requests ({EMBED_CONCURRENCY} in flight)")
+
+    # Vector IDs come from the chunk text, so a later revision can be diffed against this manifest
+    manifest = build_manifest(chunks, [{"source": filename, **meta} for meta in chunk_metadatas])
+    metadatas = [{"chunk_id": entry["id"], **entry["metadata"]} for entry in manifest]
+    namespace = doc_hash
+
+    # Embeds in concurrent batched requests, upserting each batch as soon as it is embedded
+    vector_ids = upsert_chunks_to_pinecone(
+        chunks, metadatas=metadatas, index_name=PINECONE_INDEX_NAME, namespace=namespace,
+        on_progress=job.progress if job else None
+    )
+    # BM25 index over the same chunks for hybrid retrieval
+    get_lexical_index().build(namespace, vector_ids, chunks, metadatas)
+
+    artifact_store = get_artifact_store()
+    artifact_store.save_document(doc_hash, filename, text, chunks, vector_ids, namespace, manifest=manifest)
+    get_namespace_registry().register(namespace, len(vector_ids), source=filename, doc_hash=doc_hash)
+    return artifact_store.get_document(doc_hash)
+
+def _reindex_document(previous: dict, doc_hash: str, filename: str, source: DocumentSource, job: IngestJob) -> dict:
+    """
+    Re-indexes a revised document in its earlier version's namespace: only new
+    chunks are embedded, chunks that merely moved are upserted again with their
+    stored vectors and new metadata, and removed chunks are deleted.
+    """
+    get_namespace_registry().touch(previous["namespace"])
+    text, chunks, chunk_metadatas = pages_to_chunks(iter_file_pages(source, filename))
+    if not chunks:
+        raise ValueError("The document is empty or could not be processed.")
+
+    artifact_store = get_artifact_store()
+    namespace = previous["namespace"]
+    old_manifest = artifact_store.load_manifest(previous["doc_hash"])
+    if old_manifest is None:
+        old_manifest = legacy_manifest(artifact_store.load_chunks(previous["doc_hash"]), previous["vector_ids"])
+    manifest = build_manifest(chunks, [{"source": filename, **meta} for meta in chunk_metadatas], previous=old_manifest)
+    diff = diff_manifests(old_manifest, manifest)
+    changed = diff["added"] + diff["moved"]
+    job.set_total(len(changed))
+
+    stored = fetch_vectors([entry["id"] for entry in diff["moved"]], index_name=PINECONE_INDEX_NAME, namespace=namespace)
+    embedded = len(changed) - len(stored)
+    print(f"Revision of {previous['doc_hash'][:12]}: {len(diff['added'])} added, {len(diff['moved'])} moved, "
+          f"{len(diff['unchanged'])} unchanged, {len(diff['removed'])} removed chunks; embedding {embedded}")
+    position = {entry["id"]: i for i, entry in enumerate(manifest)}
+    upsert_chunks_to_pinecone(
+        [chunks[position[entry["id"]]] for entry in changed],
+        metadatas=[{"chunk_id": entry["id"], **entry["metadata"]} for entry in changed],
+        index_name=PINECONE_INDEX_NAME, namespace=namespace, on_progress=job.progress, vectors=stored
+    )
+    # Deleted after the upserts, so no chunk of the document is ever missing from the namespace
+    delete_vectors([entry["id"] for entry in diff["removed"]], index_name=PINECONE_INDEX_NAME, namespace=namespace)
+
+    vector_ids = [entry["id"] for entry in manifest]
+    metadatas = [{"chunk_id": entry["id"], **entry["metadata"]} for entry in manifest]
+    get_lexical_index().build(namespace, vector_ids, chunks, metadatas)
+    artifact_store.save_document(doc_hash, filename, text, chunks, vector_ids, namespace, manifest=manifest)
+    artifact_store.replace_document(previous["doc_hash"], doc_hash)
+    get_namespace_registry().register(namespace, len(vector_ids), source=filename, doc_hash=doc_hash)
+
+    job.diff = {
+        "total_chunks": len(manifest),
+        "added": len(diff["added"]),
+        "moved": len(diff["moved"]),
+        "unchanged": len(diff["unchanged"]),
+        "removed": len(diff["removed"]),
+        "chunks_embedded": embedded,
+        "embedding_requests": -(-embedded // EMBED_BATCH_SIZE),
+    }
+    return artifact_store.get_document(doc_hash)
+
+def _ensure_lexical_index(document: dict):
+    """Builds the BM25 index for documents ingested before hybrid retrieval existed."""
+    lexical_index = get_lexical_index()
+    if lexical_index.get(document["namespace"]) is not None:
+        return
+    chunks = get_artifact_store().load_chunks(document["doc_hash"])
+    if chunks and len(chunks) == len(document["vector_ids"]):
+        metadatas = [{"source": document["filename"], "chunk_id": chunk_id} for chunk_id in document["vector_ids"]]
+        lexical_index.build(document["namespace"], document["vector_ids"], chunks, metadatas)
+
+def _namespaces_for(conversation_id: str) -> List[str]:
+    """Namespaces of the documents attached to a conversation; each document has one, the content hash of its first version."""
+    namespaces = get_artifact_store().namespaces_for_conversation(conversation_id)
+    if not namespaces:
+        session_data = get_session_store().get(conversation_id) or {}
+        # Conversations created before content-hash namespaces used their own ID
+        namespaces = [session_data.get("namespace") or conversation_id]
+    registry = get_namespace_registry()
+    for namespace in namespaces:
+        registry.touch(namespace)
+    return namespaces
+
+def _ensure_indexed(conversation_id: str, namespaces: List[str]):
+    """
+    Rejects questions while any attached document's ingestion job has not
+    finished yet, or when one failed, rather than answering without it.
+    """
+    manager = get_ingest_job_manager()
+    jobs = [job for job in (manager.active_for(namespace) for namespace in namespaces) if job is not None]
+    if jobs:
+        raise HTTPException(
+            status_code=409,
+            detail={"message": "The document is still being indexed.", "jobs": [job.to_dict() for job in jobs]}
+        )
+    # A finished job saves its document before it stops being active, so anything unindexed now has failed
+    failed = get_artifact_store().unindexed_documents(conversation_id)
+    if failed:
+        jobs = [job for job in (manager.last_for(doc_hash) for doc_hash in failed) if job is not None]
+        raise HTTPException(
+            status_code=409,
+            detail={
+                "message": "A document of this conversation could not be indexed; upload it again or detach it.",
+                "document_ids": failed,
+                "jobs": [job.to_dict() for job in jobs],
+            }
+        )
+
+def _check_file_type(filename: Optional[str]):
+    """Rejects unsupported uploads before a job is queued for them."""
+    ext = os.path.splitext(filename or "")[1].lower()
+    if ext not in SUPPORTED:
+        raise HTTPException(status_code=400, detail=f"Unsupported file type: {ext or 'none'}. Supported types: {', '.join(SUPPORTED)}")
+
+def _attach_upload(conversation_id: Optional[str], doc_hash: str):
+    """Attaches an uploaded document to its conversation, starting one if needed; returns (conversation_id, document_ids)."""
+    if not conversation_id:
+        conversation_id = str(uuid.uuid4())
+        get_session_store().create(conversation_id, namespace=doc_hash)
+    artifact_store = get_artifact_store()
+    artifact_store.attach_conversation(conversation_id, doc_hash)
+    return conversation_id, artifact_store.documents_for_conversation(conversation_id)
+
 @app.post("/upload-and-build/")
-async def upload_and_build_db(file: UploadFile = File(...)):
-    global db_session
-    
-    filepath = Path("data") / file.filename
-    filepath.parent.mkdir(parents=True, exist_ok=True)
-    
-    with open(filepath, "wb") as f:
-        shutil.copyfileobj(file.file, f)
+async def upload_and_build_db(response: Response, file: UploadFile = File(...), conversation_id: Optional[str] = Form(None)):
+    """
+    Starts indexing a document in the background and returns at once with
+    its conversation ID and a job ID; poll /ingest-jobs/{job_id} for progress.
+    Documents already indexed are reused without a job. With a
+    conversation_id the document is added to that conversation instead of
+    starting a new one.
+    """
+    _check_file_type(file.filename)
+    # Parsed from memory (or an anonymous spool file for very large uploads), never under the client's filename
+    upload = await read_upload(file)
+    doc_hash = upload.content_hash
 
     try:
-        # Generate chunks
-        chunks = file_to_chunks(str(filepath))
-        if not chunks:
-            raise HTTPException(status_code=400, detail="The document is empty or could not be processed.")
-        
-        # Estimate processing time for user
-        estimated_time_minutes = len(chunks) * 4.1 / 60  # 4.1 seconds per chunk
-        print(f"Processing {len(chunks)} chunks. Estimated time: {estimated_time_minutes:.1f} minutes")
-        
-        # Check if chunk count exceeds reasonable free tier usage
-        if len(chunks) > 200:
-            print(f"Warning: {len(chunks)} chunks will take ~{estimated_time_minutes:.0f} minutes to process with free tier limits")
-        
-        metadatas = [{"source": file.filename, "chunk_id": str(uuid.uuid4())} for _ in range(len(chunks))]
-        conversation_id = str(uuid.uuid4())
+        document = await run_blocking("io", get_artifact_store().get_document, doc_hash)
+        job = None
+        if document is not None:
+            print(f"Reusing index for identical document {doc_hash[:12]} ({document['chunk_count']} chunks)")
+            await run_blocking("io", get_namespace_registry().touch, document["namespace"])
+            await run_blocking("io", _ensure_lexical_index, document)
+            upload.close()
+        else:
+            # The spooled upload (if any) is removed once the job no longer needs it
+            job = get_ingest_job_manager().submit(
+                doc_hash, upload.filename,
+                functools.partial(_ingest_document, doc_hash, upload.filename, upload.source),
+                on_done=upload.close
+            )
+    except IngestQueueFull as e:
+        upload.close()
+        raise HTTPException(status_code=503, detail=f"Ingestion queue is full, please retry later: {e}")
+    except Exception as e:
+        upload.close()
+        raise HTTPException(status_code=500, detail=f"Error processing file: {e}")
 
-        # This will now use Google GenAI embeddings with proper rate limiting
-        upsert_chunks_to_pinecone(chunks, metadatas=metadatas, index_name=PINECONE_INDEX_NAME, namespace=conversation_id)
-        
-        db_session[conversation_id] = {
-            "chat_history": init_chat()
-        }
+    # The namespace is the content hash, so the conversation can be set up before indexing finishes
+    conversation_id, document_ids = await run_blocking("io", _attach_upload, conversation_id, doc_hash)
 
+    if job is not None:
+        response.status_code = 202
         return {
-            "message": f"Successfully processed {len(chunks)} chunks and built the vector DB using Google GenAI embeddings.",
+            "message": "Document accepted; indexing runs in the background.",
             "conversation_id": conversation_id,
-            "chunks_count": len(chunks),
+            "document_id": doc_hash,
+            "document_ids": document_ids,
+            "reused_existing_index": False,
+            "job_id": job.job_id,
+            "status_url": f"/ingest-jobs/{job.job_id}",
+            "status": job.status,
+            "chunks_count": None,
             "embedding_model": "Google text-embedding-004",
-            "embedding_dimension": 3072
+            "embedding_dimension": EMBEDDING_DIM
         }
-        
-    except Exception as e:
-        # More specific error handling
-        error_msg = str(e)
-        if "quota" in error_msg.lower() or "rate limit" in error_msg.lower():
-            raise HTTPException(
-                status_code=429, 
-                detail=f"Google API rate limit exceeded. Please try again later. Original error: {error_msg}"
-            )
-        elif "api key" in error_msg.lower():
-            raise HTTPException(
-                status_code=401, 
-                detail="Invalid Google API key. Please check your GOOGLE_API_KEY environment variable."
-            )
-        else:
-            raise HTTPException(status_code=500, detail=f"Error processing file: {error_msg}")
-    finally:
-        # Clean up uploaded file
-        if filepath.exists():
-            os.remove(filepath)
+
+    chunks_count = document["chunk_count"]
+    return {
+        "message": f"Successfully processed {chunks_count} chunks and built the vector DB using Google GenAI embeddings.",
+        "conversation_id": conversation_id,
+        "document_id": doc_hash,
+        "document_ids": document_ids,
+        "reused_existing_index": True,
+        "job_id": None,
+        "status_url": None,
+        "status": "succeeded",
+        "chunks_count": chunks_count,
+        "embedding_model": "Google text-embedding-004",
+        "embedding_dimension": EMBEDDING_DIM
+    }
+
+@app.get("/ingest-jobs/{job_id}")
+async def ingest_job_status(job_id: str):
+    """Progress of a background ingestion job: chunks embedded and upserted, ETA and error."""
+    job = get_ingest_job_manager().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job ID (jobs are kept in memory by a single server worker).")
+    status = job.to_dict()
+    if job.status == "failed":
+        error = (job.error or "").lower()
+        if "quota" in error or "rate limit" in error:
+            status["error_hint"] = "Google API rate limit exceeded. Please try again later."
+        elif "suspended after repeated failures" in error:
+            status["error_hint"] = "Google API is failing repeatedly, so calls are paused. Please try again later."
+        elif "api key" in error:
+            status["error_hint"] = "Invalid Google API key. Please check your GOOGLE_API_KEY environment variable."
+    return status
+
+@app.post("/documents/{document_id}/revisions")
+async def revise_document(response: Response, document_id: str, file: UploadFile = File(...)):
+    """
+    Re-indexes a new version of an indexed document (a corrigendum or an
+    amended tender) in the background. Only chunks whose text changed are
+    embedded and stale ones are deleted; the job's "diff" reports the counts
+    once it is done. Conversations on the old version move to the new one.
+    """
+    artifact_store = get_artifact_store()
+    manager = get_ingest_job_manager()
+    previous = await run_blocking("io", artifact_store.get_document, document_id)
+    if previous is None:
+        raise HTTPException(status_code=404, detail="Unknown document ID, or the document is still being indexed.")
+    active = manager.active_for(previous["namespace"])
+    if active is not None:
+        raise HTTPException(
+            status_code=409,
+            detail={"message": "A revision of this document is already being indexed.", "jobs": [active.to_dict()]}
+        )
+
+    _check_file_type(file.filename)
+    upload = await read_upload(file)
+    doc_hash = upload.content_hash
+    if doc_hash == document_id:
+        upload.close()
+        return {"message": "The revision is identical to the indexed document.", "document_id": document_id,
+                "replaces": None, "job_id": None, "status_url": None, "status": "succeeded"}
+    if manager.active_for(doc_hash) is not None or await run_blocking("io", artifact_store.get_document, doc_hash) is not None:
+        upload.close()
+        raise HTTPException(status_code=409, detail="This version is already indexed as a separate document; attach it to conversations instead.")
+
+    try:
+        job = manager.submit(
+            doc_hash, upload.filename,
+            functools.partial(_reindex_document, previous, doc_hash, upload.filename, upload.source),
+            on_done=upload.close, namespace=previous["namespace"], replaces=document_id
+        )
+    except IngestQueueFull as e:
+        upload.close()
+        raise HTTPException(status_code=503, detail=f"Ingestion queue is full, please retry later: {e}")
+    if job.document_id != doc_hash:
+        raise HTTPException(
+            status_code=409,
+            detail={"message": "A revision of this document is already being indexed.", "jobs": [job.to_dict()]}
+        )
+
+    response.status_code = 202
+    return {
+        "message": "Revision accepted; changed chunks are re-indexed in the background.",
+        "document_id": doc_hash,
+        "replaces": document_id,
+        "job_id": job.job_id,
+        "status_url": f"/ingest-jobs/{job.job_id}",
+        "status": job.status,
+    }
+
+# --- Conversation documents ---
+
+def _document_status(doc_hash: str) -> Optional[dict]:
+    """An attached document as an indexed artifact or a running ingestion job; None if unknown."""
+    document = get_artifact_store().get_document(doc_hash)
+    if document is not None:
+        status = {"document_id": doc_hash, "filename": document["filename"], "chunks_count": document["chunk_count"], "status": "indexed"}
+        job = get_ingest_job_manager().active_for(document["namespace"])
+        if job is not None and job.replaces == doc_hash:
+            status.update(status="revising", job_id=job.job_id)
+        return status
+    job = get_ingest_job_manager().active_for(doc_hash)
+    if job is not None:
+        return {"document_id": doc_hash, "filename": job.filename, "chunks_count": job.total_chunks, "status": "indexing", "job_id": job.job_id}
+    return None
+
+async def _conversation_documents(conversation_id: str) -> dict:
+    doc_hashes = await run_blocking("io", get_artifact_store().documents_for_conversation, conversation_id)
+    documents = [await run_blocking("io", _document_status, doc_hash) for doc_hash in doc_hashes]
+    return {"conversation_id": conversation_id, "documents": [d for d in documents if d is not None]}
+
+@app.get("/conversations/{conversation_id}/documents")
+async def list_conversation_documents(conversation_id: str):
+    """Documents a conversation's questions are answered from."""
+    return await _conversation_documents(conversation_id)
+
+@app.post("/conversations/{conversation_id}/documents")
+async def attach_conversation_document(conversation_id: str, request: AttachDocumentRequest):
+    """
+    Adds an already uploaded document to a conversation, so questions search
+    all of its documents together. Nothing is embedded again.
+    """
+    if await run_blocking("io", _document_status, request.document_id) is None:
+        raise HTTPException(status_code=404, detail="Unknown document ID; upload the document first.")
+    await run_blocking("io", get_artifact_store().attach_conversation, conversation_id, request.document_id)
+    return await _conversation_documents(conversation_id)
+
+@app.delete("/conversations/{conversation_id}/documents/{document_id}")
+async def detach_conversation_document(conversation_id: str, document_id: str):
+    attached = await run_blocking("io", get_artifact_store().documents_for_conversation, conversation_id)
+    if attached == [document_id]:
+        raise HTTPException(status_code=409, detail="A conversation needs at least one document; start a new conversation instead.")
+    if not await run_blocking("io", get_artifact_store().detach_conversation, conversation_id, document_id):
+        raise HTTPException(status_code=404, detail="The document is not attached to this conversation.")
+    return await _conversation_documents(conversation_id)
+
+
+def _upstream_error(e: Exception, detail: str) -> HTTPException:
+    """503 when Gemini is throttling or unavailable even after retries, 500 otherwise."""
+    if isinstance(e, CircuitOpenError):
+        return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(int(e.retry_after) + 1)})
+    if is_retryable(e):
+        return HTTPException(status_code=503, detail=f"Google API is rate limiting or unavailable, please retry later: {e}")
+    return HTTPException(status_code=500, detail=detail)
 
 @app.post("/chat/")
 async def chat_with_docs(request: ChatRequest):
@@ -119,48 +441,103 @@ async def chat_with_docs(request: ChatRequest):
     if not conversation_id:
         raise HTTPException(status_code=400, detail="Missing conversation ID.")
 
-    # If chat history is missing (e.g., after restart), create a fresh one
-    if conversation_id not in db_session:
-        db_session[conversation_id] = {"chat_history": init_chat()}
+    namespaces = await run_blocking("io", _namespaces_for, conversation_id)
+    await run_blocking("io", _ensure_indexed, conversation_id, namespaces)
 
-    session_data = db_session[conversation_id]
-    add_user_message(session_data["chat_history"], query)
+    # Starts a fresh history if the conversation is unknown or has expired
+    session_store = await run_blocking("io", get_session_store)
+    chat_history = await run_blocking("io", session_store.append_message, conversation_id, "user", query)
 
     try:
-        # 🔑 always query Pinecone using namespace = conversation_id
-        answer = answer_query(
+        # 🔑 query the namespaces of the documents attached to this conversation
+        answer = await aanswer_query(
             query,
-            conversation_id=conversation_id
+            namespaces=namespaces,
+            chat_history=chat_history[:-1]
         )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Internal error: {e}")
+        raise _upstream_error(e, f"Internal error: {e}")
 
-    add_bot_message(session_data["chat_history"], answer)
+    chat_history = await run_blocking("io", session_store.append_message, conversation_id, "bot", answer)
 
     return {
         "conversation_id": conversation_id,
         "answer": answer,
-        "chat_history": session_data["chat_history"]
+        "chat_history": chat_history
     }
 
 
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+@app.post("/chat/stream/")
+async def chat_with_docs_stream(request: ChatRequest):
+    """
+    Server-Sent Events variant of /chat/. Emits a `context` event with the
+    retrieved chunk metadata, `token` events as the answer is generated, and a
+    final `done` event with the full answer and chat history.
+    """
+    conversation_id = request.conversation_id
+    query = request.query
+
+    if not conversation_id:
+        raise HTTPException(status_code=400, detail="Missing conversation ID.")
+
+    namespaces = await run_blocking("io", _namespaces_for, conversation_id)
+    await run_blocking("io", _ensure_indexed, conversation_id, namespaces)
+
+    session_store = await run_blocking("io", get_session_store)
+    history = (await run_blocking("io", session_store.append_message, conversation_id, "user", query))[:-1]
+
+    async def event_stream():
+        parts: List[str] = []
+        try:
+            async for event in astream_answer_query(query, namespaces=namespaces, chat_history=history):
+                if event["type"] == "token":
+                    parts.append(event["text"])
+                    yield _sse("token", {"text": event["text"]})
+                else:
+                    yield _sse(event["type"], {"sources": event["sources"]})
+        except Exception as e:
+            logger.error(f"Error while streaming chat answer: {e}", exc_info=True)
+            yield _sse("error", {"detail": f"Internal error: {e}"})
+            return
+
+        # Record the answer only once the stream has completed
+        answer = "".join(parts)
+        chat_history = await run_blocking("io", session_store.append_message, conversation_id, "bot", answer)
+        yield _sse("done", {
+            "conversation_id": conversation_id,
+            "answer": answer,
+            "chat_history": chat_history
+        })
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 
 # --- Summarizer Endpoints ---
 
 @app.post("/summarize/", response_model=SummaryResponse)
-async def summarize_document(file: UploadFile = File(...), language: str = Form(...), department: str = Form(...)):
-    file_location = f"temp/{file.filename}"
-    Path(file_location).parent.mkdir(parents=True, exist_ok=True)
-    
-    try:
-        with open(file_location, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+async def summarize_document(
+    file: UploadFile = File(...),
+    language: str = Form(...),
+    department: str = Form(...),
+    regenerate: bool = Form(False),
+):
+    upload = await read_upload(file)
 
-        document_content = extract_text_from_pdf(file_location)
+    try:
+        document_content = await run_cpu(extract_text_from_pdf, upload.source)
         if not document_content:
             raise HTTPException(status_code=400, detail="Could not extract text from the document.")
 
-        summary_result: KmrlDocSummary = generate_document_summary(document_content, language, department, GOOGLE_API_KEY)
+        summary_result: KmrlDocSummary = await agenerate_document_summary(
+            document_content, language, department, GOOGLE_API_KEY, use_cache=not regenerate
+        )
         
         logger.info("--- Document Summary ---")
         logger.info(summary_result.model_dump_json(indent=2))
@@ -169,36 +546,34 @@ async def summarize_document(file: UploadFile = File(...), language: str = Form(
             summary=summary_result,
             is_summarized=True 
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"An internal error occurred: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"An internal error occurred: {e}")
+        raise _upstream_error(e, f"An internal error occurred: {e}")
     finally:
-        if os.path.exists(file_location):
-            os.remove(file_location)
+        upload.close()
 
 # --- New Endpoint for Department Prediction ---
 @app.post("/predict-department/", response_model=DepartmentPredictionResponse)
 async def predict_department_endpoint(file: UploadFile = File(...)):
-    file_location = f"temp/{file.filename}"
-    Path(file_location).parent.mkdir(parents=True, exist_ok=True)
-    
-    try:
-        with open(file_location, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+    upload = await read_upload(file)
 
-        document_content = extract_text_from_pdf(file_location)
+    try:
+        document_content = await run_cpu(extract_text_from_pdf, upload.source)
         if not document_content:
             raise HTTPException(status_code=400, detail="Could not extract text from the document.")
 
-        prediction = predict_department(document_content, GOOGLE_API_KEY)
+        prediction = await apredict_department(document_content, GOOGLE_API_KEY)
         
         return prediction
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"An error occurred during department prediction: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail="An internal error occurred during department prediction.")
+        raise _upstream_error(e, "An internal error occurred during department prediction.")
     finally:
-        if os.path.exists(file_location):
-            os.remove(file_location)
+        upload.close()
 
 
 
@@ -208,26 +583,124 @@ async def extract_date_from_document(file: UploadFile = File(...)):
     """
     Extracts the last date from a legal document.
     """
-    file_location = f"temp/{file.filename}"
-    Path(file_location).parent.mkdir(parents=True, exist_ok=True)
-    
-    try:
-        with open(file_location, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+    upload = await read_upload(file)
 
-        document_content = extract_text_from_pdf(file_location)
+    try:
+        document_content = await run_cpu(extract_text_from_pdf, upload.source)
         if not document_content:
             raise HTTPException(status_code=400, detail="Could not extract text from the document.")
 
-        last_date = extract_last_date(document_content, GOOGLE_API_KEY)
+        last_date = await aextract_last_date(document_content, GOOGLE_API_KEY)
         
         return LastDateResponse(last_date=last_date)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"An error occurred during date extraction: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail="An internal error occurred during date extraction.")
+        raise _upstream_error(e, "An internal error occurred during date extraction.")
     finally:
-        if os.path.exists(file_location):
-            os.remove(file_location)
+        upload.close()
+
+
+# --- Combined Endpoint: date, department and (optionally) summary in one pass ---
+
+async def _timed(timings: Dict[str, float], stage: str, awaitable):
+    """Awaits a coroutine and records its wall-clock time."""
+    start = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        timings[stage] = round(time.perf_counter() - start, 3)
+
+@app.post("/analyze/", response_model=AnalyzeResponse)
+async def analyze_document(
+    file: UploadFile = File(...),
+    include_summary: bool = Form(False),
+    language: Optional[str] = Form(None),
+    department: Optional[str] = Form(None),
+    regenerate: bool = Form(False),
+):
+    """
+    Parses the document once and runs date extraction, department prediction
+    and (optionally) summarization concurrently.
+    """
+    if include_summary and not (language and department):
+        raise HTTPException(status_code=400, detail="language and department are required when include_summary is set.")
+
+    timings: Dict[str, float] = {}
+    total_start = time.perf_counter()
+    upload = await _timed(timings, "read_upload", read_upload(file))
+
+    try:
+        document_content = await _timed(timings, "extract_text", run_cpu(extract_text_from_pdf, upload.source))
+        if not document_content:
+            raise HTTPException(status_code=400, detail="Could not extract text from the document.")
+
+        tasks = [
+            _timed(timings, "extract_last_date", aextract_last_date(document_content, GOOGLE_API_KEY, use_cache=not regenerate)),
+            _timed(timings, "predict_department", apredict_department(document_content, GOOGLE_API_KEY, use_cache=not regenerate)),
+        ]
+        if include_summary:
+            tasks.append(_timed(timings, "summarize", agenerate_document_summary(document_content, language, department, GOOGLE_API_KEY, use_cache=not regenerate)))
+
+        # Stages are independent: one failing must not discard the results of the others
+        stages = ["extract_last_date", "predict_department", "summarize"][:len(tasks)]
+        results = dict(zip(stages, await asyncio.gather(*tasks, return_exceptions=True)))
+        timings["total"] = round(time.perf_counter() - total_start, 3)
+
+        errors = {}
+        for stage, result in results.items():
+            if isinstance(result, BaseException):
+                if not isinstance(result, Exception):
+                    raise result
+                logger.error(f"Analysis stage {stage} failed: {result}", exc_info=result)
+                errors[stage] = _upstream_error(result, f"An internal error occurred during {stage}.").detail
+        if len(errors) == len(stages):
+            raise results["extract_last_date"]
+
+        ok = {stage: result for stage, result in results.items() if stage not in errors}
+        return AnalyzeResponse(
+            last_date=ok.get("extract_last_date"),
+            predicted_departments=ok["predict_department"].predicted_departments if "predict_department" in ok else None,
+            summary=ok.get("summarize"),
+            timings=timings,
+            errors=errors,
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"An error occurred during document analysis: {e}", exc_info=True)
+        raise _upstream_error(e, "An internal error occurred during document analysis.")
+    finally:
+        upload.close()
+
+# --- Admin ---
+
+@app.get("/admin/index-usage/")
+async def index_usage(limit: int = 100):
+    """Reports vector namespaces by recency of use, with totals and the expiry policy."""
+    registry = get_namespace_registry()
+    totals = await run_blocking("io", registry.totals)
+    namespaces = await run_blocking("io", registry.list, limit)
+    now = time.time()
+    for record in namespaces:
+        record["idle_seconds"] = round(now - record["last_access"], 1)
+    return {
+        "backend": VECTOR_BACKEND,
+        "index_name": PINECONE_INDEX_NAME,
+        **totals,
+        "policy": {
+            "idle_ttl_seconds": NAMESPACE_IDLE_TTL_SECONDS,
+            "max_total_vectors": NAMESPACE_MAX_TOTAL_VECTORS,
+            "sweep_interval_seconds": NAMESPACE_SWEEP_INTERVAL_SECONDS,
+        },
+        "namespaces": namespaces,
+    }
+
+@app.get("/admin/upstream-limits/")
+async def upstream_limits():
+    """Client-side Gemini quota state per upstream: current rate, pause, circuit and call counters."""
+    return limiter_stats()
 
 if __name__ == "__main__":
     import uvicorn
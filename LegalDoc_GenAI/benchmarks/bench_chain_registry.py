@@ -0,0 +1,64 @@
+# benchmarks/bench_chain_registry.py
+"""
+Per-request overhead of building LLM chains, with and without the chain registry.
+
+Before the registry every summarize / predict-department / extract-last-date
+call built a new ChatGoogleGenerativeAI client, PydanticOutputParser and
+prompt. This measures that cost against the cached lookup. No API calls are
+made; any non-empty GOOGLE_API_KEY works.
+
+Usage:
+    GOOGLE_API_KEY=dummy python benchmarks/bench_chain_registry.py [--requests 200]
+"""
+import os
+import sys
+import time
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("GOOGLE_API_KEY", "dummy")
+
+import summarizer
+from models import Department
+
+BUILDERS = {
+    "summary": lambda key: summarizer._build_summary_chain(Department.FINANCE_ACCOUNTS.value, key),
+    "department": lambda key: summarizer._build_department_chain(key),
+    "last_date": lambda key: summarizer._build_last_date_chain(key),
+}
+
+
+def per_request_ms(build, key, requests):
+    start = time.perf_counter()
+    for _ in range(requests):
+        build(key)
+    return (time.perf_counter() - start) * 1000 / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+    key = os.environ["GOOGLE_API_KEY"]
+
+    warm = summarizer.warm_up_chains(key)
+    print(f"startup warm-up: {warm * 1000:.1f} ms\n")
+    print(f"{'chain':<12} {'uncached ms/req':>16} {'registry ms/req':>16}")
+
+    for name, build in BUILDERS.items():
+        def uncached(k):
+            # Same work as before the registry: fresh client, parser and prompt each time
+            summarizer.get_model.cache_clear()
+            for fn in (summarizer._build_summary_chain, summarizer._build_department_chain, summarizer._build_last_date_chain):
+                fn.cache_clear()
+            return build(k)
+
+        cold = per_request_ms(uncached, key, args.requests)
+        summarizer.warm_up_chains(key)
+        hot = per_request_ms(build, key, args.requests)
+        print(f"{name:<12} {cold:16.3f} {hot:16.4f}")
+
+
+if __name__ == "__main__":
+    main()
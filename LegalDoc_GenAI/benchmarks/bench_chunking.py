@@ -0,0 +1,102 @@
+# benchmarks/bench_chunking.py
+"""
+Chunking throughput, peak memory and chunk sizes in tokens.
+
+Compares LangChain's RecursiveCharacterTextSplitter (800 characters, 150
+overlap, as modules/chunking.chunk_text used before) on the fully joined text
+against the streaming modules/chunking.iter_token_chunks fed page by page.
+The synthetic input mixes English and Malayalam paragraphs, where 800
+characters can be far more tokens than 800 characters of English.
+
+Usage:
+    python benchmarks/bench_chunking.py [--file FILE] [--mb 20] [--max-tokens 200] [--repeat 3]
+"""
+import sys
+import time
+import random
+import argparse
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from modules.chunking import CHUNK_OVERLAP_TOKENS, iter_file_pages, iter_token_chunks
+from modules.tokens import count_tokens
+
+ENGLISH = (
+    "The contractor shall complete the works under tender KMRL/PROC/2024/{n} on or before the date "
+    "specified in clause 4.{n}.1. Kochi Metro Rail Limited reserves the right to reject any bid. "
+)
+MALAYALAM = "കൊച്ചി മെട്രോ റെയിൽ ലിമിറ്റഡ് ടെൻഡർ സമർപ്പിക്കേണ്ട അവസാന തീയതി {n} ആണ്. "
+EMBEDDING_TOKEN_LIMIT = 2048
+
+
+def make_pages(mb: float, seed: int = 0):
+    rng = random.Random(seed)
+    pages, size, n = [], 0, 0
+    while size < mb * 1e6:
+        paras = []
+        for _ in range(rng.randint(3, 8)):
+            template = MALAYALAM if rng.random() < 0.2 else ENGLISH
+            paras.append("".join(template.format(n=n + i) for i in range(rng.randint(1, 6))))
+        text = "\n\n".join(paras)
+        n += 1
+        pages.append((n, text))
+        size += len(text.encode("utf-8"))
+    return pages
+
+
+def langchain_splitter(pages, max_tokens):
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=800,
+        chunk_overlap=150,
+        separators=["\n\n", "\n", ". ", "! ", "? ", ", ", " ", ""]
+    )
+    text = "\n".join(t for _, t in pages)
+    return [c for c in splitter.split_text(text) if len(c.strip()) > 50]
+
+
+def token_chunker(pages, max_tokens):
+    return [c for c, _ in iter_token_chunks(iter(pages), max_tokens=max_tokens, overlap_tokens=CHUNK_OVERLAP_TOKENS)]
+
+
+def run(name, func, pages, mb, max_tokens, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chunks = func(pages, max_tokens)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    func(pages, max_tokens)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    sizes = [count_tokens(c) for c in chunks]
+    over_budget = sum(s > max_tokens for s in sizes)
+    over_limit = sum(s > EMBEDDING_TOKEN_LIMIT for s in sizes)
+    print(f"{name:<26} {best * 1000:9.1f} ms  {mb / best:6.2f} MB/s  peak {peak / 1e6:7.1f} MB  "
+          f"{len(chunks):7d} chunks  max {max(sizes):5d} tok  >{max_tokens} tok: {over_budget:6d}  "
+          f">{EMBEDDING_TOKEN_LIMIT} tok: {over_limit}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file", help="PDF/TXT/DOCX to chunk; synthetic pages are generated if omitted")
+    parser.add_argument("--mb", type=float, default=20, help="size of the synthetic input")
+    parser.add_argument("--max-tokens", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    pages = list(iter_file_pages(args.file)) if args.file else make_pages(args.mb)
+    mb = sum(len(t.encode("utf-8")) for _, t in pages) / 1e6
+    print(f"{len(pages)} pages, {mb:.1f} MB\n")
+    # Peak memory of the splitter includes the joined copy of the text it needs;
+    # the streaming chunker only ever holds one page and one chunk's units.
+    run("RecursiveCharacterSplitter", langchain_splitter, pages, mb, args.max_tokens, args.repeat)
+    run("iter_token_chunks", token_chunker, pages, mb, args.max_tokens, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
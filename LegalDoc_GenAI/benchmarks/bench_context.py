@@ -0,0 +1,94 @@
+# benchmarks/bench_context.py
+"""
+Prompt context size with and without modules/retriever._build_context's
+merging of overlapping chunks.
+
+Chunks are cut from a synthetic document by modules/chunking and retrieved
+offline with the BM25 index and MMR the service uses (no embeddings), top_k
+per question as in /chat/. "Before" is the verbatim join of the retrieved
+chunks; "after" is the merged, deduplicated, token-budgeted context. Coverage
+is the share of the distinct retrieved document text (by character offsets)
+that the context still contains, so 100% means nothing was lost by merging.
+
+Usage:
+    python benchmarks/bench_context.py [--mb 0.5] [--questions 200] [--top-k 4] [--budget 1200] [--mmr-lambda 0.7]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from pathlib import Path
+
+os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from langchain.schema import Document
+from modules.chunking import iter_token_chunks
+from modules.lexical_index import BM25Index
+from modules.retriever import MMR_LAMBDA, _build_context, _mmr, _passages
+from modules.tokens import count_tokens
+from bench_chunking import make_pages
+
+
+def old_context(results):
+    context = "\n\n---\n\n".join(d.page_content for d in results)
+    return f"{context}\n\nRespond in the same language as the question if possible."
+
+
+def covered(results, context: str) -> float:
+    spans = set()
+    for d in results:
+        spans.update(range(d.metadata["char_start"], d.metadata["char_end"]))
+    kept = set()
+    for p in _passages(results):
+        if p["text"] in context:
+            kept.update(range(p["start"], p["end"]))
+    return len(kept & spans) / len(spans) if spans else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mb", type=float, default=0.5, help="synthetic document size")
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=4)
+    parser.add_argument("--budget", type=int, default=1200, help="CONTEXT_MAX_TOKENS")
+    parser.add_argument("--mmr-lambda", type=float, default=MMR_LAMBDA, help="MMR_LAMBDA; 1.0 keeps overlapping neighbours")
+    args = parser.parse_args()
+
+    chunks = list(iter_token_chunks(iter(make_pages(args.mb))))
+    texts = [text for text, _ in chunks]
+    metadatas = [{**meta, "source": "tender.pdf"} for _, meta in chunks]
+    index = BM25Index.build([str(i) for i in range(len(chunks))], texts, metadatas)
+    rng = random.Random(0)
+    print(f"{len(chunks)} chunks, {args.questions} questions, top_k={args.top_k}, "
+          f"budget={args.budget} tokens, MMR lambda={args.mmr_lambda}\n")
+
+    before = after = passages = 0
+    coverage = 0.0
+    build_ms = 0.0
+    for _ in range(args.questions):
+        n = rng.randrange(len(chunks))
+        query = f"deadline under tender KMRL/PROC/2024/{n} clause 4.{n}.1"
+        hits = index.search(query, 20)
+        candidates = [(Document(page_content=meta["text"], metadata={**meta, "document_id": "doc"}), score)
+                      for _, score, meta in hits]
+        results = _mmr(candidates, args.top_k, args.mmr_lambda)
+        start = time.perf_counter()
+        context = _build_context(results, max_tokens=args.budget)
+        build_ms += (time.perf_counter() - start) * 1000
+        before += count_tokens(old_context(results))
+        after += count_tokens(context)
+        coverage += covered(results, context)
+        passages += len(_passages(results))
+
+    q = args.questions
+    print(f"context tokens before: {before / q:8.1f} per question")
+    print(f"context tokens after:  {after / q:8.1f} per question ({100 * (1 - after / before):.1f}% fewer)")
+    print(f"passages per question: {passages / q:8.2f} from {args.top_k} chunks")
+    print(f"retrieved text kept:   {100 * coverage / q:8.1f}%")
+    print(f"build time:            {build_ms / q:8.2f} ms per question")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# benchmarks/bench_extraction.py
+"""
+PDF extraction throughput in pages per second.
+
+Compares the two previous loaders (pypdf as used by modules/chunking.load_pdf,
+and PyMuPDF with string += as used by utils.extract_text_from_pdf) against
+modules/extraction.iter_pdf_pages, sequential and with the process pool.
+
+Usage:
+    python benchmarks/bench_extraction.py [--pdf FILE] [--pages 300] [--repeat 3]
+"""
+import sys
+import time
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import fitz  # PyMuPDF
+from pypdf import PdfReader
+from modules.extraction import iter_pdf_pages
+
+LOREM = (
+    "The contractor shall complete the works on or before the date specified in clause {n}. "
+    "Kochi Metro Rail Limited reserves the right to reject any tender without assigning reasons. "
+)
+
+
+def make_synthetic_pdf(pages: int) -> bytes:
+    doc = fitz.open()
+    for n in range(pages):
+        page = doc.new_page()
+        page.insert_textbox(fitz.Rect(50, 50, 550, 800), (LOREM.format(n=n) * 12), fontsize=9)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def legacy_pypdf(path: str) -> str:
+    reader = PdfReader(path)
+    full = []
+    for page in reader.pages:
+        text = page.extract_text()
+        if text:
+            full.append(text)
+    return "\n".join(full)
+
+
+def legacy_pymupdf_concat(path: str) -> str:
+    text = ""
+    doc = fitz.open(path)
+    for page in doc:
+        text += page.get_text()
+    doc.close()
+    return text
+
+
+def new_sequential(data: bytes) -> str:
+    return "".join(text for _, text in iter_pdf_pages(data, parallel=False))
+
+
+def new_parallel(data: bytes) -> str:
+    return "".join(text for _, text in iter_pdf_pages(data, parallel=True))
+
+
+def run(name, func, arg, pages, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(arg)
+        best = min(best, time.perf_counter() - start)
+    print(f"{name:<28} {best * 1000:9.1f} ms   {pages / best:9.1f} pages/s")
+    return pages / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", help="PDF to benchmark; a synthetic one is generated if omitted")
+    parser.add_argument("--pages", type=int, default=300, help="pages in the synthetic PDF")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.pdf:
+        data = Path(args.pdf).read_bytes()
+        path = args.pdf
+    else:
+        data = make_synthetic_pdf(args.pages)
+        path = str(Path("temp") / "bench_extraction.pdf")
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        Path(path).write_bytes(data)
+
+    pages = fitz.open(stream=data, filetype="pdf").page_count
+    print(f"{pages} pages, {len(data) / 1e6:.1f} MB\n")
+
+    # Warm the process pool so its spawn cost is not charged to the first run
+    new_parallel(data)
+
+    run("pypdf (chunking.load_pdf)", legacy_pypdf, path, pages, args.repeat)
+    run("pymupdf += (utils)", legacy_pymupdf_concat, path, pages, args.repeat)
+    run("iter_pdf_pages sequential", new_sequential, data, pages, args.repeat)
+    run("iter_pdf_pages parallel", new_parallel, data, pages, args.repeat)
+
+    if not args.pdf:
+        Path(path).unlink()
+
+
+if __name__ == "__main__":
+    main()
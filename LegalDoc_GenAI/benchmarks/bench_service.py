@@ -0,0 +1,364 @@
+# benchmarks/bench_service.py
+"""
+End-to-end service benchmark without Google or Pinecone keys.
+
+Runs the real FastAPI app (lifespan, routes, ingestion jobs, retrieval,
+summarizer chains) in-process with the deterministic stand-ins from
+benchmarks/fakes.py for Gemini chat, Gemini embeddings and, with
+--vector pinecone, the Pinecone index; --vector local uses the real
+modules/local_index. Each fake can be given a latency so the numbers reflect
+the service's own overhead plus a chosen upstream cost.
+
+Measures, on synthetic PDF, DOCX and TXT files of --pages pages each:
+  - ingestion chunks per second (upload until the background job finishes)
+  - /chat/ and /summarize/ latency percentiles, with --concurrency clients
+  - PDF text extraction pages per second
+  - peak RSS of this process (and of finished child processes)
+
+Results are written as JSON (--output). With --compare, the run is checked
+against an earlier result file and the exit status is 1 if any metric is
+worse by more than --tolerance, so releases can be compared in CI.
+
+Usage:
+    python benchmarks/bench_service.py [--pages 40] [--documents 1] [--chat-requests 200]
+        [--summarize-requests 30] [--concurrency 4] [--vector local|pinecone]
+        [--llm-latency-ms 0] [--embed-latency-ms 0] [--vector-latency-ms 0]
+        [--output bench_service.json] [--compare baseline.json --tolerance 0.2]
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import logging
+import platform
+import argparse
+import resource
+import tempfile
+import subprocess
+import contextlib
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import fitz  # PyMuPDF
+import docx
+
+from bench_chunking import ENGLISH
+
+FORMATS = ("pdf", "docx", "txt")
+CONTENT_TYPES = {
+    "pdf": "application/pdf",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "txt": "text/plain",
+}
+QUESTIONS = [
+    "What is the deadline under tender KMRL/PROC/2024/{n}?",
+    "Which clause covers 4.{n}.1 and what does it require?",
+    "Can Kochi Metro Rail Limited reject a bid for tender {n}?",
+    "Summarize the obligations of the contractor in clause 4.{n}.1.",
+]
+# (JSON path, True if higher is better) of the metrics --compare checks
+COMPARED_METRICS = [
+    ("ingest.chunks_per_second", True),
+    ("extraction.pages_per_second", True),
+    ("chat.p50_ms", False),
+    ("chat.p95_ms", False),
+    ("chat.p99_ms", False),
+    ("summarize.p50_ms", False),
+    ("summarize.p95_ms", False),
+    ("summarize.p99_ms", False),
+    ("peak_rss_mb", False),
+]
+
+
+def synthetic_pages(pages: int, page_chars: int, seed: int):
+    """English tender-like text, `page_chars` characters per page, different for every seed."""
+    rng = random.Random(seed)
+    base = seed * 100000
+    result = []
+    for page in range(pages):
+        paras, size = [], 0
+        while size < page_chars:
+            para = "".join(ENGLISH.format(n=base + page * 100 + len(paras) * 7 + i) for i in range(rng.randint(1, 4)))
+            paras.append(para)
+            size += len(para) + 2
+        result.append("\n\n".join(paras))
+    return result
+
+
+def make_pdf(pages):
+    doc = fitz.open()
+    for text in pages:
+        page = doc.new_page()
+        page.insert_textbox(fitz.Rect(40, 40, page.rect.width - 40, page.rect.height - 40), text, fontsize=7)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def make_docx(pages):
+    document = docx.Document()
+    for i, text in enumerate(pages):
+        if i:
+            document.add_page_break()
+        for para in text.split("\n\n"):
+            document.add_paragraph(para)
+    buf = io.BytesIO()
+    document.save(buf)
+    return buf.getvalue()
+
+
+def make_txt(pages):
+    return "\n\n".join(pages).encode("utf-8")
+
+
+MAKERS = {"pdf": make_pdf, "docx": make_docx, "txt": make_txt}
+
+
+def percentiles(samples_ms):
+    if not samples_ms:
+        return {"requests": 0}
+    ordered = sorted(samples_ms)
+
+    def pick(p):
+        return round(ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))], 2)
+
+    return {
+        "requests": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered), 2),
+        "p50_ms": pick(50),
+        "p95_ms": pick(95),
+        "p99_ms": pick(99),
+        "max_ms": round(ordered[-1], 2),
+    }
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+    return round(own / 1e6, 1), round(children / 1e6, 1)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).resolve().parent, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def timed_requests(send, count, concurrency):
+    """Runs send(i) `count` times on `concurrency` threads; returns latencies in ms and the error count."""
+    def one(i):
+        start = time.perf_counter()
+        ok = send(i)
+        return (time.perf_counter() - start) * 1000, ok
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(count)))
+    return [ms for ms, _ in results], sum(not ok for _, ok in results)
+
+
+def run_ingest(client, files):
+    """Uploads every file into one conversation, waiting for each job; returns (metrics, conversation_id)."""
+    conversation_id = None
+    per_format = {}
+    total_chunks = 0
+    total_seconds = 0.0
+    for fmt, name, data in files:
+        start = time.perf_counter()
+        form = {"conversation_id": conversation_id} if conversation_id else {}
+        resp = client.post("/upload-and-build/", files={"file": (name, data, CONTENT_TYPES[fmt])}, data=form)
+        resp.raise_for_status()
+        body = resp.json()
+        conversation_id = body["conversation_id"]
+        status = body
+        while body["status_url"] and status["status"] in ("queued", "running"):
+            time.sleep(0.02)
+            status = client.get(body["status_url"]).json()
+        if status["status"] != "succeeded":
+            raise RuntimeError(f"Ingestion of {name} failed: {status.get('error')}")
+        seconds = time.perf_counter() - start
+        chunks = status.get("total_chunks") or status.get("chunks_count") or 0
+        entry = per_format.setdefault(fmt, {"documents": 0, "bytes": 0, "chunks": 0, "seconds": 0.0})
+        entry["documents"] += 1
+        entry["bytes"] += len(data)
+        entry["chunks"] += chunks
+        entry["seconds"] += seconds
+        total_chunks += chunks
+        total_seconds += seconds
+    for entry in per_format.values():
+        entry["chunks_per_second"] = round(entry["chunks"] / entry["seconds"], 1)
+        entry["seconds"] = round(entry["seconds"], 3)
+    metrics = {
+        "documents": len(files),
+        "chunks": total_chunks,
+        "seconds": round(total_seconds, 3),
+        "chunks_per_second": round(total_chunks / total_seconds, 1),
+        "by_format": per_format,
+    }
+    return metrics, conversation_id
+
+
+def run_extraction(pdf_bytes, pages, repeat):
+    from modules.extraction import iter_pdf_pages
+
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        extracted = sum(1 for _ in iter_pdf_pages(pdf_bytes))
+        best = min(best, time.perf_counter() - start)
+    assert extracted == pages
+    return {"pages": pages, "seconds": round(best, 4), "pages_per_second": round(pages / best, 1)}
+
+
+def lookup(results, path):
+    value = results
+    for key in path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def compare(results, baseline, tolerance):
+    """Prints each compared metric against the baseline; returns the regressed ones."""
+    regressions = []
+    ignored = ("output", "compare", "tolerance", "verbose")
+    old_args, new_args = baseline.get("meta", {}).get("args", {}), results["meta"]["args"]
+    differing = [k for k in new_args if k not in ignored and old_args.get(k) != new_args[k]]
+    if differing:
+        print(f"\nNote: the baseline ran with different settings ({', '.join(differing)}); results may not be comparable")
+    print(f"\n{'metric':<30} {'baseline':>12} {'current':>12} {'change':>8}")
+    for path, higher_is_better in COMPARED_METRICS:
+        old, new = lookup(baseline, path), lookup(results, path)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        worse = -change if higher_is_better else change
+        flag = "  REGRESSION" if worse > tolerance else ""
+        print(f"{path:<30} {old:12.2f} {new:12.2f} {change * 100:+7.1f}%{flag}")
+        if flag:
+            regressions.append(path)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=40, help="pages per synthetic document")
+    parser.add_argument("--page-chars", type=int, default=2500, help="characters of text per page")
+    parser.add_argument("--documents", type=int, default=1, help="documents per format")
+    parser.add_argument("--chat-requests", type=int, default=200)
+    parser.add_argument("--summarize-requests", type=int, default=30)
+    parser.add_argument("--concurrency", type=int, default=4, help="concurrent clients for /chat/ and /summarize/")
+    parser.add_argument("--extract-repeat", type=int, default=3)
+    parser.add_argument("--vector", choices=("local", "pinecone"), default="local",
+                        help="real local index, or the in-memory fake Pinecone index")
+    parser.add_argument("--embedding-dim", type=int, default=768)
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0)
+    parser.add_argument("--llm-ms-per-1k-tokens", type=float, default=0.0, help="extra LLM latency per 1000 prompt tokens")
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0, help="per embedding request (batch)")
+    parser.add_argument("--vector-latency-ms", type=float, default=0.0, help="per fake Pinecone call")
+    parser.add_argument("--output", default="bench_service.json")
+    parser.add_argument("--compare", help="earlier result JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown with --compare")
+    parser.add_argument("--verbose", action="store_true", help="keep the service's own output")
+    args = parser.parse_args()
+
+    workdir = tempfile.TemporaryDirectory(prefix="bench-service-")
+    import fakes
+    fakes.configure_environment(workdir.name, args.vector, args.embedding_dim)
+
+    # Imported only now: the service reads its configuration at import time
+    import app as service
+    from fastapi.testclient import TestClient
+
+    stubs = fakes.install(args.llm_latency_ms, args.llm_ms_per_1k_tokens, args.embed_latency_ms, args.vector_latency_ms)
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+
+    files = []
+    for fmt in FORMATS:
+        for i in range(args.documents):
+            pages = synthetic_pages(args.pages, args.page_chars, seed=len(files) + 1)
+            files.append((fmt, f"synthetic-{i}.{fmt}", MAKERS[fmt](pages)))
+    summary_pdf = make_pdf(synthetic_pages(args.pages, args.page_chars, seed=0))
+    print(f"{len(files)} documents of {args.pages} pages, vector backend {args.vector}, "
+          f"{args.embedding_dim}-d embeddings, concurrency {args.concurrency}")
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": vars(args),
+        }
+    }
+
+    with quiet, TestClient(service.app) as client:
+        results["ingest"], conversation_id = run_ingest(client, files)
+        rss_after_ingest = peak_rss_mb()[0]
+
+        def chat(i):
+            query = QUESTIONS[i % len(QUESTIONS)].format(n=i)
+            return client.post("/chat/", json={"conversation_id": conversation_id, "query": query}).status_code == 200
+
+        client.post("/chat/", json={"conversation_id": conversation_id, "query": "warm-up"})
+        latencies, errors = timed_requests(chat, args.chat_requests, args.concurrency)
+        results["chat"] = {**percentiles(latencies), "errors": errors}
+
+        def summarize(i):
+            resp = client.post(
+                "/summarize/",
+                files={"file": ("summary.pdf", summary_pdf, CONTENT_TYPES["pdf"])},
+                data={"language": "English", "department": "Operations Department", "regenerate": "true"},
+            )
+            return resp.status_code == 200
+
+        latencies, errors = timed_requests(summarize, args.summarize_requests, args.concurrency)
+        results["summarize"] = {**percentiles(latencies), "errors": errors}
+
+        results["extraction"] = run_extraction(summary_pdf, args.pages, args.extract_repeat)
+
+    own, children = peak_rss_mb()
+    results["peak_rss_mb"] = own
+    results["peak_rss_after_ingest_mb"] = rss_after_ingest
+    results["peak_rss_children_mb"] = children
+    results["upstream_calls"] = {
+        "llm": stubs.llm.calls,
+        "embedding_requests": stubs.embeddings.requests,
+        "embedded_texts": stubs.embeddings.texts,
+        "vector_calls": stubs.index.calls if args.vector == "pinecone" else None,
+    }
+    workdir.cleanup()
+
+    ingest, chat_stats, summary_stats = results["ingest"], results["chat"], results["summarize"]
+    print(f"ingest:     {ingest['chunks']} chunks in {ingest['seconds']:.2f}s, {ingest['chunks_per_second']:.1f} chunks/s "
+          + ", ".join(f"{fmt} {v['chunks_per_second']:.1f}" for fmt, v in ingest["by_format"].items()))
+    for name, stats in (("chat", chat_stats), ("summarize", summary_stats)):
+        print(f"{name + ':':<11} p50 {stats['p50_ms']:.1f} ms, p95 {stats['p95_ms']:.1f} ms, p99 {stats['p99_ms']:.1f} ms "
+              f"over {stats['requests']} requests, {stats['errors']} errors")
+    print(f"extraction: {results['extraction']['pages_per_second']:.1f} pages/s")
+    print(f"peak RSS:   {own:.1f} MB (children {children:.1f} MB)")
+    print(f"upstream:   {results['upstream_calls']}")
+
+    Path(args.output).write_text(json.dumps(results, indent=2))
+    print(f"\nWrote {args.output}")
+
+    if args.compare:
+        regressions = compare(results, json.loads(Path(args.compare).read_text()), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} metrics regressed by more than {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# benchmarks/bench_vector_storage.py
+"""
+Recall against size for the vector storage profiles: embedding dimension
+(EMBEDDING_DIM, truncated and renormalized), local vector type
+(LOCAL_INDEX_DTYPE) and chunk text in or out of the vector metadata
+(CHUNK_TEXT_IN_METADATA).
+
+Ground truth is the exact top-k over the full 3072-dimension float32 vectors;
+each profile is stored in a real modules/local_index shard and queried the
+same way the service does. Upsert bytes are the JSON size of one Pinecone
+vector (values plus metadata) with and without the chunk text.
+
+Real vectors can be read from the embedding cache (--cache). The synthetic
+ones give more weight to leading dimensions, as Matryoshka-trained models
+like gemini-embedding-001 do, but recall on real embeddings is the number
+to choose a profile by.
+
+Usage:
+    python benchmarks/bench_vector_storage.py [--cache data/cache/embeddings.sqlite3] [--n 5000] [--queries 200] [--k 10]
+"""
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from modules.local_index import NamespaceShard
+from modules.chunking import iter_token_chunks
+from bench_chunking import make_pages
+
+FULL_DIM = 3072
+DIMS = (3072, 1536, 768)
+DTYPES = ("float32", "float16", "int8")
+
+
+def synthetic_vectors(n: int, dim: int = FULL_DIM, clusters: int = 200, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    weight = (np.arange(dim) + 1.0) ** -0.5
+    centroids = rng.standard_normal((clusters, dim)).astype(np.float32) * weight
+    vectors = centroids[rng.integers(0, clusters, n)] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32) * weight
+    return vectors.astype(np.float32)
+
+
+def cached_vectors(path: str, n: int) -> np.ndarray:
+    conn = sqlite3.connect(path)
+    rows = conn.execute("SELECT vector FROM embeddings WHERE dim = ? LIMIT ?", (FULL_DIM, n)).fetchall()
+    if not rows:
+        raise SystemExit(f"No {FULL_DIM}-dimension vectors in {path}")
+    return np.stack([np.frombuffer(blob, dtype=np.float32) for blob, in rows])
+
+
+def truncate(vectors: np.ndarray, dim: int) -> np.ndarray:
+    out = vectors[:, :dim].copy()
+    out /= np.linalg.norm(out, axis=1, keepdims=True)
+    return out
+
+
+def exact_top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    return np.argsort(-(queries @ corpus.T), axis=1)[:, :k]
+
+
+def sample_chunk_text() -> str:
+    """A chunk as modules/chunking cuts it with the default token budget."""
+    return next(text for text, _ in iter_token_chunks(iter(make_pages(0.05))))
+
+
+def upsert_bytes(values: np.ndarray, text: str, with_text: bool) -> int:
+    metadata = {"source": "tender.pdf", "chunk_id": "0" * 36, "page": 1, "page_end": 1,
+                "char_start": 0, "char_end": len(text), "conversation_id": "0" * 64}
+    if with_text:
+        metadata["text"] = text
+    return len(json.dumps({"id": "0" * 36, "values": values.tolist(), "metadata": metadata}, ensure_ascii=False).encode("utf-8"))
+
+
+def run_profile(root: Path, dim: int, dtype: str, corpus: np.ndarray, queries: np.ndarray, truth: np.ndarray, k: int):
+    shard = NamespaceShard(root / f"{dim}-{dtype}", dtype=dtype)
+    ids = [str(i) for i in range(corpus.shape[0])]
+    vectors = truncate(corpus, dim)
+    for start in range(0, len(ids), 1000):
+        shard.upsert(ids[start:start + 1000], vectors[start:start + 1000], [{} for _ in ids[start:start + 1000]])
+
+    q = truncate(queries, dim)
+    hits = 0
+    start = time.perf_counter()
+    for qi in range(q.shape[0]):
+        found = {int(vid) for vid, _, _ in shard.query(q[qi], k)}
+        hits += len(found & set(truth[qi].tolist()))
+    query_ms = (time.perf_counter() - start) * 1000 / q.shape[0]
+
+    disk = sum(f.stat().st_size for f in shard.path.iterdir() if f.name != "records.jsonl")
+    return hits / truth.size, disk / corpus.shape[0], query_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cache", help="embedding cache to read real 3072-dimension vectors from")
+    parser.add_argument("--n", type=int, default=5000, help="corpus vectors")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    vectors = cached_vectors(args.cache, args.n + args.queries) if args.cache else synthetic_vectors(args.n + args.queries)
+    # Queries are held-out vectors, so their neighbours are found rather than themselves
+    corpus, queries = vectors[:-args.queries], vectors[-args.queries:]
+    corpus_full = truncate(corpus, FULL_DIM)
+    truth = exact_top_k(corpus_full, truncate(queries, FULL_DIM), args.k)
+    text = sample_chunk_text()
+    print(f"{corpus.shape[0]} vectors, {queries.shape[0]} queries, recall@{args.k} against exact 3072-d float32; "
+          f"sample chunk {len(text)} chars\n")
+
+    print(f"{'dim':>5} {'dtype':>8} {'recall':>7} {'bytes/vec':>10} {'query ms':>9} "
+          f"{'upsert B (text)':>16} {'upsert B (no text)':>19}")
+    with tempfile.TemporaryDirectory(prefix="bench-storage-") as tmp:
+        for dim in DIMS:
+            values = truncate(corpus[:1], dim)[0]
+            with_text, without_text = upsert_bytes(values, text, True), upsert_bytes(values, text, False)
+            for dtype in DTYPES:
+                recall, per_vector, query_ms = run_profile(Path(tmp), dim, dtype, corpus, queries, truth, args.k)
+                print(f"{dim:>5} {dtype:>8} {recall:7.3f} {per_vector:10.0f} {query_ms:9.2f} "
+                      f"{with_text:16d} {without_text:19d}")
+
+
+if __name__ == "__main__":
+    main()
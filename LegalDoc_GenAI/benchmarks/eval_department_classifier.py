@@ -0,0 +1,181 @@
+# benchmarks/eval_department_classifier.py
+"""
+Offline evaluation of the local department classifier against LLM labels.
+
+Labels come either from a JSONL file of {"path" or "text", "departments": [...]}
+(for example one written earlier with --save-labels), or from calling the
+Gemini department chain directly on every document in --docs (needs
+GOOGLE_API_KEY).
+
+Reports top-1 agreement, exact-set agreement and mean Jaccard overall and on
+the subset the classifier is confident about (i.e. the calls it skips), the
+softmax temperature that best fits the LLM labels, and the gates (probability
+threshold, minimum similarity and matched words) that skip the most calls while the skipped ones still agree with the
+LLM's first label at least --target-agreement of the time.
+
+Usage:
+    python benchmarks/eval_department_classifier.py --docs data/uploaded_docs --save-labels labels.jsonl
+    python benchmarks/eval_department_classifier.py --labels benchmarks/department_labels.jsonl
+
+benchmarks/department_labels.jsonl is a small hand-labeled set of KMRL-style
+documents plus off-domain ones (a CV, course slides, one-line notes); the
+defaults in modules/department_classifier.py were fitted on it.
+"""
+import os
+import sys
+import json
+import math
+import time
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from models import Department
+from modules.chunking import SUPPORTED, load_file_to_text
+from modules.department_classifier import (
+    DEPARTMENT_CLASSIFIER_MIN_SIMILARITY,
+    DEPARTMENT_CLASSIFIER_MIN_TERMS,
+    DEPARTMENT_CLASSIFIER_SKIP_LLM,
+    DEPARTMENT_CLASSIFIER_THRESHOLD,
+    get_department_classifier,
+)
+
+
+def llm_labels(texts):
+    import summarizer
+    chain = summarizer._build_department_chain(os.environ["GOOGLE_API_KEY"])
+    labels = []
+    for text in texts:
+        response = chain.invoke({"document_content": text})
+        labels.append([d.value for d in response.predicted_departments])
+    return labels
+
+
+def load_examples(args):
+    examples = []
+    if args.labels:
+        with open(args.labels, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    row = json.loads(line)
+                    text = row.get("text") or load_file_to_text(row["path"])
+                    examples.append({"path": row.get("path"), "text": text, "departments": row["departments"]})
+        return examples
+
+    paths = sorted(p for p in Path(args.docs).iterdir() if p.suffix.lower() in SUPPORTED)
+    texts = [load_file_to_text(str(p)) for p in paths]
+    for path, text, labels in zip(paths, texts, llm_labels(texts)):
+        examples.append({"path": str(path), "text": text, "departments": labels})
+    if args.save_labels:
+        with open(args.save_labels, "w", encoding="utf-8") as f:
+            for ex in examples:
+                f.write(json.dumps({"path": ex["path"], "departments": ex["departments"]}) + "\n")
+    return examples
+
+
+def fit_temperature(classifier, examples):
+    """Grid-search the temperature minimizing NLL of the LLM's first label."""
+    best = (float("inf"), classifier.temperature)
+    original = classifier.temperature
+    for t in [0.01, 0.02, 0.03, 0.04, 0.05, 0.075, 0.1, 0.15, 0.2, 0.3]:
+        classifier.temperature = t
+        nll = 0.0
+        for ex in examples:
+            probs = classifier.classify(ex["text"]).probabilities
+            nll -= math.log(max(probs[Department(ex["departments"][0])], 1e-12))
+        best = min(best, (nll / len(examples), t))
+    classifier.temperature = original
+    return best
+
+
+def fit_gates(results, rows, target):
+    """
+    Grid-search (threshold, min similarity, min terms) skipping the most calls
+    with top-1 agreement >= target; ties go to the higher agreement, then the
+    stricter gates.
+    """
+    best = None
+    # Strictest first, so a full tie keeps the earlier, stricter gates
+    for threshold in [0.9, 0.8, 0.7, 0.6, 0.55, 0.5]:
+        for min_similarity in [0.5, 0.4, 0.35, 0.3, 0.25, 0.2, 0.15, 0.1]:
+            for min_terms in range(10, 0, -1):
+                skipped = [row for res, row in zip(results, rows)
+                           if res.confidence >= threshold
+                           and res.similarity >= min_similarity and res.matched_terms >= min_terms]
+                if not skipped:
+                    continue
+                agreement = sum(r["top1"] for r in skipped) / len(skipped)
+                if agreement >= target and (best is None or (len(skipped), agreement) > best[:2]):
+                    best = (len(skipped), agreement, threshold, min_similarity, min_terms)
+    return best
+
+
+def score(examples, results):
+    rows = []
+    for ex, res in zip(examples, results):
+        llm = set(ex["departments"])
+        local = {d.value for d in res.departments}
+        rows.append({
+            "confident": res.is_confident,
+            "top1": res.departments[0].value in llm,
+            "exact": local == llm,
+            "jaccard": len(local & llm) / len(local | llm),
+        })
+    return rows
+
+
+def report(name, rows):
+    if not rows:
+        print(f"{name:<12} n=0")
+        return
+    top1 = sum(r["top1"] for r in rows) / len(rows)
+    exact = sum(r["exact"] for r in rows) / len(rows)
+    jaccard = sum(r["jaccard"] for r in rows) / len(rows)
+    print(f"{name:<12} n={len(rows):<4} top-1 {top1:6.1%}   exact set {exact:6.1%}   jaccard {jaccard:.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--docs", help="directory of PDF/TXT/DOCX files to label with the LLM")
+    source.add_argument("--labels", help="JSONL of previously collected labels")
+    parser.add_argument("--save-labels", help="write the LLM labels collected from --docs to this JSONL")
+    parser.add_argument("--target-agreement", type=float, default=0.95,
+                        help="top-1 agreement the skipped calls must keep when fitting the gates")
+    args = parser.parse_args()
+
+    examples = load_examples(args)
+    classifier = get_department_classifier()
+
+    start = time.perf_counter()
+    results = classifier.classify_batch(ex["text"] for ex in examples)
+    elapsed = time.perf_counter() - start
+    rows = score(examples, results)
+
+    print(f"{len(examples)} documents, local classifier {elapsed * 1000 / max(1, len(examples)):.2f} ms/doc, "
+          f"threshold {DEPARTMENT_CLASSIFIER_THRESHOLD}, min similarity {DEPARTMENT_CLASSIFIER_MIN_SIMILARITY}, "
+          f"min terms {DEPARTMENT_CLASSIFIER_MIN_TERMS}, skip {'on' if DEPARTMENT_CLASSIFIER_SKIP_LLM else 'off'}")
+    report("all", rows)
+    report("confident", [r for r in rows if r["confident"]])
+    report("fallback", [r for r in rows if not r["confident"]])
+    print(f"LLM calls skipped: {sum(r['confident'] for r in rows) / len(rows):.1%}")
+
+    nll, temperature = fit_temperature(classifier, examples)
+    print(f"best-fit temperature {temperature} (NLL {nll:.3f}); current {classifier.temperature}")
+
+    # The gates are fitted on the probabilities at the fitted temperature
+    classifier.temperature = temperature
+    fitted_results = classifier.classify_batch(ex["text"] for ex in examples)
+    gates = fit_gates(fitted_results, score(examples, fitted_results), args.target_agreement)
+    if gates is None:
+        print(f"no gates reach {args.target_agreement:.0%} top-1 agreement; set DEPARTMENT_CLASSIFIER_SKIP_LLM=false")
+    else:
+        skipped, agreement, threshold, min_similarity, min_terms = gates
+        print(f"gates DEPARTMENT_CLASSIFIER_TEMPERATURE={temperature} DEPARTMENT_CLASSIFIER_THRESHOLD={threshold} "
+              f"DEPARTMENT_CLASSIFIER_MIN_SIMILARITY={min_similarity} DEPARTMENT_CLASSIFIER_MIN_TERMS={min_terms} "
+              f"skip {skipped / len(rows):.1%} of calls at {agreement:.1%} top-1 agreement")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+# benchmarks/fakes.py
+"""
+Deterministic local stand-ins for Gemini (chat and embeddings) and Pinecone,
+with injectable latency, so the service can be measured without API keys.
+
+configure_environment() must run before app or any module under modules/ is
+imported, since they read their configuration at import time; install()
+then patches the imported modules to use the fakes.
+"""
+import os
+import json
+import time
+import zlib
+import asyncio
+import threading
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from modules.tokens import count_tokens
+
+_WORD_HASH_MASK = 0xFFFFFFFF
+
+
+def configure_environment(workdir: str, vector_backend: str = "local", embedding_dim: int = 768):
+    """
+    Points every store at `workdir` and selects the vector backend: "local"
+    (modules/local_index) or "pinecone" (FakePineconeIndex). Set values win
+    over a .env file, which load_dotenv() does not override.
+    """
+    os.environ["GOOGLE_API_KEY"] = "offline-benchmark"
+    os.environ["PINECONE_API_KEY_2"] = "offline-benchmark" if vector_backend == "pinecone" else ""
+    os.environ["VECTOR_BACKEND"] = vector_backend
+    os.environ["EMBEDDING_DIM"] = str(embedding_dim)
+    os.environ["ARTIFACT_DIR"] = os.path.join(workdir, "artifacts")
+    os.environ["LOCAL_INDEX_DIR"] = os.path.join(workdir, "local_index")
+    os.environ["LEXICAL_INDEX_DIR"] = os.path.join(workdir, "lexical_index")
+    os.environ["EMBED_CACHE_PATH"] = os.path.join(workdir, "cache", "embeddings.sqlite3")
+    os.environ["RESULT_CACHE_PATH"] = os.path.join(workdir, "cache", "results.sqlite3")
+    os.environ["SESSION_DB_PATH"] = os.path.join(workdir, "sessions.sqlite3")
+    os.environ.pop("CHUNK_STORE_PATH", None)
+    os.environ.pop("NAMESPACE_REGISTRY_PATH", None)
+
+
+def _sleep(ms: float):
+    if ms > 0:
+        time.sleep(ms / 1000)
+
+
+def hashed_embedding(text: str, dim: int) -> List[float]:
+    """Bag of hashed words: deterministic, and texts sharing words are similar."""
+    vec = np.zeros(dim, dtype=np.float32)
+    for word in text.lower().split():
+        vec[(zlib.crc32(word.encode("utf-8")) & _WORD_HASH_MASK) % dim] += 1.0
+    norm = np.linalg.norm(vec)
+    return (vec / norm if norm else vec).tolist()
+
+
+class FakeEmbeddings:
+    """Replaces google.generativeai.embed_content; each call is one request taking `latency_ms`."""
+
+    def __init__(self, dim: int, latency_ms: float = 0.0):
+        self.dim = dim
+        self.latency_ms = latency_ms
+        self.requests = 0
+        self.texts = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, model: str, content, task_type: str = None, output_dimensionality: Optional[int] = None, **kwargs):
+        dim = output_dimensionality or self.dim
+        texts = content if isinstance(content, list) else [content]
+        with self._lock:
+            self.requests += 1
+            self.texts += len(texts)
+        _sleep(self.latency_ms)
+        vectors = [hashed_embedding(text, dim) for text in texts]
+        return {"embedding": vectors if isinstance(content, list) else vectors[0]}
+
+
+# Structured outputs the service's PydanticOutputParsers expect, chosen by a field name in the prompt
+_STRUCTURED_REPLIES = [
+    ('"predicted_departments"', {"predicted_departments": ["Operations Department"]}),
+    ('"last_date"', {"last_date": "2025-05-05"}),
+    ('"key_points"', {
+        "category": "Tender",
+        "description": "Synthetic document summarized offline.",
+        "key_points": ["First point", "Second point"],
+        "urgency_level": "Medium",
+        "deadlines": ["2025-05-05"],
+    }),
+]
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model that answers without a network call after `latency_ms` plus
+    `ms_per_1k_tokens` per thousand prompt tokens. Prompts asking for one of
+    the service's JSON schemas get a fixed valid object; others get a short
+    plain-text answer.
+    """
+
+    latency_ms: float = 0.0
+    ms_per_1k_tokens: float = 0.0
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-benchmark-chat"
+
+    def _reply(self, messages: List[BaseMessage]) -> Tuple[str, float]:
+        prompt = "\n".join(str(m.content) for m in messages)
+        self.calls += 1
+        delay = self.latency_ms + self.ms_per_1k_tokens * count_tokens(prompt) / 1000
+        for marker, reply in _STRUCTURED_REPLIES:
+            if marker in prompt:
+                return json.dumps(reply), delay
+        return f"Offline answer drawn from {len(prompt)} prompt characters.", delay
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        text, delay = self._reply(messages)
+        _sleep(delay)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        text, delay = self._reply(messages)
+        await asyncio.sleep(delay / 1000)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+
+class FakePineconeIndex:
+    """In-memory stand-in for the subset of pinecone.Index the service uses, with `latency_ms` per call."""
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.calls = 0
+        self._namespaces: Dict[str, Dict[str, tuple]] = {}
+        self._matrices: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def _call(self):
+        with self._lock:
+            self.calls += 1
+        _sleep(self.latency_ms)
+
+    def upsert(self, vectors, namespace: str = None):
+        self._call()
+        with self._lock:
+            store = self._namespaces.setdefault(namespace or "", {})
+            for vid, values, metadata in vectors:
+                store[vid] = (np.asarray(values, dtype=np.float32), metadata)
+            self._matrices.pop(namespace or "", None)
+
+    def _matrix(self, namespace: str):
+        with self._lock:
+            cached = self._matrices.get(namespace)
+            if cached is None:
+                store = self._namespaces.get(namespace, {})
+                ids = list(store)
+                matrix = np.stack([store[vid][0] for vid in ids]) if ids else None
+                cached = self._matrices[namespace] = (ids, matrix, [store[vid][1] for vid in ids])
+            return cached
+
+    def query(self, vector, top_k: int, include_metadata: bool = True, namespace: str = None):
+        self._call()
+        ids, matrix, metadatas = self._matrix(namespace or "")
+        if matrix is None:
+            return SimpleNamespace(matches=[])
+        scores = matrix @ np.asarray(vector, dtype=np.float32)
+        best = np.argsort(-scores)[:top_k]
+        return SimpleNamespace(matches=[
+            SimpleNamespace(id=ids[i], score=float(scores[i]), metadata=dict(metadatas[i]) if include_metadata else None)
+            for i in best
+        ])
+
+    def fetch(self, ids: List[str], namespace: str = None):
+        self._call()
+        store = self._namespaces.get(namespace or "", {})
+        return SimpleNamespace(vectors={
+            vid: SimpleNamespace(id=vid, values=store[vid][0].tolist(), metadata=store[vid][1])
+            for vid in ids if vid in store
+        })
+
+    def delete(self, ids: Optional[List[str]] = None, delete_all: bool = False, namespace: str = None):
+        self._call()
+        with self._lock:
+            if delete_all:
+                self._namespaces.pop(namespace or "", None)
+            else:
+                store = self._namespaces.get(namespace or "", {})
+                for vid in ids or []:
+                    store.pop(vid, None)
+            self._matrices.pop(namespace or "", None)
+
+
+def install(llm_latency_ms: float = 0.0, llm_ms_per_1k_tokens: float = 0.0, embed_latency_ms: float = 0.0,
+            vector_latency_ms: float = 0.0) -> SimpleNamespace:
+    """
+    Patches the imported service modules to use the fakes; call after
+    configure_environment() and before the app starts. Returns the fakes,
+    whose counters show how many upstream calls a run made.
+    """
+    import summarizer
+    import modules.retriever as retriever
+    import modules.embedding_store as embedding_store
+
+    llm = FakeChatModel(latency_ms=llm_latency_ms, ms_per_1k_tokens=llm_ms_per_1k_tokens)
+    # Both modules build their clients from this name, with model and key keyword arguments
+    summarizer.ChatGoogleGenerativeAI = lambda **kwargs: llm
+    retriever.ChatGoogleGenerativeAI = lambda **kwargs: llm
+
+    embeddings = FakeEmbeddings(embedding_store.EMBEDDING_DIM, embed_latency_ms)
+    embedding_store.genai.embed_content = embeddings
+
+    index = FakePineconeIndex(vector_latency_ms)
+    embedding_store.init_pinecone_index = lambda index_name=None: index
+    return SimpleNamespace(llm=llm, embeddings=embeddings, index=index)
@@ -1,7 +1,7 @@
 # LegalDoc_GenAI/models.py
 
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import date
 from enum import Enum
 
@@ -42,11 +42,24 @@ class ChatRequest(BaseModel):
     conversation_id: str
     query: str
 
+class AttachDocumentRequest(BaseModel):
+    document_id: str = Field(..., description="Document ID returned by /upload-and-build/.")
+
 class LastDateResponse(BaseModel):
     last_date: Optional[date] = Field(..., description="The last date to take action mentioned in the document.")
 
+class LastDateExtractor(BaseModel):
+    last_date: Optional[date] = Field(None, description="The last date to take action, in YYYY-MM-DD format. Return null if not found.")
+
 class DepartmentPredictionRequest(BaseModel):
     document_content: str
 
 class DepartmentPredictionResponse(BaseModel):
-    predicted_departments: List[Department] = Field(..., description="A list of all likely departments for this document.")
\ No newline at end of file
+    predicted_departments: List[Department] = Field(..., description="A list of all likely departments for this document.")
+
+class AnalyzeResponse(BaseModel):
+    last_date: Optional[date] = Field(None, description="The last date to take action mentioned in the document.")
+    predicted_departments: Optional[List[Department]] = Field(None, description="A list of all likely departments for this document; null if prediction failed.")
+    summary: Optional[KmrlDocSummary] = Field(None, description="Document summary, only present when requested.")
+    timings: Dict[str, float] = Field(default_factory=dict, description="Wall-clock time per stage, in seconds.")
+    errors: Dict[str, str] = Field(default_factory=dict, description="Error message of each stage that failed; the other stages still return their results.")
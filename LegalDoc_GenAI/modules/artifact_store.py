@@ -0,0 +1,204 @@
+# modules/artifact_store.py
+import os
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from typing import List, Optional
+
+ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", "data/artifacts")
+
+
+def content_hash(data: bytes) -> str:
+    """SHA-256 of the uploaded bytes; identifies a document independent of its filename."""
+    return hashlib.sha256(data).hexdigest()
+
+
+class ArtifactStore:
+    """
+    Stores per-document ingest artifacts keyed by content hash:
+      - <ARTIFACT_DIR>/<hash>/text.txt     extracted text
+      - <ARTIFACT_DIR>/<hash>/chunks.json  chunk list from file_to_chunks
+      - <ARTIFACT_DIR>/<hash>/manifest.json chunk key, vector ID and metadata per
+                                           chunk, diffed against a revision
+      - artifacts.sqlite3                  vector namespace and IDs, plus the
+                                           documents attached to each conversation
+    """
+
+    def __init__(self, root: str = ARTIFACT_DIR):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.root / "artifacts.sqlite3"), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                doc_hash TEXT PRIMARY KEY,
+                filename TEXT,
+                namespace TEXT NOT NULL,
+                chunk_count INTEGER NOT NULL,
+                vector_ids TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS conversation_documents (
+                conversation_id TEXT NOT NULL,
+                doc_hash TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (conversation_id, doc_hash)
+            );
+            CREATE INDEX IF NOT EXISTS idx_conversation_documents_doc ON conversation_documents(doc_hash);
+            """
+        )
+        # Conversations used to hold exactly one document
+        has_legacy = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'conversations'"
+        ).fetchone()
+        if has_legacy:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO conversation_documents (conversation_id, doc_hash, created_at) "
+                "SELECT conversation_id, doc_hash, created_at FROM conversations"
+            )
+            self._conn.execute("DROP TABLE conversations")
+        self._conn.commit()
+
+    def _doc_dir(self, doc_hash: str) -> Path:
+        return self.root / doc_hash
+
+    def get_document(self, doc_hash: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT doc_hash, filename, namespace, chunk_count, vector_ids, created_at FROM documents WHERE doc_hash = ?",
+                (doc_hash,)
+            ).fetchone()
+        if not row:
+            return None
+        return {
+            "doc_hash": row[0],
+            "filename": row[1],
+            "namespace": row[2],
+            "chunk_count": row[3],
+            "vector_ids": json.loads(row[4]),
+            "created_at": row[5],
+        }
+
+    def save_document(self, doc_hash: str, filename: str, text: str, chunks: List[str], vector_ids: List[str], namespace: str,
+                      manifest: Optional[List[dict]] = None):
+        doc_dir = self._doc_dir(doc_hash)
+        doc_dir.mkdir(parents=True, exist_ok=True)
+        (doc_dir / "text.txt").write_text(text, encoding="utf-8")
+        (doc_dir / "chunks.json").write_text(json.dumps(chunks, ensure_ascii=False), encoding="utf-8")
+        if manifest is not None:
+            (doc_dir / "manifest.json").write_text(json.dumps(manifest, ensure_ascii=False), encoding="utf-8")
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents (doc_hash, filename, namespace, chunk_count, vector_ids, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (doc_hash, filename, namespace, len(chunks), json.dumps(vector_ids), time.time())
+            )
+            self._conn.commit()
+
+    def delete_document(self, doc_hash: str):
+        """Forgets a document, its artifacts and the conversations attached to it."""
+        with self._lock:
+            self._conn.execute("DELETE FROM conversation_documents WHERE doc_hash = ?", (doc_hash,))
+            self._conn.execute("DELETE FROM documents WHERE doc_hash = ?", (doc_hash,))
+            self._conn.commit()
+        shutil.rmtree(self._doc_dir(doc_hash), ignore_errors=True)
+
+    def load_text(self, doc_hash: str) -> Optional[str]:
+        path = self._doc_dir(doc_hash) / "text.txt"
+        return path.read_text(encoding="utf-8") if path.exists() else None
+
+    def load_chunks(self, doc_hash: str) -> Optional[List[str]]:
+        path = self._doc_dir(doc_hash) / "chunks.json"
+        return json.loads(path.read_text(encoding="utf-8")) if path.exists() else None
+
+    def load_manifest(self, doc_hash: str) -> Optional[List[dict]]:
+        path = self._doc_dir(doc_hash) / "manifest.json"
+        return json.loads(path.read_text(encoding="utf-8")) if path.exists() else None
+
+    def replace_document(self, old_hash: str, new_hash: str):
+        """
+        Moves the conversations of a revised document to its new version, which
+        was saved under the old one's namespace, and forgets the old version.
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO conversation_documents (conversation_id, doc_hash, created_at) "
+                "SELECT conversation_id, ?, created_at FROM conversation_documents WHERE doc_hash = ?",
+                (new_hash, old_hash)
+            )
+            self._conn.execute("DELETE FROM conversation_documents WHERE doc_hash = ?", (old_hash,))
+            self._conn.execute("DELETE FROM documents WHERE doc_hash = ?", (old_hash,))
+            self._conn.commit()
+        shutil.rmtree(self._doc_dir(old_hash), ignore_errors=True)
+
+    def attach_conversation(self, conversation_id: str, doc_hash: str):
+        """Adds a document to a conversation; attaching it again is a no-op."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO conversation_documents (conversation_id, doc_hash, created_at) VALUES (?, ?, ?)",
+                (conversation_id, doc_hash, time.time())
+            )
+            self._conn.commit()
+
+    def detach_conversation(self, conversation_id: str, doc_hash: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM conversation_documents WHERE conversation_id = ? AND doc_hash = ?",
+                (conversation_id, doc_hash)
+            )
+            self._conn.commit()
+        return cursor.rowcount > 0
+
+    def documents_for_conversation(self, conversation_id: str) -> List[str]:
+        """Content hashes of the documents attached to a conversation, in attachment order."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT doc_hash FROM conversation_documents WHERE conversation_id = ? ORDER BY created_at",
+                (conversation_id,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def namespaces_for_conversation(self, conversation_id: str) -> List[str]:
+        """
+        Vector namespaces of a conversation's documents. A revised document keeps
+        its first version's namespace; one still being ingested has none stored
+        yet, and will use its content hash.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT COALESCE(d.namespace, c.doc_hash) FROM conversation_documents c "
+                "LEFT JOIN documents d ON d.doc_hash = c.doc_hash "
+                "WHERE c.conversation_id = ? ORDER BY c.created_at",
+                (conversation_id,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def unindexed_documents(self, conversation_id: str) -> List[str]:
+        """Content hashes of a conversation's documents with no stored index: still being ingested, or failed."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT c.doc_hash FROM conversation_documents c "
+                "LEFT JOIN documents d ON d.doc_hash = c.doc_hash "
+                "WHERE c.conversation_id = ? AND d.doc_hash IS NULL ORDER BY c.created_at",
+                (conversation_id,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+
+_ARTIFACT_STORE_INSTANCE: Optional[ArtifactStore] = None
+_ARTIFACT_STORE_LOCK = threading.Lock()
+
+
+def get_artifact_store() -> ArtifactStore:
+    """Return the process-wide artifact store, opening it on first use."""
+    global _ARTIFACT_STORE_INSTANCE
+    with _ARTIFACT_STORE_LOCK:
+        if _ARTIFACT_STORE_INSTANCE is None:
+            _ARTIFACT_STORE_INSTANCE = ArtifactStore()
+        return _ARTIFACT_STORE_INSTANCE
@@ -1,15 +1,22 @@
 # modules/chatbot.py
-from typing import List, Dict
+import os
+from collections import deque
+from typing import Deque, List, Dict, Union
 
-def init_chat():
-    # returns an empty list of messages
+# Older turns are dropped once a conversation holds this many messages
+CHAT_HISTORY_MAX_MESSAGES = int(os.getenv("CHAT_HISTORY_MAX_MESSAGES", "50"))
+
+ChatHistory = Union[List[Dict], Deque[Dict]]
+
+def init_chat(max_messages: int = CHAT_HISTORY_MAX_MESSAGES) -> Deque[Dict]:
+    # returns an empty, bounded history of messages
     # each message: {"role": "user"/"bot", "text": "..."}
-    return []
+    return deque(maxlen=max_messages)
 
-def add_user_message(chat_history: List[Dict], text: str):
+def add_user_message(chat_history: ChatHistory, text: str):
     chat_history.append({"role": "user", "text": text})
     return chat_history
 
-def add_bot_message(chat_history: List[Dict], text: str):
+def add_bot_message(chat_history: ChatHistory, text: str):
     chat_history.append({"role": "bot", "text": text})
-    return chat_history
\ No newline at end of file
+    return chat_history
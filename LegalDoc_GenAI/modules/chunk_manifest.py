@@ -0,0 +1,59 @@
+# modules/chunk_manifest.py
+import hashlib
+from typing import Dict, List, Optional
+
+
+def chunk_keys(chunks: List[str]) -> List[str]:
+    """
+    Content-derived chunk keys: the SHA-256 of the text, with "-2", "-3"...
+    for repeats of the same text within a document.
+    """
+    seen: Dict[str, int] = {}
+    keys = []
+    for text in chunks:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+        seen[digest] = seen.get(digest, 0) + 1
+        keys.append(digest if seen[digest] == 1 else f"{digest}-{seen[digest]}")
+    return keys
+
+
+def build_manifest(chunks: List[str], metadatas: List[dict], previous: Optional[List[dict]] = None) -> List[dict]:
+    """
+    One {"key", "id", "metadata"} entry per chunk, in chunk order. The vector
+    ID is the key, except for chunks kept from `previous`, which keep their ID.
+    """
+    previous_ids = {entry["key"]: entry["id"] for entry in previous or []}
+    return [
+        {"key": key, "id": previous_ids.get(key, key), "metadata": meta}
+        for key, meta in zip(chunk_keys(chunks), metadatas)
+    ]
+
+
+def legacy_manifest(chunks: Optional[List[str]], vector_ids: List[str]) -> List[dict]:
+    """
+    Manifest of a document ingested with random vector IDs; its chunk metadata
+    is unknown. Without a chunk list matching the IDs, every vector is keyed by
+    its own ID, so a revision replaces them all.
+    """
+    keys = chunk_keys(chunks) if chunks is not None and len(chunks) == len(vector_ids) else vector_ids
+    return [{"key": key, "id": vid, "metadata": None} for key, vid in zip(keys, vector_ids)]
+
+
+def diff_manifests(old: List[dict], new: List[dict]) -> Dict[str, List[dict]]:
+    """
+    Splits `new` against `old` into "added" (to embed), "moved" (same text,
+    new metadata such as page or offsets), "unchanged", and the old entries
+    "removed" from the document.
+    """
+    old_by_key = {entry["key"]: entry for entry in old}
+    new_keys = {entry["key"] for entry in new}
+    diff = {"added": [], "moved": [], "unchanged": [], "removed": [e for e in old if e["key"] not in new_keys]}
+    for entry in new:
+        previous = old_by_key.get(entry["key"])
+        if previous is None:
+            diff["added"].append(entry)
+        elif previous["metadata"] != entry["metadata"]:
+            diff["moved"].append(entry)
+        else:
+            diff["unchanged"].append(entry)
+    return diff
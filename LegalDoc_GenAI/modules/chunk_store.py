@@ -0,0 +1,80 @@
+# modules/chunk_store.py
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from modules.artifact_store import ARTIFACT_DIR
+
+CHUNK_STORE_PATH = os.getenv("CHUNK_STORE_PATH", os.path.join(ARTIFACT_DIR, "chunks.sqlite3"))
+
+
+class ChunkTextStore:
+    """
+    Chunk text by (namespace, vector ID), for vectors upserted without the
+    text in their metadata (CHUNK_TEXT_IN_METADATA=false).
+    """
+
+    def __init__(self, path: str = CHUNK_STORE_PATH):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " namespace TEXT NOT NULL,"
+            " chunk_id TEXT NOT NULL,"
+            " text TEXT NOT NULL,"
+            " PRIMARY KEY (namespace, chunk_id)) WITHOUT ROWID"
+        )
+        self._conn.commit()
+
+    def put_many(self, namespace: str, ids: List[str], texts: List[str]):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (namespace, chunk_id, text) VALUES (?, ?, ?)",
+                [(namespace, chunk_id, text) for chunk_id, text in zip(ids, texts)]
+            )
+            self._conn.commit()
+
+    def get_many(self, namespace: str, ids: List[str]) -> Dict[str, str]:
+        found: Dict[str, str] = {}
+        unique = list(dict.fromkeys(ids))
+        with self._lock:
+            # SQLite limits the number of bound parameters per statement
+            for i in range(0, len(unique), 500):
+                part = unique[i:i + 500]
+                placeholders = ",".join("?" * len(part))
+                found.update(self._conn.execute(
+                    f"SELECT chunk_id, text FROM chunks WHERE namespace = ? AND chunk_id IN ({placeholders})",
+                    [namespace, *part]
+                ).fetchall())
+        return found
+
+    def delete_many(self, namespace: str, ids: List[str]):
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM chunks WHERE namespace = ? AND chunk_id = ?",
+                [(namespace, chunk_id) for chunk_id in ids]
+            )
+            self._conn.commit()
+
+    def delete_namespace(self, namespace: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks WHERE namespace = ?", (namespace,))
+            self._conn.commit()
+
+
+_CHUNK_STORE_INSTANCE: Optional[ChunkTextStore] = None
+_CHUNK_STORE_LOCK = threading.Lock()
+
+
+def get_chunk_store() -> ChunkTextStore:
+    """Return the process-wide chunk text store, opening it on first use."""
+    global _CHUNK_STORE_INSTANCE
+    with _CHUNK_STORE_LOCK:
+        if _CHUNK_STORE_INSTANCE is None:
+            _CHUNK_STORE_INSTANCE = ChunkTextStore()
+        return _CHUNK_STORE_INSTANCE
@@ -1,75 +1,295 @@
+import io
+import re
+import zlib
+from collections import deque
 from pathlib import Path
-from typing import List
+from typing import BinaryIO, Deque, Iterable, Iterator, List, Optional, Tuple, Union
 import docx
 import os
-from pypdf import PdfReader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from modules.extraction import iter_pdf_pages
+from modules.tokens import get_token_counter
 
 SUPPORTED = (".pdf", ".txt", ".docx")
 
-def load_txt(path: Path) -> str:
-    with open(path, "r", encoding="utf-8", errors="ignore") as f:
-        return f.read()
+# gemini-embedding-001 (EMBEDDING_MODEL) accepts up to 2048 input tokens; ~200 tokens is about the old 800-character chunks
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "200"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "40"))
+# About one paragraph in this many also ends a chunk, chosen by a hash of its text, so
+# chunk boundaries after an edit fall back in line with the previous version; 0 disables
+CHUNK_ANCHOR_EVERY = int(os.getenv("CHUNK_ANCHOR_EVERY", "16"))
+# Chunks this short carry no meaning on their own
+CHUNK_MIN_CHARS = 50
+# TXT files are streamed in blocks of this many characters
+TEXT_BLOCK_CHARS = 1 << 20
 
-def load_docx(path: Path) -> str:
-    doc = docx.Document(path)
+DocumentSource = Union[str, Path, bytes, bytearray, memoryview, BinaryIO]
+
+def _extension(source: DocumentSource, filename: Optional[str] = None) -> str:
+    """File extension from `filename`, or from `source` when it is a path."""
+    name = filename or (str(source) if isinstance(source, (str, Path)) else "")
+    ext = Path(name).suffix.lower()
+    if ext not in SUPPORTED:
+        raise ValueError(f"Unsupported file type: {ext}")
+    return ext
+
+def _binary(source: DocumentSource) -> BinaryIO:
+    """Binary file object over a path, in-memory bytes or an already open file."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    if hasattr(source, "read"):
+        return source
+    return open(source, "rb")
+
+def _iter_txt(source: DocumentSource) -> Iterator[str]:
+    binary = _binary(source)
+    f = io.TextIOWrapper(binary, encoding="utf-8", errors="ignore")
+    try:
+        while True:
+            block = f.read(TEXT_BLOCK_CHARS)
+            if not block:
+                break
+            yield block
+    finally:
+        if binary is source:
+            f.detach()  # leave file objects owned by the caller open
+        else:
+            f.close()
+
+def load_txt(source: DocumentSource) -> str:
+    return "".join(_iter_txt(source))
+
+def load_docx(source: DocumentSource) -> str:
+    doc = docx.Document(source if isinstance(source, (str, Path)) else _binary(source))
     full = []
     for para in doc.paragraphs:
         full.append(para.text)
     return "\n".join(full)
 
-def load_pdf(path: Path) -> str:
-    reader = PdfReader(str(path))
-    full = []
-    for page in reader.pages:
-        text = page.extract_text()
-        if text:
-            full.append(text)
-    return "\n".join(full)
+def load_pdf_pages(source: DocumentSource) -> List[Tuple[int, str]]:
+    return [(page_no, text) for page_no, text in iter_pdf_pages(source) if text]
 
-def load_file_to_text(filepath: str) -> str:
-    path = Path(filepath)
-    ext = path.suffix.lower()
-    if ext not in SUPPORTED:
-        raise ValueError(f"Unsupported file type: {ext}")
+def load_pdf(source: DocumentSource) -> str:
+    return "\n".join(text for _, text in load_pdf_pages(source))
+
+def iter_file_pages(source: DocumentSource, filename: Optional[str] = None) -> Iterator[Tuple[int, str]]:
+    """
+    Streams (page_number, text) pairs from a path, bytes or a binary file
+    object; `filename` gives the type when `source` is not a path.
+
+    PDFs keep their real page numbers; TXT and DOCX have no pages and come
+    back as consecutive segments of page 1, which concatenate to the same
+    text load_file_to_text returns.
+    """
+    ext = _extension(source, filename)
+    if ext == ".pdf":
+        yield from ((page_no, text) for page_no, text in iter_pdf_pages(source) if text)
+    elif ext == ".txt":
+        yield from ((1, block) for block in _iter_txt(source))
+    else:
+        doc = docx.Document(source if isinstance(source, (str, Path)) else _binary(source))
+        for i, para in enumerate(doc.paragraphs):
+            yield 1, para.text if i == 0 else "\n" + para.text
+
+def load_file_to_pages(source: DocumentSource, filename: Optional[str] = None) -> List[Tuple[int, str]]:
+    """
+    Returns (page_number, text) pairs; see iter_file_pages.
+    """
+    return list(iter_file_pages(source, filename))
+
+def load_file_to_text(source: DocumentSource, filename: Optional[str] = None) -> str:
+    ext = _extension(source, filename)
     if ext == ".txt":
-        return load_txt(path)
+        return load_txt(source)
     if ext == ".docx":
-        return load_docx(path)
+        return load_docx(source)
     if ext == ".pdf":
-        return load_pdf(path)
+        return load_pdf(source)
+
+# Paragraphs are packed whole when they fit; otherwise they are cut at line
+# breaks and sentence ends
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_UNIT_BREAK = re.compile(r"\n|[.!?]\s+")
+_WORD_BREAK = re.compile(r"(?<=\s)(?=\S)")
+
+
+def _split_at(text: str, pattern: re.Pattern) -> Iterator[str]:
+    """Pieces of `text` ending at each match of `pattern`; they concatenate back to `text`."""
+    pos = 0
+    for match in pattern.finditer(text):
+        if match.end() > pos:
+            yield text[pos:match.end()]
+            pos = match.end()
+    if pos < len(text):
+        yield text[pos:]
+
 
-def chunk_text(text: str, chunk_size: int = 800, chunk_overlap: int = 150) -> List[str]:
+def _fit_unit(piece: str, count, max_tokens: int) -> Iterator[Tuple[str, int]]:
+    """Yields (text, tokens) pieces of at most max_tokens, cutting at whitespace, or mid-word as a last resort."""
+    n = count(piece)
+    if n <= max_tokens:
+        yield piece, n
+        return
+    words = _WORD_BREAK.split(piece)
+    if len(words) == 1:
+        half = len(piece) // 2
+        yield from _fit_unit(piece[:half], count, max_tokens)
+        yield from _fit_unit(piece[half:], count, max_tokens)
+        return
+    half = len(words) // 2
+    yield from _fit_unit("".join(words[:half]), count, max_tokens)
+    yield from _fit_unit("".join(words[half:]), count, max_tokens)
+
+
+def iter_token_chunks(
+    pages: Iterable[Tuple[int, str]],
+    max_tokens: int = CHUNK_MAX_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+    min_chars: int = CHUNK_MIN_CHARS,
+    anchor_every: int = CHUNK_ANCHOR_EVERY,
+) -> Iterator[Tuple[str, dict]]:
     """
-    Optimized chunking for Google GenAI embeddings:
-    - Reduced chunk_size to 800 (from 1000) to stay well within token limits
-    - Reduced overlap to 150 to minimize redundancy
+    Streams (chunk, metadata) pairs from (page_number, text) pairs.
+
+    Chunks are packed from whole paragraphs, lines or sentences up to
+    `max_tokens`, and each starts with up to `overlap_tokens` of the previous
+    one. Pages are joined with "\n" when the page number changes, as in
+    load_file_to_text; metadata has "page", "page_end", "tokens" and the
+    chunk's "char_start"/"char_end" offsets in that joined text. Only the
+    current page and the units of one chunk are held in memory.
+
+    A chunk also ends after any paragraph whose text hashes to an anchor
+    (about one in `anchor_every`). An edit then only changes the chunks up to
+    the next anchor; with greedy packing alone every later boundary can shift.
     """
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size, 
-        chunk_overlap=chunk_overlap,
-        # Add separators optimized for better semantic chunking
-        separators=["\n\n", "\n", ". ", "! ", "? ", ", ", " ", ""]
-    )
-    chunks = splitter.split_text(text)
-    
-    # Filter out very small chunks that might not be meaningful
-    chunks = [chunk for chunk in chunks if len(chunk.strip()) > 50]
-    
-    return chunks
+    count = get_token_counter()
+    window: Deque[Tuple[str, int, int, int]] = deque()  # (text, offset, page, tokens)
+    window_tokens = 0
+    offset = 0
+    last_page = None
+    fresh = False  # the window holds more than the overlap carried from the last chunk
+
+    def _chunk():
+        raw = "".join(unit[0] for unit in window)
+        text = raw.strip()
+        if len(text) <= min_chars:
+            return None
+        start = window[0][1] + len(raw) - len(raw.lstrip())
+        # A trailing whitespace unit may be the joiner that opens the next page
+        page_end = next(unit[2] for unit in reversed(window) if unit[0].strip())
+        return text, {
+            "page": window[0][2],
+            "page_end": page_end,
+            "char_start": start,
+            "char_end": start + len(text),
+            "tokens": window_tokens,
+        }
+
+    def _units(text: str) -> Iterator[Tuple[str, int]]:
+        for piece in _split_at(text, _UNIT_BREAK):
+            yield from _fit_unit(piece, count, max_tokens)
+
+    def _cut(next_tokens: int):
+        """Ends the current chunk and keeps its tail as the start of the next one."""
+        nonlocal window_tokens, fresh
+        chunk = _chunk()
+        fresh = False
+        # Cut a whole-paragraph last unit into sentences so some of it can stay
+        tail_text, tail_offset, tail_page, tail_tokens = window[-1]
+        if tail_tokens > overlap_tokens:
+            window.pop()
+            window_tokens -= tail_tokens
+            for sub, k in _units(tail_text):
+                window.append((sub, tail_offset, tail_page, k))
+                window_tokens += k
+                tail_offset += len(sub)
+        while window and (window_tokens > overlap_tokens or window_tokens + next_tokens > max_tokens):
+            window_tokens -= window.popleft()[3]
+        while window and not window[0][0].strip():
+            window_tokens -= window.popleft()[3]
+        return chunk
+
+    def _is_anchor(paragraph: str) -> bool:
+        text = paragraph.strip()
+        return bool(anchor_every and text) and zlib.crc32(text.encode("utf-8")) % anchor_every == 0
+
+    for page_no, page_text in pages:
+        if not page_text:
+            continue
+        if last_page is not None and page_no != last_page:
+            page_text = "\n" + page_text
+        last_page = page_no
+        for paragraph in _split_at(page_text, _PARAGRAPH_BREAK):
+            n = count(paragraph)
+            units = [(paragraph, n)] if window_tokens + n <= max_tokens else _units(paragraph)
+            for unit, n in units:
+                if window and window_tokens + n > max_tokens:
+                    chunk = _cut(n)
+                    if chunk:
+                        yield chunk
+                # Chunks never start with whitespace-only units, so "page" is where the text starts
+                if window or unit.strip():
+                    window.append((unit, offset, page_no, n))
+                    window_tokens += n
+                    fresh = True
+                offset += len(unit)
+            if fresh and _is_anchor(paragraph):
+                chunk = _cut(0)
+                if chunk:
+                    yield chunk
+
+    if window and fresh:
+        chunk = _chunk()
+        if chunk:
+            yield chunk
+
 
-def file_to_chunks(filepath: str, chunk_size: int = 800, chunk_overlap: int = 150):
+def chunk_text(text: str, max_tokens: int = CHUNK_MAX_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> List[str]:
+    """
+    Token-budgeted chunking for Google GenAI embeddings; no chunk exceeds
+    max_tokens, so none can be truncated by the embedding model.
+    """
+    return [chunk for chunk, _ in iter_token_chunks([(1, text)], max_tokens, overlap_tokens)]
+
+def file_to_chunks(source: DocumentSource, max_tokens: int = CHUNK_MAX_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+                   filename: Optional[str] = None):
     """
     Convert file to chunks optimized for Google GenAI embeddings
     """
-    text = load_file_to_text(filepath)
-    chunks = chunk_text(text, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-    
-    print(f"Generated {len(chunks)} chunks with average length: {sum(len(c) for c in chunks) // len(chunks) if chunks else 0}")
-    
-    # Log any chunks that might be problematic
-    long_chunks = [i for i, chunk in enumerate(chunks) if len(chunk) > 1500]
-    if long_chunks:
-        print(f"Warning: {len(long_chunks)} chunks are longer than 1500 characters and may exceed token limits")
-    
-    return chunks
\ No newline at end of file
+    _, chunks, _ = pages_to_chunks(iter_file_pages(source, filename), max_tokens=max_tokens, overlap_tokens=overlap_tokens)
+    return chunks
+
+def pages_to_chunks(
+    pages: Iterable[Tuple[int, str]],
+    max_tokens: int = CHUNK_MAX_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+) -> Tuple[str, List[str], List[dict]]:
+    """
+    Chunk page texts joined the same way as load_file_to_text, and record
+    where each chunk came from.
+
+    Returns (full_text, chunks, metadatas) with the metadata described in
+    iter_token_chunks.
+    """
+    parts: List[str] = []
+    page_count = 0
+
+    def _tee():
+        nonlocal page_count
+        last_page = None
+        for page_no, text in pages:
+            if text:
+                if last_page is not None and page_no != last_page:
+                    parts.append("\n")
+                if page_no != last_page:
+                    page_count += 1
+                parts.append(text)
+                last_page = page_no
+            yield page_no, text
+
+    chunks, metadatas = [], []
+    for chunk, meta in iter_token_chunks(_tee(), max_tokens, overlap_tokens):
+        chunks.append(chunk)
+        metadatas.append(meta)
+
+    print(f"Generated {len(chunks)} chunks across {page_count} pages")
+    return "".join(parts), chunks, metadatas
@@ -0,0 +1,68 @@
+# modules/concurrency.py
+import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# Bounded executor for CPU-heavy work (PDF parsing, chunking) so it never runs on the event loop
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Maximum in-flight calls per upstream service, shared by all requests in this worker
+UPSTREAM_LIMITS: Dict[str, int] = {
+    "llm": int(os.getenv("LLM_MAX_CONCURRENCY", "16")),
+    "embedding": int(os.getenv("EMBED_MAX_CONCURRENCY", "8")),
+    "vector": int(os.getenv("VECTOR_MAX_CONCURRENCY", "16")),
+    "io": int(os.getenv("IO_MAX_CONCURRENCY", "32")),
+}
+
+_parse_executor = ThreadPoolExecutor(max_workers=PARSE_WORKERS, thread_name_prefix="parse")
+_io_executor = ThreadPoolExecutor(max_workers=sum(UPSTREAM_LIMITS.values()), thread_name_prefix="upstream")
+# Per event loop: the service runs one, but synchronous wrappers start a new one per call
+_semaphores: Dict[Tuple[str, asyncio.AbstractEventLoop], asyncio.Semaphore] = {}
+
+
+def _semaphore(upstream: str) -> asyncio.Semaphore:
+    if upstream not in UPSTREAM_LIMITS:
+        raise KeyError(f"Unknown upstream '{upstream}'")
+    key = (upstream, asyncio.get_running_loop())
+    sem = _semaphores.get(key)
+    if sem is None:
+        # Drop the semaphores of loops that have been closed
+        for stale in [k for k in _semaphores if k[1].is_closed()]:
+            del _semaphores[stale]
+        sem = _semaphores[key] = asyncio.Semaphore(UPSTREAM_LIMITS[upstream])
+    return sem
+
+
+@asynccontextmanager
+async def limit(upstream: str):
+    """Async context manager bounding concurrent calls to `upstream`."""
+    async with _semaphore(upstream):
+        yield
+
+
+async def run_limited(upstream: str, func: Callable[..., Awaitable[T]], *args, **kwargs) -> T:
+    """
+    Await `func(*args, **kwargs)` within the concurrency limit of `upstream`.
+    Wrap each attempt rather than a whole retrying call, so a slot is not held
+    through the backoff sleeps between attempts.
+    """
+    async with limit(upstream):
+        return await func(*args, **kwargs)
+
+
+async def run_cpu(func: Callable[..., T], *args, **kwargs) -> T:
+    """Run CPU-bound work on the bounded parse executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_parse_executor, functools.partial(func, *args, **kwargs))
+
+
+async def run_blocking(upstream: str, func: Callable[..., T], *args, **kwargs) -> T:
+    """Run a blocking client call off-loop, within the concurrency limit of `upstream`."""
+    loop = asyncio.get_running_loop()
+    async with limit(upstream):
+        return await loop.run_in_executor(_io_executor, functools.partial(func, *args, **kwargs))
@@ -0,0 +1,190 @@
+# modules/date_extraction.py
+import os
+import re
+import bisect
+from datetime import date
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+# Minimum score for a candidate to be accepted without the LLM, and how far
+# ahead of the next distinct date it has to be.
+DATE_PREPASS_MIN_SCORE = float(os.getenv("DATE_PREPASS_MIN_SCORE", "3.0"))
+DATE_PREPASS_MIN_MARGIN = float(os.getenv("DATE_PREPASS_MIN_MARGIN", "2.0"))
+DATE_PREPASS_WINDOW_CHARS = int(os.getenv("DATE_PREPASS_WINDOW_CHARS", "300"))
+DATE_PREPASS_MAX_WINDOWS = int(os.getenv("DATE_PREPASS_MAX_WINDOWS", "8"))
+
+MONTHS = {
+    "jan": 1, "january": 1, "feb": 2, "february": 2, "mar": 3, "march": 3, "apr": 4, "april": 4,
+    "may": 5, "jun": 6, "june": 6, "jul": 7, "july": 7, "aug": 8, "august": 8,
+    "sep": 9, "sept": 9, "september": 9, "oct": 10, "october": 10, "nov": 11, "november": 11,
+    "dec": 12, "december": 12,
+}
+_MONTH = r"(?P<month>jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sept?(?:ember)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)\.?"
+
+# Indian documents write numeric dates day first: 15.03.2026, 15/03/2026, 15-03-26
+_DATE_PATTERNS = [
+    re.compile(r"\b(?P<day>[0-3]?\d)(?P<sep>[./-])(?P<month>[01]?\d)(?P=sep)(?P<year>(?:19|20)?\d{2})\b"),
+    re.compile(r"\b(?P<year>(?:19|20)\d{2})-(?P<month>[01]\d)-(?P<day>[0-3]\d)\b"),
+    re.compile(r"\b(?P<day>[0-3]?\d)(?:st|nd|rd|th)?[\s-]+(?:of\s+)?" + _MONTH + r"[\s,-]+(?P<year>(?:19|20)\d{2})\b", re.IGNORECASE),
+    re.compile(r"\b" + _MONTH + r"\s+(?P<day>[0-3]?\d)(?:st|nd|rd|th)?,?\s+(?P<year>(?:19|20)\d{2})\b", re.IGNORECASE),
+]
+
+# Phrases that mark a date as a deadline (weight) when they appear shortly before it;
+# cue patterns are lowercase and matched against the lowercased text
+_DEADLINE_CUES = [
+    (re.compile(r"last\s+date"), 4.0),
+    (re.compile(r"on\s+or\s+before"), 4.0),
+    (re.compile(r"due\s+date|deadline|closing\s+date"), 4.0),
+    (re.compile(r"not\s+later\s+than|no\s+later\s+than|latest\s+by"), 4.0),
+    (re.compile(r"submission|submit|bid\s+due|tenders?\s+(?:will|shall)\s+be\s+received"), 2.0),
+    (re.compile(r"\b(?:before|by|till|until|upto|up\s+to)\b"), 1.0),
+    (re.compile(r"valid\s+(?:till|until|upto)|expir"), 1.5),
+]
+# Corrigenda move deadlines ("extended from 10.03.2026 to 24.03.2026"): the
+# revised date after "to" gains, the superseded one after "from" loses
+_REVISION_CUE = re.compile(r"extended|revised|postponed|rescheduled|deferred")
+_REVISED_TO = re.compile(r"\b(?:to|till|until|upto|up\s+to)\s*$")
+_SUPERSEDED_FROM = re.compile(r"\bfrom\s*$")
+_REVISION_WEIGHT = 3.0
+# Phrases that mark a date as something other than a deadline
+_NON_DEADLINE_CUES = [
+    (re.compile(r"\bdated\b|date\s+of\s+issue|issued\s+on|published|\bref(?:erence)?\b"), -3.0),
+    (re.compile(r"date\s+of\s+birth|\bd\.?o\.?b\b|joined\s+on|w\.?e\.?f"), -3.0),
+]
+_CUE_LOOKBEHIND_CHARS = 80
+# Numbered clauses read like day-first dates ("clause 2.1.12"); a dotted match
+# is a section number when a clause word precedes it or it continues with ".N"
+_SECTION_WORDS = re.compile(
+    r"\b(?:clause|section|sec|sub-clause|para(?:graph)?|article|rule|chapter|annexure|appendix|schedule|table|fig(?:ure)?)\.?\s*$",
+    re.IGNORECASE,
+)
+_NUMBER_BEFORE = re.compile(r"\d\.$")
+_NUMBER_AFTER = re.compile(r"\.\d")
+# Cues only apply within the date's own sentence or line
+_SENTENCE_BREAK = re.compile(r"[.;:!?]\s+(?=[A-Z])|\n\s*\n")
+
+
+@dataclass
+class DateCandidate:
+    value: date
+    start: int
+    end: int
+    score: float
+
+
+@dataclass
+class PrepassResult:
+    decided: bool
+    last_date: Optional[date]
+    candidates: List[DateCandidate]
+    context: str  # windows around the candidates (the whole text if none), for the LLM when not decided
+
+
+def _to_date(match: re.Match) -> Optional[date]:
+    day = int(match.group("day"))
+    month_raw = match.group("month")
+    month = int(month_raw) if month_raw.isdigit() else MONTHS.get(month_raw.lower().rstrip("."))
+    year = int(match.group("year"))
+    if year < 100:
+        year += 2000
+    try:
+        return date(year, month, day)
+    except (TypeError, ValueError):
+        return None
+
+
+def _score(text: str, start: int) -> float:
+    before = text[max(0, start - _CUE_LOOKBEHIND_CHARS):start]
+    breaks = list(_SENTENCE_BREAK.finditer(before))
+    if breaks:
+        before = before[breaks[-1].end():]
+    before = before.lower()
+    score = 0.0
+    for pattern, weight in _DEADLINE_CUES + _NON_DEADLINE_CUES:
+        found = list(pattern.finditer(before))
+        if found:
+            # Cues closer to the date count for more
+            distance = len(before) - found[-1].end()
+            score += weight * (1.0 if distance < 30 else 0.6)
+    if _REVISION_CUE.search(before):
+        if _REVISED_TO.search(before):
+            score += _REVISION_WEIGHT
+        elif _SUPERSEDED_FROM.search(before):
+            score -= _REVISION_WEIGHT
+    return score
+
+
+def _is_section_number(text: str, match: re.Match) -> bool:
+    if match.groupdict().get("sep") != ".":
+        return False
+    start, end = match.span()
+    if _NUMBER_BEFORE.search(text, max(0, start - 2), start) or _NUMBER_AFTER.match(text, end):
+        return True
+    # Dates with a two-digit year are written 05.03.26, not 5.3.26
+    if len(match.group("year")) == 2 and (len(match.group("day")) < 2 or len(match.group("month")) < 2):
+        return True
+    return bool(_SECTION_WORDS.search(text[max(0, start - 20):start]))
+
+
+def find_date_candidates(text: str) -> List[DateCandidate]:
+    """All parseable dates in `text`, scored by nearby deadline phrases, best first."""
+    candidates: List[DateCandidate] = []
+    # Spans claimed by earlier patterns, sorted and disjoint; matches of one pattern never overlap each other
+    starts: List[int] = []
+    ends: List[int] = []
+    for pattern in _DATE_PATTERNS:
+        spans: List[Tuple[int, int]] = []
+        for match in pattern.finditer(text):
+            start, end = match.span()
+            i = bisect.bisect_left(starts, end)
+            if i and ends[i - 1] > start:
+                continue
+            value = _to_date(match)
+            if value is None or _is_section_number(text, match):
+                continue
+            spans.append((start, end))
+            candidates.append(DateCandidate(value, start, end, _score(text, start)))
+        if spans:
+            merged = sorted(list(zip(starts, ends)) + spans)
+            starts = [s for s, _ in merged]
+            ends = [e for _, e in merged]
+    candidates.sort(key=lambda c: (-c.score, c.start))
+    return candidates
+
+
+def _windows(text: str, candidates: List[DateCandidate]) -> str:
+    spans = []
+    for c in candidates[:DATE_PREPASS_MAX_WINDOWS]:
+        spans.append((max(0, c.start - DATE_PREPASS_WINDOW_CHARS), min(len(text), c.end + DATE_PREPASS_WINDOW_CHARS)))
+    spans.sort()
+    merged: List[List[int]] = []
+    for s, e in spans:
+        if merged and s <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], e)
+        else:
+            merged.append([s, e])
+    return "\n...\n".join(text[s:e] for s, e in merged)
+
+
+def prepass_last_date(text: str) -> PrepassResult:
+    """
+    Decide the deadline locally when one date clearly stands out.
+
+    decided=True means the LLM can be skipped: the best candidate scores at
+    least DATE_PREPASS_MIN_SCORE and leads the best *different* date by
+    DATE_PREPASS_MIN_MARGIN. Otherwise `context` holds what the LLM should
+    read: the text windows around the candidates, or the whole text when it
+    has no parseable date, since a deadline may be phrased in a way the
+    patterns and cues do not cover.
+    """
+    candidates = find_date_candidates(text)
+    if not candidates:
+        return PrepassResult(False, None, [], text)
+
+    best = candidates[0]
+    runner_up = next((c for c in candidates[1:] if c.value != best.value), None)
+    margin = best.score - (runner_up.score if runner_up else 0.0)
+    if best.score >= DATE_PREPASS_MIN_SCORE and margin >= DATE_PREPASS_MIN_MARGIN:
+        return PrepassResult(True, best.value, candidates, "")
+
+    return PrepassResult(False, None, candidates, _windows(text, candidates))
@@ -0,0 +1,196 @@
+# modules/department_classifier.py
+import os
+import re
+import json
+import math
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+from models import Department
+
+# Whether a confident local prediction skips the LLM. The defaults below were fitted
+# with benchmarks/eval_department_classifier.py on benchmarks/department_labels.jsonl
+DEPARTMENT_CLASSIFIER_SKIP_LLM = os.getenv("DEPARTMENT_CLASSIFIER_SKIP_LLM", "true").lower() in ("1", "true", "yes")
+# Below this top-class probability the LLM decides instead
+DEPARTMENT_CLASSIFIER_THRESHOLD = float(os.getenv("DEPARTMENT_CLASSIFIER_THRESHOLD", "0.55"))
+# Evidence a confident prediction also needs: cosine similarity to the top
+# department's centroid, and distinct words shared with its seed documents.
+# The softmax alone is near 1 for a single matching word such as "minutes".
+DEPARTMENT_CLASSIFIER_MIN_SIMILARITY = float(os.getenv("DEPARTMENT_CLASSIFIER_MIN_SIMILARITY", "0.15"))
+DEPARTMENT_CLASSIFIER_MIN_TERMS = int(os.getenv("DEPARTMENT_CLASSIFIER_MIN_TERMS", "3"))
+# Softmax temperature over cosine similarities
+DEPARTMENT_CLASSIFIER_TEMPERATURE = float(os.getenv("DEPARTMENT_CLASSIFIER_TEMPERATURE", "0.05"))
+# Secondary departments are included when their probability is at least this fraction of the top one
+DEPARTMENT_CLASSIFIER_SECONDARY_RATIO = float(os.getenv("DEPARTMENT_CLASSIFIER_SECONDARY_RATIO", "0.6"))
+# Optional JSONL of {"text": ..., "departments": [...]} to extend the built-in seed corpus
+DEPARTMENT_CORPUS_PATH = os.getenv("DEPARTMENT_CORPUS_PATH")
+
+# Small labeled seed corpus: typical wording of KMRL documents routed to each department
+SEED_CORPUS: Dict[Department, List[str]] = {
+    Department.OPERATIONS: [
+        "train operations timetable service schedule headway revenue service station controller",
+        "operations control centre occ train operator duty roster shift crew control",
+        "passenger services station operations crowd management service disruption incident report",
+        "ticketing automatic fare collection afc gates platform operations train running delay",
+    ],
+    Department.ENGINEERING_MAINTENANCE: [
+        "maintenance job card rolling stock depot inspection overhaul preventive maintenance schedule",
+        "track maintenance signalling telecom cbtc overhead equipment traction power substation",
+        "equipment failure breakdown repair spare parts escalator elevator lift fault rectification",
+        "civil structure viaduct bridge inspection engineering drawings technical specification",
+    ],
+    Department.PROCUREMENT_STORES: [
+        "tender notice bid submission e-procurement bidder vendor quotation purchase order",
+        "earnest money deposit emd pre-bid meeting technical bid financial bid tender document",
+        "stores inventory material receipt indent supply contract rate contract corrigendum tender",
+        "request for proposal rfp expression of interest eoi procurement of goods works services",
+    ],
+    Department.SAFETY_REGULATORY: [
+        "safety circular fire safety drill hazard risk assessment accident investigation",
+        "regulatory compliance commissioner of metro rail safety cmrs inspection statutory approval",
+        "occupational health safety ppe standard operating procedure safety audit near miss",
+        "environmental clearance pollution control compliance certificate legal notice regulation",
+    ],
+    Department.HR: [
+        "recruitment notification vacancy appointment candidates interview selection employees",
+        "leave policy promotion transfer posting staff training attendance service rules",
+        "salary allowance pay scale employee welfare disciplinary proceedings personnel office order",
+        "human resources manpower deputation retirement pension grievance staff circular",
+    ],
+    Department.FINANCE_ACCOUNTS: [
+        "invoice payment bill accounts payable receipt voucher budget allocation expenditure",
+        "gst tax deduction tds audit financial statement balance sheet account reconciliation",
+        "loan repayment interest fund release sanction amount rupees crore lakh cost estimate",
+        "bank guarantee performance security refund penalty liquidated damages billing finance",
+    ],
+    Department.EXECUTIVE: [
+        "board of directors meeting agenda minutes resolution managing director approval",
+        "government of india government of kerala ministry policy decision memorandum of understanding",
+        "annual report strategic plan project progress review high level committee directive",
+        "press release chairman directors delegation of powers corporate governance",
+    ],
+}
+
+_TOKEN = re.compile(r"[a-z][a-z0-9\-]+")
+_STOPWORDS = frozenset(
+    "the and for with that this from are was were will shall has have been all any not but its may "
+    "our their which such other into per also can".split()
+)
+
+
+def _features(text: str) -> Counter:
+    words = [w for w in _TOKEN.findall(text.lower()) if w not in _STOPWORDS]
+    feats = Counter(words)
+    feats.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    return feats
+
+
+@dataclass
+class DepartmentScores:
+    probabilities: Dict[Department, float]
+    departments: List[Department] = field(default_factory=list)
+    confidence: float = 0.0
+    similarity: float = 0.0  # cosine similarity to the top department's centroid
+    matched_terms: int = 0  # distinct words shared with the top department's seed documents
+
+    @property
+    def is_confident(self) -> bool:
+        return (
+            self.confidence >= DEPARTMENT_CLASSIFIER_THRESHOLD
+            and self.similarity >= DEPARTMENT_CLASSIFIER_MIN_SIMILARITY
+            and self.matched_terms >= DEPARTMENT_CLASSIFIER_MIN_TERMS
+        )
+
+
+class DepartmentClassifier:
+    """
+    Nearest-centroid classifier over TF-IDF vectors of unigrams and bigrams.
+
+    Each department's centroid is the mean of its normalized seed-document
+    vectors. Cosine similarities to the centroids are turned into
+    probabilities with a temperature softmax; the top similarity and the
+    number of matched words are kept as evidence, since the softmax only
+    reflects how the departments compare with each other.
+    """
+
+    def __init__(self, corpus: Optional[Dict[Department, List[str]]] = None,
+                 temperature: float = DEPARTMENT_CLASSIFIER_TEMPERATURE):
+        self.temperature = temperature
+        corpus = corpus or SEED_CORPUS
+        docs = [(dept, _features(text)) for dept, texts in corpus.items() for text in texts]
+
+        df = Counter()
+        for _, feats in docs:
+            df.update(feats.keys())
+        n = len(docs)
+        self.idf = {term: math.log((1 + n) / (1 + count)) + 1.0 for term, count in df.items()}
+
+        sums: Dict[Department, Counter] = {}
+        counts = Counter()
+        for dept, feats in docs:
+            vec = self._vectorize(feats)
+            sums.setdefault(dept, Counter()).update(vec)
+            counts[dept] += 1
+        self.centroids = {dept: self._normalize({t: w / counts[dept] for t, w in vec.items()}) for dept, vec in sums.items()}
+
+    @staticmethod
+    def _normalize(vec: Dict[str, float]) -> Dict[str, float]:
+        norm = math.sqrt(sum(w * w for w in vec.values()))
+        return {t: w / norm for t, w in vec.items()} if norm else vec
+
+    def _vectorize(self, feats: Counter) -> Dict[str, float]:
+        # Sublinear tf; terms unseen in the corpus cannot match any centroid, so skip them
+        vec = {t: (1.0 + math.log(c)) * self.idf[t] for t, c in feats.items() if t in self.idf}
+        return self._normalize(vec)
+
+    def classify(self, text: str) -> DepartmentScores:
+        vec = self._vectorize(_features(text))
+        sims = {dept: sum(w * centroid.get(t, 0.0) for t, w in vec.items()) for dept, centroid in self.centroids.items()}
+        top = max(sims.values())
+        exp = {dept: math.exp((s - top) / self.temperature) for dept, s in sims.items()}
+        total = sum(exp.values())
+        probs = {dept: e / total for dept, e in exp.items()}
+
+        ranked = sorted(probs.items(), key=lambda kv: kv[1], reverse=True)
+        best_prob = ranked[0][1]
+        selected = [dept for dept, p in ranked if p >= best_prob * DEPARTMENT_CLASSIFIER_SECONDARY_RATIO]
+        # A document with no known vocabulary at all carries no signal
+        confidence = best_prob if vec else 0.0
+        centroid = self.centroids[ranked[0][0]]
+        matched = sum(1 for t in vec if " " not in t and t in centroid)
+        return DepartmentScores(probabilities=probs, departments=selected, confidence=confidence,
+                                similarity=top, matched_terms=matched)
+
+    def classify_batch(self, texts: Iterable[str]) -> List[DepartmentScores]:
+        return [self.classify(text) for text in texts]
+
+
+def _load_corpus() -> Dict[Department, List[str]]:
+    corpus = {dept: list(texts) for dept, texts in SEED_CORPUS.items()}
+    if DEPARTMENT_CORPUS_PATH and os.path.exists(DEPARTMENT_CORPUS_PATH):
+        with open(DEPARTMENT_CORPUS_PATH, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    row = json.loads(line)
+                    for dept in row["departments"]:
+                        corpus.setdefault(Department(dept), []).append(row["text"])
+    return corpus
+
+
+_CLASSIFIER: Optional[DepartmentClassifier] = None
+
+
+def get_department_classifier() -> DepartmentClassifier:
+    global _CLASSIFIER
+    if _CLASSIFIER is None:
+        _CLASSIFIER = DepartmentClassifier(_load_corpus())
+    return _CLASSIFIER
+
+
+def classify_department(text: str) -> DepartmentScores:
+    return get_department_classifier().classify(text)
+
+
+def classify_departments_batch(texts: Iterable[str]) -> List[DepartmentScores]:
+    return get_department_classifier().classify_batch(texts)
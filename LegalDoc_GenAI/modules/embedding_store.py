@@ -1,12 +1,21 @@
 import os
 import time
 import uuid
+import sqlite3
+import hashlib
+import threading
 import numpy as np
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from dotenv import load_dotenv
-from typing import List
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 from langchain.schema import Document
 import google.generativeai as genai
 from pinecone import Pinecone
+from modules.local_index import get_local_index
+from modules.chunk_store import get_chunk_store
+from modules.rate_limiter import CircuitOpenError, get_limiter
+from modules.tokens import count_tokens
 
 # --- Load environment variables ---
 load_dotenv()
@@ -14,7 +23,18 @@ load_dotenv()
 # Google GenAI configuration
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 EMBEDDING_MODEL = "gemini-embedding-001"  # or "text-embedding-004"
-EMBEDDING_DIM = 3072  # Google's embedding size
+# gemini-embedding-001 returns 3072 dimensions; 1536 or 768 keep most of the recall
+# at a half or a quarter of the size (see benchmarks/bench_vector_storage.py).
+# Changing it requires re-indexing: a new Pinecone index and fresh local data.
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "3072"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "100"))  # texts per batchEmbedContents request (API max 100)
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))  # batch requests kept in flight
+EMBED_REQUEUE_LIMIT = int(os.getenv("EMBED_REQUEUE_LIMIT", "3"))  # times a failing batch is split and re-queued
+
+# On-disk embedding cache configuration
+EMBED_CACHE_ENABLED = os.getenv("EMBED_CACHE_ENABLED", "true").lower() == "true"
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "data/cache/embeddings.sqlite3")
+EMBED_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "200000"))  # ~2.4 GB at 3072 dims, ~0.6 GB at 768
 
 if not GOOGLE_API_KEY:
     raise ValueError("GOOGLE_API_KEY not found in environment variables")
@@ -27,71 +47,274 @@ PINECONE_API_KEY = os.getenv("PINECONE_API_KEY_2")
 PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME_2", "doc-embeddings")
 PINECONE_METRIC = os.getenv("PINECONE_METRIC", "cosine")
 USE_PINECONE = bool(PINECONE_API_KEY)
+# false keeps chunk text out of vector metadata, in modules/chunk_store, and fetches it by ID after a query
+CHUNK_TEXT_IN_METADATA = os.getenv("CHUNK_TEXT_IN_METADATA", "true").lower() == "true"
+
+# Vector backend: "pinecone" or "local" (in-process memory-mapped index, see modules/local_index.py)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone" if USE_PINECONE else "local").lower()
+USE_LOCAL_INDEX = VECTOR_BACKEND == "local"
+# Namespaces searched in parallel when a conversation has several documents attached
+QUERY_NAMESPACE_CONCURRENCY = int(os.getenv("QUERY_NAMESPACE_CONCURRENCY", "8"))
 
 # Initialize Pinecone client
 pc = Pinecone(api_key=PINECONE_API_KEY) if USE_PINECONE else None
 
 
+# --- Persistent Embedding Cache ---
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache backed by SQLite.
+
+    Vectors are stored as raw float32 blobs keyed by a SHA-256 of
+    (model, task type, output dimension, text). When the number of entries
+    exceeds `max_entries`, the least recently used entries are evicted.
+    """
+
+    def __init__(self, path: str = EMBED_CACHE_PATH, max_entries: int = EMBED_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " dim INTEGER NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings(last_access)")
+        self._conn.commit()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def make_key(text: str, model_name: str, task_type: str, dim: int) -> str:
+        h = hashlib.sha256()
+        h.update(f"{model_name}\x00{task_type}\x00{dim}\x00".encode("utf-8"))
+        h.update(text.encode("utf-8"))
+        return h.hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Return cached vectors for the given keys and mark them as recently used."""
+        found: Dict[str, List[float]] = {}
+        unique = list(dict.fromkeys(keys))
+        now = time.time()
+        with self._lock:
+            # SQLite limits the number of bound parameters per statement
+            for i in range(0, len(unique), 500):
+                part = unique[i:i + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", part
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+                if rows:
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                        [(now, key) for key, _ in rows]
+                    )
+            self._conn.commit()
+            self.hits += sum(1 for k in keys if k in found)
+            self.misses += sum(1 for k in keys if k not in found)
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]):
+        """Store vectors, evicting least recently used entries if over capacity."""
+        if not items:
+            return
+        now = time.time()
+        rows = []
+        for key, vec in items.items():
+            arr = np.asarray(vec, dtype=np.float32)
+            rows.append((key, int(arr.shape[0]), arr.tobytes(), now))
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, dim, vector, last_access) VALUES (?, ?, ?, ?)", rows
+            )
+            self._count += self._conn.total_changes - before
+            overflow = self._count - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_access ASC LIMIT ?)", (overflow,)
+                )
+                self._count -= overflow
+                self.evictions += overflow
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": self._count,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
 # --- Google GenAI Embeddings Wrapper ---
 class GoogleGenAIEmbeddings:
     """Wrapper class for Google GenAI embeddings to match LangChain interface"""
 
-    def __init__(self, model_name: str = EMBEDDING_MODEL):
+    def __init__(
+        self,
+        model_name: str = EMBEDDING_MODEL,
+        batch_size: int = EMBED_BATCH_SIZE,
+        concurrency: int = EMBED_CONCURRENCY,
+        cache: Optional[EmbeddingCache] = None
+    ):
         self.model_name = model_name
-
-    def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        """Embed a list of documents"""
-        embeddings = []
-        batch_size = 10  # adjust depending on quota/rate limits
-
-        for i in range(0, len(texts), batch_size):
-            batch = texts[i:i + batch_size]
-            batch_embeddings = []
-
-            for text in batch:
-                try:
-                    result = genai.embed_content(
-                        model=f"models/{self.model_name}",
-                        content=text,
-                        task_type="RETRIEVAL_DOCUMENT"
-                    )
-                    batch_embeddings.append(result["embedding"])
-                except Exception as e:
-                    print(f"Error embedding text: {e}")
-                    batch_embeddings.append([0.0] * EMBEDDING_DIM)
-
-            embeddings.extend(batch_embeddings)
-
+        self.batch_size = max(1, min(batch_size, 100))
+        self.concurrency = max(1, concurrency)
+        self.cache = cache
+
+    def _cache_key(self, text: str, task_type: str) -> str:
+        return EmbeddingCache.make_key(text, self.model_name, task_type, EMBEDDING_DIM)
+
+    @staticmethod
+    def _fit_dimension(vec: List[float]) -> List[float]:
+        """Truncates to EMBEDDING_DIM and renormalizes; only full-size outputs come back unit length."""
+        arr = np.asarray(vec[:EMBEDDING_DIM], dtype=np.float32)
+        norm = np.linalg.norm(arr)
+        return (arr / norm if norm > 0 else arr).tolist()
+
+    def _embed_batch(self, batch: List[str], task_type: str) -> List[List[float]]:
+        """Embed a batch of texts with a single batchEmbedContents request, within the shared quota."""
+        result = get_limiter("embedding").call(
+            genai.embed_content,
+            model=f"models/{self.model_name}",
+            content=batch,
+            task_type=task_type,
+            output_dimensionality=EMBEDDING_DIM,
+            tokens=sum(count_tokens(t) for t in batch)
+        )
+        return [self._fit_dimension(vec) for vec in result["embedding"]]
+
+    def iter_embed_documents(self, texts: List[str]) -> Iterator[Tuple[List[int], List[List[float]]]]:
+        """
+        Embed a list of documents, yielding (input positions, vectors) groups
+        as soon as each is available: cached vectors first, then each batch
+        request as it completes.
+
+        Each distinct missing text is sent once, `batch_size` at a time, with
+        up to `concurrency` batch requests in flight. A batch that still fails
+        after the limiter's retries is re-queued behind the others, split in
+        halves to isolate a bad text, up to EMBED_REQUEUE_LIMIT times; after
+        that the error is raised rather than yielding placeholder vectors.
+        """
+        if not texts:
+            return
+
+        task_type = "RETRIEVAL_DOCUMENT"
+        keys = [self._cache_key(t, task_type) for t in texts]
+        positions: Dict[str, List[int]] = {}
+        for i, key in enumerate(keys):
+            positions.setdefault(key, []).append(i)
+
+        cached: Dict[str, List[float]] = self.cache.get_many(list(positions)) if self.cache else {}
+        if cached:
+            hits = [i for key in cached for i in positions[key]]
+            yield hits, [cached[keys[i]] for i in hits]
+
+        missing = [key for key in positions if key not in cached]
+        if not missing:
+            return
+        batches = [missing[i:i + self.batch_size] for i in range(0, len(missing), self.batch_size)]
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(batches))) as pool:
+            pending: Dict[Future, Tuple[List[str], int]] = {}
+
+            def submit(batch: List[str], requeues: int):
+                future = pool.submit(self._embed_batch, [texts[positions[key][0]] for key in batch], task_type)
+                pending[future] = (batch, requeues)
+
+            for batch in batches:
+                submit(batch, 0)
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    batch, requeues = pending.pop(future)
+                    try:
+                        vectors = future.result()
+                    except Exception as e:
+                        if isinstance(e, CircuitOpenError) or requeues >= EMBED_REQUEUE_LIMIT:
+                            for other in pending:
+                                other.cancel()
+                            raise
+                        print(f"Re-queueing batch of {len(batch)} texts after error: {e}")
+                        half = (len(batch) + 1) // 2
+                        for part in (batch[:half], batch[half:]):
+                            if part:
+                                submit(part, requeues + 1)
+                        continue
+                    if self.cache:
+                        self.cache.put_many(dict(zip(batch, vectors)))
+                    indices, out = [], []
+                    for key, vec in zip(batch, vectors):
+                        for i in positions[key]:
+                            indices.append(i)
+                            out.append(vec)
+                    yield indices, out
+
+    def embed_documents(
+        self,
+        texts: List[str],
+        on_progress: Optional[Callable[[int, int], None]] = None
+    ) -> List[List[float]]:
+        """
+        Embed a list of documents; see iter_embed_documents.
+
+        Embeddings are returned in input order and `on_progress(done, total)`
+        is called as each group completes.
+        """
+        total = len(texts)
+        embeddings: List[Optional[List[float]]] = [None] * total
+        done = 0
+        for indices, vectors in self.iter_embed_documents(texts):
+            for i, vec in zip(indices, vectors):
+                embeddings[i] = vec
+            done += len(indices)
+            if on_progress:
+                on_progress(done, total)
         return embeddings
 
     def embed_query(self, text: str) -> List[float]:
         """Embed a single query string"""
-        try:
-            result = genai.embed_content(
-                model=f"models/{self.model_name}",
-                content=text,
-                task_type="RETRIEVAL_QUERY"
-            )
-            return result["embedding"]
-        except Exception as e:
-            print(f"Error embedding query: {e}")
-            if "quota" in str(e).lower() or "rate limit" in str(e).lower():
-                print("Rate limit hit! Waiting 10s and retrying...")
-                time.sleep(10)
-                try:
-                    result = genai.embed_content(
-                        model=f"models/{self.model_name}",
-                        content=text,
-                        task_type="RETRIEVAL_QUERY"
-                    )
-                    return result["embedding"]
-                except Exception as retry_e:
-                    print(f"Retry also failed: {retry_e}")
-            return [0.0] * EMBEDDING_DIM
+        key = self._cache_key(text, "RETRIEVAL_QUERY")
+        if self.cache:
+            cached = self.cache.get_many([key])
+            if key in cached:
+                return cached[key]
+
+        embedding = self._embed_query_uncached(text)
+        if self.cache:
+            self.cache.put_many({key: embedding})
+        return embedding
+
+    def _embed_query_uncached(self, text: str) -> List[float]:
+        result = get_limiter("embedding").call(
+            genai.embed_content,
+            model=f"models/{self.model_name}",
+            content=text,
+            task_type="RETRIEVAL_QUERY",
+            output_dimensionality=EMBEDDING_DIM,
+            tokens=count_tokens(text)
+        )
+        return self._fit_dimension(result["embedding"])
 
 
 # --- Cached embedding model instance ---
-_EMBEDDING_MODEL_INSTANCE = GoogleGenAIEmbeddings(model_name=EMBEDDING_MODEL)
+_EMBEDDING_CACHE = EmbeddingCache() if EMBED_CACHE_ENABLED else None
+_EMBEDDING_MODEL_INSTANCE = GoogleGenAIEmbeddings(model_name=EMBEDDING_MODEL, cache=_EMBEDDING_CACHE)
 
 
 def get_embedding_model():
@@ -99,74 +322,191 @@ def get_embedding_model():
     return _EMBEDDING_MODEL_INSTANCE
 
 
+def get_embedding_cache_stats() -> Optional[dict]:
+    """Return hit/miss counters of the embedding cache, or None if disabled."""
+    return _EMBEDDING_CACHE.stats() if _EMBEDDING_CACHE else None
+
+
 # --- Pinecone Helpers ---
 def init_pinecone_index(index_name: str = PINECONE_INDEX_NAME):
     if not USE_PINECONE:
         raise RuntimeError("Pinecone is not configured. Set PINECONE_API_KEY in .env")
 
     # Ensure index exists with correct dimensions
-    if index_name not in [idx.name for idx in pc.list_indexes()]:
+    existing = {idx.name: idx for idx in pc.list_indexes()}
+    if index_name not in existing:
         print(f"Creating Pinecone index '{index_name}' with dim={EMBEDDING_DIM}, metric={PINECONE_METRIC}")
         pc.create_index(
             name=index_name,
             dimension=EMBEDDING_DIM,
             metric=PINECONE_METRIC
         )
+    elif existing[index_name].dimension != EMBEDDING_DIM:
+        raise RuntimeError(
+            f"Pinecone index '{index_name}' has dimension {existing[index_name].dimension} but EMBEDDING_DIM is "
+            f"{EMBEDDING_DIM}; set PINECONE_INDEX_NAME_2 to a new index name when changing EMBEDDING_DIM"
+        )
 
     return pc.Index(index_name)
 
 
-def _normalize_vector(vec):
+class _LocalMatch:
+    def __init__(self, id: str, score: float, metadata: dict):
+        self.id = id
+        self.score = score
+        self.metadata = metadata
+
+
+class _LocalQueryResult:
+    def __init__(self, matches: List[_LocalMatch]):
+        self.matches = matches
+
+
+class _LocalIndexAdapter:
+    """Exposes the local index through the subset of the Pinecone Index API used here."""
+
+    def upsert(self, vectors, namespace: str = None):
+        ids = [v[0] for v in vectors]
+        metadatas = [v[2] for v in vectors]
+        get_local_index().upsert(ids, np.stack([v[1] for v in vectors]), metadatas, namespace=namespace)
+
+    def query(self, vector, top_k: int, include_metadata: bool = True, namespace: str = None):
+        hits = get_local_index().query(vector, top_k=top_k, namespace=namespace)
+        return _LocalQueryResult([_LocalMatch(vid, score, meta) for vid, score, meta in hits])
+
+    def fetch(self, ids: List[str], namespace: str = None) -> Dict[str, np.ndarray]:
+        return get_local_index().fetch(ids, namespace=namespace)
+
+    def delete(self, ids: List[str], namespace: str = None):
+        get_local_index().delete(ids, namespace=namespace)
+
+
+def _normalize_vector(vec) -> np.ndarray:
     """Normalize vector (for cosine similarity in Pinecone)"""
     arr = np.array(vec, dtype=np.float32)
     norm = np.linalg.norm(arr)
     if norm > 0:
         arr = arr / norm
-    return arr.tolist()
+    return arr
+
+
+def _wire_vector(arr: np.ndarray):
+    """The local index takes arrays as they are; only Pinecone requests need lists of floats."""
+    return arr if USE_LOCAL_INDEX else arr.tolist()
 
 
 def upsert_chunks_to_pinecone(
     chunks, metadatas=None,
     index_name: str = PINECONE_INDEX_NAME,
     namespace: str = None,
-    batch_size: int = 100
+    batch_size: int = 100,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+    vectors: Optional[Dict[str, np.ndarray]] = None
 ):
-    if not USE_PINECONE:
+    """
+    Embed and upsert chunks, pipelined: each embedding batch is upserted as
+    soon as it completes while the next ones are still being embedded.
+    `on_progress(embedded, upserted)` reports chunk counts as they grow.
+    Chunks whose ID is in `vectors` are upserted with that vector instead of
+    being embedded again. Returns the vector IDs in chunk order.
+    """
+    if not (USE_PINECONE or USE_LOCAL_INDEX):
         raise RuntimeError("Pinecone not enabled in environment variables.")
 
     embedder = get_embedding_model()
-    print(f"Generating embeddings for {len(chunks)} chunks using Google GenAI...")
-    embeddings = embedder.embed_documents(chunks)
 
-    idx = init_pinecone_index(index_name=index_name)
-
-    vectors_to_upsert = []
-    returned_ids = []
+    if USE_LOCAL_INDEX:
+        idx = _LocalIndexAdapter()
+    else:
+        idx = init_pinecone_index(index_name=index_name)
 
-    for i, emb in enumerate(embeddings):
+    ids = []
+    for i in range(len(chunks)):
         chunk_id = str(uuid.uuid4())
         if metadatas and i < len(metadatas):
             chunk_id = str(metadatas[i].get("chunk_id", chunk_id))
+        ids.append(chunk_id)
+
+    if not CHUNK_TEXT_IN_METADATA:
+        # Stored first, so the text of every vector a query can return is already there
+        get_chunk_store().put_many(namespace, ids, chunks)
+
+    vectors = vectors or {}
+    known = [i for i, chunk_id in enumerate(ids) if chunk_id in vectors]
+    to_embed = [i for i, chunk_id in enumerate(ids) if chunk_id not in vectors]
+
+    def _batches() -> Iterator[Tuple[List[int], List]]:
+        for start in range(0, len(known), batch_size):
+            part = known[start:start + batch_size]
+            yield part, [vectors[ids[i]] for i in part]
+        for indices, embeddings in embedder.iter_embed_documents([chunks[i] for i in to_embed]):
+            yield [to_embed[i] for i in indices], embeddings
+
+    print(f"Generating embeddings for {len(to_embed)} chunks using Google GenAI "
+          f"({len(known)} more reuse their stored vectors)...")
+    embedded = upserted = 0
+    for indices, embeddings in _batches():
+        embedded += len(indices)
+        if on_progress:
+            on_progress(embedded, upserted)
+
+        vectors_to_upsert = []
+        for i, emb in zip(indices, embeddings):
+            metadata = metadatas[i].copy() if metadatas and i < len(metadatas) else {}
+            if CHUNK_TEXT_IN_METADATA:
+                metadata["text"] = chunks[i]
+            metadata["conversation_id"] = namespace
+            vectors_to_upsert.append((ids[i], _wire_vector(_normalize_vector(emb)), metadata))
+
+        for start in range(0, len(vectors_to_upsert), batch_size):
+            batch = vectors_to_upsert[start:start + batch_size]
+            idx.upsert(vectors=batch, namespace=namespace)
+            upserted += len(batch)
+            if on_progress:
+                on_progress(embedded, upserted)
+        print(f"Embedded {embedded}/{len(chunks)}, upserted {upserted}/{len(chunks)} chunks")
+
+    print(f"Successfully upserted {upserted} vectors to {VECTOR_BACKEND}")
+    return ids
+
+
+def fetch_vectors(
+    ids: List[str],
+    index_name: str = PINECONE_INDEX_NAME,
+    namespace: str = None
+) -> Dict[str, np.ndarray]:
+    """Stored vectors by ID, so chunks that only moved need not be embedded again; unknown IDs are left out."""
+    if USE_LOCAL_INDEX:
+        return _LocalIndexAdapter().fetch(ids, namespace=namespace)
+    if not USE_PINECONE:
+        raise RuntimeError("Pinecone not enabled in environment variables.")
+    idx = init_pinecone_index(index_name=index_name)
+    found = {}
+    # IDs travel in the query string, so fetches are kept small
+    for start in range(0, len(ids), 100):
+        res = idx.fetch(ids=ids[start:start + 100], namespace=namespace)
+        for vid, vec in res.vectors.items():
+            found[vid] = np.asarray(vec.values, dtype=np.float32)
+    return found
 
-        metadata = metadatas[i].copy() if metadatas and i < len(metadatas) else {}
-        metadata["text"] = chunks[i]
-        metadata["conversation_id"] = namespace
-
-        vec = _normalize_vector(emb)
-        vectors_to_upsert.append((chunk_id, vec, metadata))
-        returned_ids.append(chunk_id)
-
-        if len(vectors_to_upsert) >= batch_size:
-            print(f"Upserting batch of {len(vectors_to_upsert)} vectors...")
-            idx.upsert(vectors=vectors_to_upsert, namespace=namespace)
-            vectors_to_upsert = []
-
-    if vectors_to_upsert:
-        print(f"Upserting final batch of {len(vectors_to_upsert)} vectors...")
-        idx.upsert(vectors=vectors_to_upsert, namespace=namespace)
 
-    print(f"Successfully upserted {len(chunks)} vectors to Pinecone")
-    return returned_ids
+def delete_vectors(
+    ids: List[str],
+    index_name: str = PINECONE_INDEX_NAME,
+    namespace: str = None
+):
+    """Deletes vectors by ID, along with their stored chunk text."""
+    if not ids:
+        return
+    if USE_LOCAL_INDEX:
+        _LocalIndexAdapter().delete(ids, namespace=namespace)
+    elif USE_PINECONE:
+        idx = init_pinecone_index(index_name=index_name)
+        for start in range(0, len(ids), 1000):
+            idx.delete(ids=ids[start:start + 1000], namespace=namespace)
+    else:
+        raise RuntimeError("Pinecone not enabled in environment variables.")
+    get_chunk_store().delete_many(namespace, ids)
 
 
 def query_pinecone(
@@ -175,25 +515,65 @@ def query_pinecone(
     index_name: str = PINECONE_INDEX_NAME,
     namespace: str = None
 ):
-    if not USE_PINECONE:
+    return query_namespaces(query, [namespace], top_k=top_k, index_name=index_name)
+
+
+def query_namespaces(
+    query: str,
+    namespaces: List[str],
+    top_k: int = 4,
+    index_name: str = PINECONE_INDEX_NAME
+) -> List[Document]:
+    """
+    Searches several document namespaces with one query embedding and
+    returns the global top_k by similarity. Each result's metadata carries
+    the namespace it came from as "document_id".
+    """
+    if not (USE_PINECONE or USE_LOCAL_INDEX):
         raise RuntimeError("Pinecone not enabled in environment variables.")
 
     embedder = get_embedding_model()
     print(f"Generating query embedding using Google GenAI...")
     qvec = embedder.embed_query(query)
-    qvec = _normalize_vector(qvec)
-
-    idx = init_pinecone_index(index_name=index_name)
-    res = idx.query(vector=qvec, top_k=top_k, include_metadata=True, namespace=namespace)
-    matches = res.matches
+    qvec = _wire_vector(_normalize_vector(qvec))
+
+    if USE_LOCAL_INDEX:
+        idx = _LocalIndexAdapter()
+    else:
+        idx = init_pinecone_index(index_name=index_name)
+
+    def _query(namespace):
+        res = idx.query(vector=qvec, top_k=top_k, include_metadata=True, namespace=namespace)
+        return [(namespace, m) for m in res.matches]
+
+    # Every namespace is in the same index and metric, so scores compare across documents
+    if len(namespaces) == 1:
+        results = [_query(namespaces[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=min(QUERY_NAMESPACE_CONCURRENCY, len(namespaces))) as pool:
+            results = list(pool.map(_query, namespaces))
+    matches = sorted((hit for hits in results for hit in hits), key=lambda hit: hit[1].score, reverse=True)[:top_k]
+
+    # Vectors upserted with CHUNK_TEXT_IN_METADATA=false carry no text
+    missing: Dict[str, List[str]] = {}
+    for namespace, m in matches:
+        if "text" not in (m.metadata or {}):
+            missing.setdefault(namespace, []).append(m.id)
+    stored_texts = {
+        (namespace, chunk_id): text
+        for namespace, ids in missing.items()
+        for chunk_id, text in get_chunk_store().get_many(namespace, ids).items()
+    }
 
     docs = []
-    for m in matches:
-        metadata = m.metadata or {}
-        text = metadata.get("text", "")
+    for namespace, m in matches:
+        metadata = dict(m.metadata or {})
+        text = metadata.get("text", stored_texts.get((namespace, m.id), ""))
+        metadata["text"] = text
+        metadata["document_id"] = namespace
         docs.append(Document(page_content=text, metadata=metadata))
 
-    print(f"Retrieved {len(docs)} relevant documents")
+    print(f"Retrieved {len(docs)} relevant documents from {len(namespaces)} namespaces")
     return docs
 
 
@@ -201,6 +581,10 @@ def delete_namespace_from_pinecone(
     index_name: str = PINECONE_INDEX_NAME,
     namespace: str = None
 ):
+    get_chunk_store().delete_namespace(namespace)
+    if USE_LOCAL_INDEX:
+        get_local_index().delete_namespace(namespace)
+        return
     if not USE_PINECONE:
         raise RuntimeError("Pinecone not enabled.")
     idx = init_pinecone_index(index_name=index_name)
@@ -0,0 +1,104 @@
+# modules/extraction.py
+import os
+import tempfile
+import threading
+import multiprocessing
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Iterator, List, Optional, Tuple, Union
+
+import fitz  # PyMuPDF
+
+PdfSource = Union[str, Path, bytes, bytearray, memoryview, BinaryIO]
+
+# Documents with at least this many pages are split into page ranges and parsed in a process pool
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "64"))
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a process that runs an event loop and thread pools is unsafe
+            _pool = ProcessPoolExecutor(
+                max_workers=PDF_EXTRACT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def open_pdf(source: PdfSource) -> fitz.Document:
+    """Open a PDF from a path, in-memory bytes or a binary file object."""
+    if hasattr(source, "read"):
+        source = source.read()
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return fitz.open(stream=bytes(source), filetype="pdf")
+    return fitz.open(str(source))
+
+
+def _extract_range(source: PdfSource, start: int, end: int) -> List[str]:
+    """Worker: text of pages [start, end)."""
+    doc = open_pdf(source)
+    try:
+        return [doc[i].get_text() for i in range(start, end)]
+    finally:
+        doc.close()
+
+
+def iter_pdf_pages(source: PdfSource, parallel: Optional[bool] = None) -> Iterator[Tuple[int, str]]:
+    """
+    Yield (page_number, text) for every page, 1-based and in order.
+
+    Small documents are read page by page in-process. Documents with at
+    least PDF_PARALLEL_MIN_PAGES pages (or parallel=True) are split into
+    page ranges parsed concurrently in a process pool; ranges are still
+    yielded in order as soon as each one is ready.
+    """
+    if hasattr(source, "read"):
+        # Worker processes need something picklable
+        source = source.read()
+    doc = open_pdf(source)
+    page_count = doc.page_count
+    if parallel is None:
+        parallel = page_count >= PDF_PARALLEL_MIN_PAGES and PDF_EXTRACT_WORKERS > 1
+
+    if not parallel:
+        try:
+            for i in range(page_count):
+                yield i + 1, doc[i].get_text()
+        finally:
+            doc.close()
+        return
+    doc.close()
+
+    # In-memory PDFs are written to one temporary file, so each range task
+    # pickles a path instead of another copy of the whole document
+    spool = None
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+            f.write(source)
+        spool = source = f.name
+    try:
+        # A few ranges per worker keeps the pool busy when page costs are uneven
+        n_ranges = min(page_count, PDF_EXTRACT_WORKERS * 4)
+        step = -(-page_count // n_ranges)
+        pool = _get_pool()
+        futures = [
+            (start, pool.submit(_extract_range, str(source), start, min(start + step, page_count)))
+            for start in range(0, page_count, step)
+        ]
+        for start, future in futures:
+            for offset, text in enumerate(future.result()):
+                yield start + offset + 1, text
+    finally:
+        if spool is not None:
+            os.unlink(spool)
+
+
+def extract_pdf_text(source: PdfSource, separator: str = "") -> str:
+    """Full text of a PDF, pages joined with `separator`."""
+    return separator.join(text for _, text in iter_pdf_pages(source))
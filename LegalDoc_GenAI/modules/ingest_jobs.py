@@ -0,0 +1,174 @@
+# modules/ingest_jobs.py
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+# Documents ingested at once; each one already runs EMBED_CONCURRENCY embedding requests
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+# Queued plus running jobs; uploads beyond this are rejected until some finish
+INGEST_MAX_PENDING = int(os.getenv("INGEST_MAX_PENDING", "50"))
+# Finished jobs remembered for status queries
+INGEST_JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY", "1000"))
+
+
+class IngestQueueFull(Exception):
+    pass
+
+
+@dataclass
+class IngestJob:
+    document_id: str
+    filename: str
+    namespace: str = ""  # vector namespace written to; the document ID unless this is a revision
+    replaces: Optional[str] = None  # document ID of the earlier version being re-indexed
+    job_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = "queued"  # queued, running, succeeded, failed
+    stage: str = "queued"  # queued, parsing, embedding, done
+    total_chunks: Optional[int] = None
+    chunks_embedded: int = 0
+    chunks_upserted: int = 0
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    embedding_started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    diff: Optional[dict] = None  # chunk changes of a revision, once it is done
+
+    def __post_init__(self):
+        self.namespace = self.namespace or self.document_id
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+    def set_total(self, total_chunks: int):
+        self.total_chunks = total_chunks
+        self.stage = "embedding"
+        self.embedding_started_at = time.time()
+
+    def progress(self, embedded: int, upserted: int):
+        self.chunks_embedded = embedded
+        self.chunks_upserted = upserted
+
+    def eta_seconds(self) -> Optional[float]:
+        if self.finished or not self.total_chunks or not self.chunks_upserted or not self.embedding_started_at:
+            return None
+        rate = self.chunks_upserted / max(time.time() - self.embedding_started_at, 1e-6)
+        return round((self.total_chunks - self.chunks_upserted) / rate, 1)
+
+    def to_dict(self) -> dict:
+        end = self.finished_at or time.time()
+        return {
+            "job_id": self.job_id,
+            "document_id": self.document_id,
+            "filename": self.filename,
+            "replaces": self.replaces,
+            "status": self.status,
+            "stage": self.stage,
+            "total_chunks": self.total_chunks,
+            "chunks_embedded": self.chunks_embedded,
+            "chunks_upserted": self.chunks_upserted,
+            "eta_seconds": self.eta_seconds(),
+            "elapsed_seconds": round(end - self.started_at, 1) if self.started_at else 0.0,
+            "error": self.error,
+            "diff": self.diff,
+        }
+
+
+class IngestJobManager:
+    """
+    Runs ingestion jobs on a bounded thread pool and keeps their status in
+    this worker process. Concurrent uploads of the same document share a job,
+    and a namespace has at most one job writing to it at a time.
+
+    Job status is not shared between processes, so job queries and the
+    "still being indexed" check are only reliable with a single server worker.
+    """
+
+    def __init__(self, workers: int = INGEST_WORKERS, max_pending: int = INGEST_MAX_PENDING,
+                 history: int = INGEST_JOB_HISTORY):
+        self.max_pending = max_pending
+        self.history = history
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest")
+        self._jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+        self._active_by_namespace = {}
+        self._lock = threading.Lock()
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def active_for(self, namespace: str) -> Optional[IngestJob]:
+        with self._lock:
+            return self._active_by_namespace.get(namespace)
+
+    def last_for(self, document_id: str) -> Optional[IngestJob]:
+        """The most recent job still remembered for a document, finished or not."""
+        with self._lock:
+            return next((job for job in reversed(self._jobs.values()) if job.document_id == document_id), None)
+
+    def submit(self, document_id: str, filename: str, work: Callable[[IngestJob], None],
+               on_done: Optional[Callable[[], None]] = None,
+               namespace: Optional[str] = None, replaces: Optional[str] = None) -> IngestJob:
+        """
+        Queues `work(job)` unless the namespace (by default the document ID)
+        already has a job, in which case that job is returned. `on_done` runs
+        after `work` either way.
+        """
+        namespace = namespace or document_id
+        with self._lock:
+            active = self._active_by_namespace.get(namespace)
+            if active is not None:
+                if on_done:
+                    on_done()
+                return active
+            if len(self._active_by_namespace) >= self.max_pending:
+                raise IngestQueueFull(f"{len(self._active_by_namespace)} documents are already being ingested")
+            job = IngestJob(document_id=document_id, filename=filename, namespace=namespace, replaces=replaces)
+            self._jobs[job.job_id] = job
+            self._active_by_namespace[namespace] = job
+            self._evict()
+        self._executor.submit(self._run, job, work, on_done)
+        return job
+
+    def _run(self, job: IngestJob, work: Callable[[IngestJob], None], on_done: Optional[Callable[[], None]]):
+        job.status = "running"
+        job.stage = "parsing"
+        job.started_at = time.time()
+        try:
+            work(job)
+            job.status = "succeeded"
+            job.stage = "done"
+        except Exception as e:
+            print(f"Ingestion job {job.job_id} for {job.filename} failed: {e}")
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                self._active_by_namespace.pop(job.namespace, None)
+            if on_done:
+                on_done()
+
+    def _evict(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(self._jobs) - self.history)]:
+            del self._jobs[job_id]
+
+
+_INGEST_JOB_MANAGER: Optional[IngestJobManager] = None
+_INGEST_JOB_MANAGER_LOCK = threading.Lock()
+
+
+def get_ingest_job_manager() -> IngestJobManager:
+    """Return the process-wide ingestion job manager, creating it on first use."""
+    global _INGEST_JOB_MANAGER
+    with _INGEST_JOB_MANAGER_LOCK:
+        if _INGEST_JOB_MANAGER is None:
+            _INGEST_JOB_MANAGER = IngestJobManager()
+        return _INGEST_JOB_MANAGER
@@ -0,0 +1,139 @@
+# modules/lexical_index.py
+import os
+import re
+import json
+import math
+import threading
+from pathlib import Path
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+LEXICAL_INDEX_DIR = os.getenv("LEXICAL_INDEX_DIR", "data/lexical_index")
+# Namespaces kept loaded in memory; older ones are reloaded from disk on demand
+LEXICAL_INDEX_CACHE_SIZE = int(os.getenv("LEXICAL_INDEX_CACHE_SIZE", "64"))
+BM25_K1 = float(os.getenv("BM25_K1", "1.5"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+
+# Keeps identifiers such as "KMRL/PROC/2024/117", "clause 4.2.1" or "T-0932" whole
+_COMPOUND = re.compile(r"[a-z0-9]+(?:[./\-_][a-z0-9]+)+")
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens, plus every compound identifier as a single extra token."""
+    text = text.lower()
+    return _WORD.findall(text) + _COMPOUND.findall(text)
+
+
+class BM25Index:
+    """
+    Okapi BM25 over one namespace's chunks.
+
+    `postings` maps each term to (row, term frequency) pairs; `records` holds
+    the {"id", "metadata"} of each row, with the chunk text in metadata["text"]
+    as in the vector backends.
+    """
+
+    def __init__(self, records: List[dict], postings: Dict[str, List[Tuple[int, int]]], lengths: List[int]):
+        self.records = records
+        self.postings = postings
+        self.lengths = lengths
+        self.avg_length = (sum(lengths) / len(lengths)) if lengths else 0.0
+        n = len(records)
+        self.idf = {term: math.log(1.0 + (n - len(rows) + 0.5) / (len(rows) + 0.5)) for term, rows in postings.items()}
+
+    @classmethod
+    def build(cls, ids: List[str], texts: List[str], metadatas: List[dict]) -> "BM25Index":
+        records, postings, lengths = [], {}, []
+        for row, (chunk_id, text, meta) in enumerate(zip(ids, texts, metadatas)):
+            tokens = tokenize(text)
+            lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                postings.setdefault(term, []).append((row, tf))
+            records.append({"id": chunk_id, "metadata": {**meta, "text": text}})
+        return cls(records, postings, lengths)
+
+    def search(self, query: str, top_k: int) -> List[Tuple[str, float, dict]]:
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            rows = self.postings.get(term)
+            if not rows:
+                continue
+            idf = self.idf[term]
+            for row, tf in rows:
+                norm = BM25_K1 * (1.0 - BM25_B + BM25_B * self.lengths[row] / (self.avg_length or 1.0))
+                scores[row] = scores.get(row, 0.0) + idf * tf * (BM25_K1 + 1.0) / (tf + norm)
+        best = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:top_k]
+        return [(self.records[row]["id"], score, self.records[row]["metadata"]) for row, score in best]
+
+    def to_json(self) -> dict:
+        return {"records": self.records, "postings": self.postings, "lengths": self.lengths}
+
+    @classmethod
+    def from_json(cls, data: dict) -> "BM25Index":
+        postings = {term: [tuple(p) for p in rows] for term, rows in data["postings"].items()}
+        return cls(data["records"], postings, data["lengths"])
+
+
+class LexicalIndexStore:
+    """Per-namespace BM25 indexes stored as <LEXICAL_INDEX_DIR>/<namespace>.json, with an LRU of loaded ones."""
+
+    def __init__(self, root: str = LEXICAL_INDEX_DIR, cache_size: int = LEXICAL_INDEX_CACHE_SIZE):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, BM25Index]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, namespace: str) -> Path:
+        return self.root / f"{namespace}.json"
+
+    def _remember(self, namespace: str, index: BM25Index):
+        with self._lock:
+            self._cache[namespace] = index
+            self._cache.move_to_end(namespace)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def build(self, namespace: str, ids: List[str], texts: List[str], metadatas: List[dict]) -> BM25Index:
+        index = BM25Index.build(ids, texts, metadatas)
+        tmp = self._path(namespace).with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(index.to_json(), ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, self._path(namespace))
+        self._remember(namespace, index)
+        return index
+
+    def get(self, namespace: str) -> Optional[BM25Index]:
+        with self._lock:
+            index = self._cache.get(namespace)
+            if index is not None:
+                self._cache.move_to_end(namespace)
+                return index
+        path = self._path(namespace)
+        if not path.exists():
+            return None
+        index = BM25Index.from_json(json.loads(path.read_text(encoding="utf-8")))
+        self._remember(namespace, index)
+        return index
+
+    def search(self, namespace: str, query: str, top_k: int) -> List[Tuple[str, float, dict]]:
+        index = self.get(namespace)
+        return index.search(query, top_k) if index else []
+
+    def delete(self, namespace: str):
+        with self._lock:
+            self._cache.pop(namespace, None)
+        self._path(namespace).unlink(missing_ok=True)
+
+
+_LEXICAL_INDEX_INSTANCE: Optional[LexicalIndexStore] = None
+_LEXICAL_INDEX_LOCK = threading.Lock()
+
+
+def get_lexical_index() -> LexicalIndexStore:
+    """Return the process-wide lexical index store, opening it on first use."""
+    global _LEXICAL_INDEX_INSTANCE
+    with _LEXICAL_INDEX_LOCK:
+        if _LEXICAL_INDEX_INSTANCE is None:
+            _LEXICAL_INDEX_INSTANCE = LexicalIndexStore()
+        return _LEXICAL_INDEX_INSTANCE
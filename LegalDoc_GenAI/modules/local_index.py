@@ -0,0 +1,375 @@
+# modules/local_index.py
+import os
+import json
+import shutil
+import threading
+import numpy as np
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "data/local_index")
+# "exact" always scans the full shard, "ivf" always uses the inverted-file
+# index, "auto" switches to IVF once a shard reaches LOCAL_INDEX_IVF_MIN_ROWS.
+LOCAL_INDEX_MODE = os.getenv("LOCAL_INDEX_MODE", "auto").lower()
+LOCAL_INDEX_IVF_MIN_ROWS = int(os.getenv("LOCAL_INDEX_IVF_MIN_ROWS", "50000"))
+LOCAL_INDEX_IVF_NPROBE = int(os.getenv("LOCAL_INDEX_IVF_NPROBE", "8"))
+# Storage type of new shards: "float32", "float16" (half the size) or "int8"
+# (a quarter, scalar-quantized with one scale per row). Existing shards keep theirs.
+LOCAL_INDEX_DTYPE = os.getenv("LOCAL_INDEX_DTYPE", "float32").lower()
+
+_VECTOR_FILES = {"float32": "vectors.f32", "float16": "vectors.f16", "int8": "vectors.i8"}
+# Dequantized block size when scanning a quantized shard; small enough to stay in cache
+_SCAN_BLOCK_BYTES = 4 * 1024 * 1024
+
+
+def _normalize_rows(mat: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return mat / norms
+
+
+def _quantize(vectors: np.ndarray, dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """Rows in the storage type, plus per-row scales for int8."""
+    if dtype == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+    return vectors.astype(dtype), None
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first."""
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    idx = np.argpartition(-scores, k - 1)[:k]
+    return idx[np.argsort(-scores[idx])]
+
+
+class NamespaceShard:
+    """
+    One namespace stored on disk as:
+      - vectors.f32   row-major matrix of unit-normalized vectors (memory-mapped);
+                      vectors.f16 or vectors.i8 for quantized shards
+      - scales.f32    per-row scales of an int8 shard
+      - records.jsonl one {"id", "metadata"} record per row, in row order
+      - shard.json    dimension and storage type
+      - ivf.npz       optional IVF centroids and row assignments
+    """
+
+    def __init__(self, path: Path, dtype: str = LOCAL_INDEX_DTYPE):
+        self.path = path
+        self.lock = threading.RLock()
+        self.dim: Optional[int] = None
+        self.dtype = dtype  # replaced by the stored type when the shard already exists
+        self.ids: List[str] = []
+        self.metadatas: List[dict] = []
+        self.row_of: Dict[str, int] = {}
+        self._matrix: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+        self._ivf: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self._ivf_rows = 0
+        self._load()
+
+    @property
+    def vectors_path(self) -> Path:
+        return self.path / _VECTOR_FILES[self.dtype]
+
+    @property
+    def scales_path(self) -> Path:
+        return self.path / "scales.f32"
+
+    @property
+    def row_bytes(self) -> int:
+        return self.dim * np.dtype(self.dtype).itemsize
+
+    @property
+    def records_path(self) -> Path:
+        return self.path / "records.jsonl"
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _load(self):
+        header = self.path / "shard.json"
+        if not header.exists():
+            return
+        shard_info = json.loads(header.read_text())
+        self.dim = shard_info["dim"]
+        self.dtype = shard_info.get("dtype", "float32")
+        with open(self.records_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                rec = json.loads(line)
+                self.row_of[rec["id"]] = len(self.ids)
+                self.ids.append(rec["id"])
+                self.metadatas.append(rec.get("metadata") or {})
+        # A crash between the vector and record writes can leave extra rows
+        rows = self.vectors_path.stat().st_size // self.row_bytes
+        if self.dtype == "int8":
+            rows = min(rows, self.scales_path.stat().st_size // 4)
+        if rows < len(self.ids):
+            del self.ids[rows:]
+            del self.metadatas[rows:]
+            self.row_of = {vid: i for i, vid in enumerate(self.ids)}
+        self._remap()
+        ivf_file = self.path / "ivf.npz"
+        if ivf_file.exists():
+            data = np.load(ivf_file)
+            self._ivf = (data["centroids"], data["assignments"])
+            self._ivf_rows = int(data["rows"])
+
+    def _remap(self):
+        if self.ids:
+            self._matrix = np.memmap(self.vectors_path, dtype=self.dtype, mode="r", shape=(len(self.ids), self.dim))
+            if self.dtype == "int8":
+                self._scales = np.memmap(self.scales_path, dtype=np.float32, mode="r", shape=(len(self.ids),))
+        else:
+            self._matrix = None
+            self._scales = None
+
+    def _rows(self, rows) -> np.ndarray:
+        """Rows (a slice or index array) as float32, dequantized if needed."""
+        block = np.asarray(self._matrix[rows], dtype=np.float32)
+        if self._scales is not None:
+            block *= self._scales[rows][:, None]
+        return block
+
+    def _scores(self, qvec: np.ndarray, rows=None) -> np.ndarray:
+        """Dot products with `qvec` for the given rows (all if None), scanned in blocks for quantized shards."""
+        if self.dtype == "float32":
+            return (self._matrix if rows is None else self._matrix[rows]) @ qvec
+        if rows is None:
+            rows = slice(0, len(self))
+        block_rows = max(1, _SCAN_BLOCK_BYTES // (4 * self.dim))
+        stored = self._matrix[rows]
+        scores = np.empty(stored.shape[0], dtype=np.float32)
+        for start in range(0, stored.shape[0], block_rows):
+            scores[start:start + block_rows] = stored[start:start + block_rows].astype(np.float32) @ qvec
+        if self._scales is not None:
+            scores *= self._scales[rows]
+        return scores
+
+    def upsert(self, ids: List[str], vectors: np.ndarray, metadatas: List[dict]):
+        vectors = _normalize_rows(np.asarray(vectors, dtype=np.float32))
+        with self.lock:
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                if self.dtype not in _VECTOR_FILES:
+                    raise ValueError(f"Unknown LOCAL_INDEX_DTYPE '{self.dtype}'")
+                self.path.mkdir(parents=True, exist_ok=True)
+                (self.path / "shard.json").write_text(json.dumps({"dim": self.dim, "dtype": self.dtype}))
+                self.vectors_path.touch()
+                if self.dtype == "int8":
+                    self.scales_path.touch()
+                self.records_path.touch()
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Vector dimension {vectors.shape[1]} does not match shard dimension {self.dim}")
+            stored, scales = _quantize(vectors, self.dtype)
+
+            overwritten, new_rows, new_ids, new_metas = [], [], [], []
+            with open(self.vectors_path, "r+b") as f:
+                for i, (vid, meta) in enumerate(zip(ids, metadatas)):
+                    if vid in self.row_of:
+                        # Overwrite the vector in place; the record is re-appended below
+                        row = self.row_of[vid]
+                        f.seek(row * self.row_bytes)
+                        f.write(stored[i].tobytes())
+                        overwritten.append((row, i))
+                        self.metadatas[row] = meta
+                    else:
+                        new_rows.append(i)
+                        new_ids.append(vid)
+                        new_metas.append(meta)
+                if new_rows:
+                    f.seek(0, os.SEEK_END)
+                    f.write(stored[new_rows].tobytes())
+            if scales is not None:
+                with open(self.scales_path, "r+b") as f:
+                    for row, i in overwritten:
+                        f.seek(row * 4)
+                        f.write(scales[i].tobytes())
+                    if new_rows:
+                        f.seek(0, os.SEEK_END)
+                        f.write(scales[new_rows].tobytes())
+
+            for vid, meta in zip(new_ids, new_metas):
+                self.row_of[vid] = len(self.ids)
+                self.ids.append(vid)
+                self.metadatas.append(meta)
+
+            if len(new_ids) == len(ids):
+                with open(self.records_path, "a", encoding="utf-8") as f:
+                    for vid, meta in zip(new_ids, new_metas):
+                        f.write(json.dumps({"id": vid, "metadata": meta}) + "\n")
+            else:
+                self._rewrite_records()
+            self._remap()
+
+    def fetch(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        """Stored vectors (dequantized) of the given IDs; unknown IDs are left out."""
+        with self.lock:
+            found = [vid for vid in ids if vid in self.row_of]
+            if not found:
+                return {}
+            rows = self._rows(np.array([self.row_of[vid] for vid in found]))
+            return dict(zip(found, rows))
+
+    def delete(self, ids: List[str]) -> int:
+        """Removes the given IDs, compacting the shard; returns how many were there."""
+        with self.lock:
+            doomed = {self.row_of[vid] for vid in ids if vid in self.row_of}
+            if not doomed:
+                return 0
+            keep = np.array([row for row in range(len(self.ids)) if row not in doomed], dtype=np.int64)
+            files = [(self.vectors_path, self._matrix)]
+            if self._scales is not None:
+                files.append((self.scales_path, self._scales))
+            for path, data in files:
+                tmp = path.with_suffix(".tmp")
+                with open(tmp, "wb") as f:
+                    for start in range(0, len(keep), 8192):
+                        f.write(np.ascontiguousarray(data[keep[start:start + 8192]]).tobytes())
+                os.replace(tmp, path)
+            self.ids = [self.ids[row] for row in keep]
+            self.metadatas = [self.metadatas[row] for row in keep]
+            self.row_of = {vid: i for i, vid in enumerate(self.ids)}
+            self._rewrite_records()
+            # Row numbers changed, so the IVF assignments are rebuilt on the next query
+            self._ivf = None
+            self._ivf_rows = 0
+            (self.path / "ivf.npz").unlink(missing_ok=True)
+            self._remap()
+            return len(doomed)
+
+    def _rewrite_records(self):
+        tmp = self.records_path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            for vid, meta in zip(self.ids, self.metadatas):
+                f.write(json.dumps({"id": vid, "metadata": meta}) + "\n")
+        os.replace(tmp, self.records_path)
+
+    def _use_ivf(self) -> bool:
+        if LOCAL_INDEX_MODE == "exact":
+            return False
+        if LOCAL_INDEX_MODE == "ivf":
+            return len(self) >= 256
+        return len(self) >= LOCAL_INDEX_IVF_MIN_ROWS
+
+    def _build_ivf(self, iterations: int = 10):
+        """Train a spherical k-means coarse quantizer over the shard."""
+        n = len(self)
+        n_lists = max(1, int(np.sqrt(n)))
+        rng = np.random.default_rng(0)
+        sample = self._rows(np.sort(rng.choice(n, size=min(n, n_lists * 64), replace=False)))
+        centroids = sample[rng.choice(sample.shape[0], size=n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(n_lists):
+                members = sample[assign == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids = _normalize_rows(centroids)
+        assignments = np.empty(n, dtype=np.int32)
+        for start in range(0, n, 8192):
+            assignments[start:start + 8192] = np.argmax(self._rows(slice(start, start + 8192)) @ centroids.T, axis=1)
+        self._ivf = (centroids, assignments)
+        self._ivf_rows = n
+        np.savez(self.path / "ivf.npz", centroids=centroids, assignments=assignments, rows=n)
+
+    def query(self, qvec: np.ndarray, top_k: int) -> List[Tuple[str, float, dict]]:
+        with self.lock:
+            if self._matrix is None:
+                return []
+            if qvec.shape[0] != self.dim:
+                raise ValueError(f"Query dimension {qvec.shape[0]} does not match shard dimension {self.dim}; "
+                                 "re-index documents after changing EMBEDDING_DIM")
+            if self._use_ivf():
+                # Retrain once the shard has grown 20% past the last build
+                if self._ivf is None or len(self) > self._ivf_rows * 1.2:
+                    self._build_ivf()
+                centroids, assignments = self._ivf
+                probe = _top_k(centroids @ qvec, LOCAL_INDEX_IVF_NPROBE)
+                candidates = np.flatnonzero(np.isin(assignments, probe))
+                # Rows added since the last build are always scanned exactly
+                candidates = np.concatenate([candidates, np.arange(self._ivf_rows, len(self))])
+                scores = self._scores(qvec, candidates)
+                top = _top_k(scores, top_k)
+                best, best_scores = candidates[top], scores[top]
+            else:
+                scores = self._scores(qvec)
+                best = _top_k(scores, top_k)
+                best_scores = scores[best]
+            return [(self.ids[i], float(s), self.metadatas[i]) for i, s in zip(best, best_scores)]
+
+
+class LocalVectorIndex:
+    """In-process vector index with one memory-mapped shard per namespace."""
+
+    def __init__(self, root: str = LOCAL_INDEX_DIR, dtype: str = LOCAL_INDEX_DTYPE):
+        self.root = Path(root)
+        self.dtype = dtype
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._shards: Dict[str, NamespaceShard] = {}
+        self._lock = threading.Lock()
+
+    def _shard_path(self, namespace: Optional[str]) -> Path:
+        # Namespaces are uuids / hashes; keep the directory name filesystem-safe anyway
+        safe = "".join(c if c.isalnum() or c in "-_" else "_" for c in (namespace or "__default__"))
+        return self.root / safe
+
+    def _shard(self, namespace: Optional[str]) -> NamespaceShard:
+        key = namespace or ""
+        with self._lock:
+            shard = self._shards.get(key)
+            if shard is None:
+                shard = NamespaceShard(self._shard_path(namespace), self.dtype)
+                self._shards[key] = shard
+            return shard
+
+    def upsert(self, ids: List[str], vectors, metadatas: List[dict], namespace: Optional[str] = None):
+        if not ids:
+            return
+        self._shard(namespace).upsert(ids, vectors, metadatas)
+
+    def query(self, vector, top_k: int = 4, namespace: Optional[str] = None) -> List[Tuple[str, float, dict]]:
+        qvec = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(qvec)
+        if norm > 0:
+            qvec = qvec / norm
+        return self._shard(namespace).query(qvec, top_k)
+
+    def fetch(self, ids: List[str], namespace: Optional[str] = None) -> Dict[str, np.ndarray]:
+        return self._shard(namespace).fetch(ids)
+
+    def delete(self, ids: List[str], namespace: Optional[str] = None) -> int:
+        return self._shard(namespace).delete(ids)
+
+    def delete_namespace(self, namespace: Optional[str] = None):
+        key = namespace or ""
+        with self._lock:
+            shard = self._shards.pop(key, None)
+        path = shard.path if shard else self._shard_path(namespace)
+        if shard:
+            with shard.lock:
+                shard._matrix = None
+                shutil.rmtree(path, ignore_errors=True)
+        else:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def namespace_size(self, namespace: Optional[str] = None) -> int:
+        return len(self._shard(namespace))
+
+
+_LOCAL_INDEX_INSTANCE: Optional[LocalVectorIndex] = None
+_LOCAL_INDEX_LOCK = threading.Lock()
+
+
+def get_local_index() -> LocalVectorIndex:
+    """Return the process-wide local index, opening it on first use."""
+    global _LOCAL_INDEX_INSTANCE
+    with _LOCAL_INDEX_LOCK:
+        if _LOCAL_INDEX_INSTANCE is None:
+            _LOCAL_INDEX_INSTANCE = LocalVectorIndex()
+        return _LOCAL_INDEX_INSTANCE
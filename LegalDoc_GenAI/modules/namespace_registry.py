@@ -0,0 +1,151 @@
+# modules/namespace_registry.py
+import os
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from modules.artifact_store import ARTIFACT_DIR, get_artifact_store
+from modules.embedding_store import VECTOR_BACKEND, delete_namespace_from_pinecone
+from modules.ingest_jobs import get_ingest_job_manager
+from modules.lexical_index import get_lexical_index
+
+NAMESPACE_REGISTRY_PATH = os.getenv("NAMESPACE_REGISTRY_PATH", os.path.join(ARTIFACT_DIR, "namespaces.sqlite3"))
+# Namespaces not queried or re-uploaded for this long are deleted; 0 disables expiry
+NAMESPACE_IDLE_TTL_SECONDS = int(os.getenv("NAMESPACE_IDLE_TTL_SECONDS", str(14 * 24 * 3600)))
+# Least recently used namespaces are deleted while the index holds more vectors than this; 0 disables the cap
+NAMESPACE_MAX_TOTAL_VECTORS = int(os.getenv("NAMESPACE_MAX_TOTAL_VECTORS", "0"))
+NAMESPACE_SWEEP_INTERVAL_SECONDS = int(os.getenv("NAMESPACE_SWEEP_INTERVAL_SECONDS", "600"))
+# last_access is written at most this often per namespace, not on every query
+NAMESPACE_TOUCH_INTERVAL_SECONDS = int(os.getenv("NAMESPACE_TOUCH_INTERVAL_SECONDS", "60"))
+
+
+class NamespaceRegistry:
+    """
+    Lifecycle records for the vector namespaces this service creates:
+    creation and last access time, vector count and the source document.
+    """
+
+    def __init__(self, path: str = NAMESPACE_REGISTRY_PATH):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._last_touch: Dict[str, float] = {}
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS namespaces ("
+            " namespace TEXT PRIMARY KEY,"
+            " doc_hash TEXT,"
+            " source TEXT,"
+            " vector_count INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_namespaces_last_access ON namespaces(last_access)")
+        self._conn.commit()
+
+    def register(self, namespace: str, vector_count: int, source: Optional[str] = None, doc_hash: Optional[str] = None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO namespaces (namespace, doc_hash, source, vector_count, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(namespace) DO UPDATE SET doc_hash = excluded.doc_hash, source = excluded.source, "
+                "vector_count = excluded.vector_count, last_access = excluded.last_access",
+                (namespace, doc_hash, source, vector_count, now, now)
+            )
+            self._conn.commit()
+            self._last_touch[namespace] = now
+
+    def touch(self, namespace: str):
+        """Records an access; cheap enough to call on every query."""
+        now = time.time()
+        if now - self._last_touch.get(namespace, 0.0) < NAMESPACE_TOUCH_INTERVAL_SECONDS:
+            return
+        with self._lock:
+            self._last_touch[namespace] = now
+            self._conn.execute("UPDATE namespaces SET last_access = ? WHERE namespace = ?", (now, namespace))
+            self._conn.commit()
+
+    def remove(self, namespace: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM namespaces WHERE namespace = ?", (namespace,))
+            self._conn.commit()
+            self._last_touch.pop(namespace, None)
+
+    def list(self, limit: Optional[int] = None) -> List[dict]:
+        """Namespaces, most recently used first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT namespace, doc_hash, source, vector_count, created_at, last_access FROM namespaces "
+                "ORDER BY last_access DESC LIMIT ?",
+                (-1 if limit is None else limit,)
+            ).fetchall()
+        keys = ("namespace", "doc_hash", "source", "vector_count", "created_at", "last_access")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def totals(self) -> dict:
+        with self._lock:
+            count, vectors, oldest = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(vector_count), 0), MIN(last_access) FROM namespaces"
+            ).fetchone()
+        return {"namespace_count": count, "vector_count": vectors, "oldest_last_access": oldest}
+
+    def expired(self, idle_ttl: int = NAMESPACE_IDLE_TTL_SECONDS, max_total_vectors: int = NAMESPACE_MAX_TOTAL_VECTORS) -> List[dict]:
+        """Namespaces the policy says to delete: idle ones, then the least recently used over the vector cap."""
+        now = time.time()
+        rows = list(reversed(self.list()))  # least recently used first
+        is_idle = lambda r: bool(idle_ttl) and r["last_access"] < now - idle_ttl
+        doomed = [r for r in rows if is_idle(r)]
+        if max_total_vectors:
+            remaining = [r for r in rows if not is_idle(r)]
+            total = sum(r["vector_count"] for r in remaining)
+            for r in remaining:
+                if total <= max_total_vectors:
+                    break
+                doomed.append(r)
+                total -= r["vector_count"]
+        return doomed
+
+
+def sweep_namespaces(registry: "NamespaceRegistry") -> List[str]:
+    """
+    Deletes expired namespaces from the vector backend along with their
+    document artifacts. Namespaces with a queued or running ingestion job
+    (a re-upload or a revision) are kept, however long they were idle.
+    """
+    removed = []
+    artifact_store = get_artifact_store()
+    manager = get_ingest_job_manager()
+    for record in registry.expired():
+        namespace = record["namespace"]
+        if manager.active_for(namespace) is not None:
+            continue
+        try:
+            delete_namespace_from_pinecone(namespace=namespace)
+        except Exception as e:
+            print(f"Could not delete namespace {namespace}: {e}")
+            continue
+        get_lexical_index().delete(namespace)
+        # Without its vectors the document has to be ingested again on the next upload
+        if record["doc_hash"]:
+            artifact_store.delete_document(record["doc_hash"])
+        registry.remove(namespace)
+        removed.append(namespace)
+    if removed:
+        print(f"Expired {len(removed)} namespaces from the {VECTOR_BACKEND} index")
+    return removed
+
+
+_NAMESPACE_REGISTRY: Optional[NamespaceRegistry] = None
+_NAMESPACE_REGISTRY_LOCK = threading.Lock()
+
+
+def get_namespace_registry() -> NamespaceRegistry:
+    """Return the process-wide namespace registry, opening it on first use."""
+    global _NAMESPACE_REGISTRY
+    with _NAMESPACE_REGISTRY_LOCK:
+        if _NAMESPACE_REGISTRY is None:
+            _NAMESPACE_REGISTRY = NamespaceRegistry()
+        return _NAMESPACE_REGISTRY
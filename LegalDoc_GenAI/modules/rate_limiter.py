@@ -0,0 +1,323 @@
+# modules/rate_limiter.py
+import os
+import time
+import random
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, TypeVar
+
+from google.api_core import exceptions as google_exceptions
+from langchain_core.exceptions import OutputParserException
+from pydantic import ValidationError
+
+T = TypeVar("T")
+
+# Client-side quotas per upstream, shared by every request in this worker; 0 disables a limit.
+# Set them slightly below the project's Gemini quota so 429s stay rare.
+LLM_RPM = int(os.getenv("LLM_RPM", "0"))
+LLM_TPM = int(os.getenv("LLM_TPM", "0"))
+EMBED_RPM = int(os.getenv("EMBED_RPM", "0"))
+EMBED_TPM = int(os.getenv("EMBED_TPM", "0"))
+# Output tokens assumed per LLM request when reserving TPM; embeddings produce none
+LLM_OUTPUT_TOKENS_ESTIMATE = int(os.getenv("LLM_OUTPUT_TOKENS_ESTIMATE", "512"))
+
+# Attempts after the first for 429s, 5xx and timeouts, with full-jitter exponential backoff
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "5"))
+GEMINI_BACKOFF_BASE_SECONDS = float(os.getenv("GEMINI_BACKOFF_BASE_SECONDS", "1"))
+GEMINI_BACKOFF_MAX_SECONDS = float(os.getenv("GEMINI_BACKOFF_MAX_SECONDS", "30"))
+# On a 429 the allowed rate is halved (down to this fraction of the quota) and
+# grows back by RATE_RECOVERY_STEP of the quota per successful call
+RATE_MIN_FRACTION = float(os.getenv("RATE_MIN_FRACTION", "0.1"))
+RATE_RECOVERY_STEP = float(os.getenv("RATE_RECOVERY_STEP", "0.05"))
+
+# Consecutive 5xx/timeout failures that open the circuit, and how long it stays open.
+# While open, calls fail at once with CircuitOpenError; then a single probe call decides.
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_COOLDOWN_SECONDS = float(os.getenv("CIRCUIT_COOLDOWN_SECONDS", "30"))
+
+_RATE_LIMITED = (google_exceptions.TooManyRequests,)  # ResourceExhausted is a subclass
+_UNAVAILABLE = (
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.GatewayTimeout,
+    ConnectionError,
+    TimeoutError,
+)
+_RATE_LIMITED_CODES = (429,)
+_UNAVAILABLE_CODES = (500, 502, 503, 504)
+# The upstream answered but the output was unusable; retrying the same prompt is
+# not a quota or outage problem. Their messages quote model output and document
+# text, which is why errors are classified by type and status code only.
+_NOT_UPSTREAM_FAILURES = (OutputParserException, ValidationError)
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the upstream while its circuit is open."""
+
+    def __init__(self, upstream: str, retry_after: float):
+        super().__init__(f"{upstream} calls are suspended after repeated failures; retry in {retry_after:.0f}s")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+def _status_code(e: Exception):
+    """HTTP status of google.api_core errors (`code`) and HTTP client errors (`status_code`)."""
+    for attr in ("code", "status_code"):
+        code = getattr(e, attr, None)
+        if isinstance(code, int):
+            return code
+    return None
+
+
+def is_rate_limited(e: Exception) -> bool:
+    if isinstance(e, _NOT_UPSTREAM_FAILURES):
+        return False
+    return isinstance(e, _RATE_LIMITED) or _status_code(e) in _RATE_LIMITED_CODES
+
+
+def is_unavailable(e: Exception) -> bool:
+    if isinstance(e, _NOT_UPSTREAM_FAILURES):
+        return False
+    return isinstance(e, _UNAVAILABLE) or _status_code(e) in _UNAVAILABLE_CODES
+
+
+def is_retryable(e: Exception) -> bool:
+    """True for errors worth retrying later: quota exhaustion, 5xx and timeouts."""
+    return not isinstance(e, CircuitOpenError) and (is_rate_limited(e) or is_unavailable(e))
+
+
+class TokenBucket:
+    """
+    Refills `rate_per_minute` units per minute up to one minute's worth.
+    reserve() takes units immediately, letting the balance go negative, and
+    returns how long the caller must wait before using them, so sync and
+    async callers queue fairly in the order they reserved.
+    """
+
+    def __init__(self, rate_per_minute: float):
+        self.rate_per_minute = rate_per_minute
+        self.capacity = rate_per_minute
+        self._available = rate_per_minute
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate_per_minute: float):
+        with self._lock:
+            self._refill()
+            self.rate_per_minute = rate_per_minute
+
+    def _refill(self):
+        now = time.monotonic()
+        self._available = min(self.capacity, self._available + (now - self._updated) * self.rate_per_minute / 60.0)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        with self._lock:
+            self._refill()
+            # A request larger than the bucket would otherwise never fit
+            self._available -= min(amount, self.capacity)
+            if self._available >= 0:
+                return 0.0
+            return -self._available * 60.0 / self.rate_per_minute
+
+
+class GeminiLimiter:
+    """
+    Throttling, retries and a circuit breaker for one upstream (LLM or
+    embedding calls). Every call site shares the limiter of its upstream, so
+    the request and token budgets hold across concurrent requests and jobs.
+    """
+
+    def __init__(self, name: str, rpm: int = 0, tpm: int = 0, output_tokens: int = 0,
+                 max_retries: int = GEMINI_MAX_RETRIES,
+                 failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 cooldown: float = CIRCUIT_COOLDOWN_SECONDS):
+        self.name = name
+        self.rpm = rpm
+        self.tpm = tpm
+        self.output_tokens = output_tokens
+        self.max_retries = max_retries
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._requests = TokenBucket(rpm) if rpm else None
+        self._tokens = TokenBucket(tpm) if tpm else None
+        self._lock = threading.Lock()
+        self._fraction = 1.0  # share of the configured quota currently allowed
+        self._paused_until = 0.0  # set by 429s; all callers wait it out
+        self._failures = 0
+        self._opened_until = 0.0
+        self._probing = False
+        self.stats = {"calls": 0, "rate_limited": 0, "retries": 0, "failures": 0, "rejected": 0}
+
+    # --- admission ---
+
+    def _admit(self, tokens: int) -> float:
+        """Checks the circuit and reserves quota; returns the seconds to wait before calling."""
+        now = time.monotonic()
+        with self._lock:
+            if self._opened_until:
+                if now < self._opened_until or self._probing:
+                    self.stats["rejected"] += 1
+                    raise CircuitOpenError(self.name, max(self._opened_until - now, 1.0))
+                self._probing = True  # half-open: let a single call through
+            self.stats["calls"] += 1
+            wait = max(0.0, self._paused_until - now)
+        if self._requests:
+            wait = max(wait, self._requests.reserve(1))
+        if self._tokens:
+            wait = max(wait, self._tokens.reserve(tokens + self.output_tokens))
+        return wait
+
+    def _set_fraction(self, fraction: float):
+        self._fraction = fraction
+        if self._requests:
+            self._requests.set_rate(self.rpm * fraction)
+        if self._tokens:
+            self._tokens.set_rate(self.tpm * fraction)
+
+    def _on_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_until = 0.0
+            self._probing = False
+            if self._fraction < 1.0:
+                self._set_fraction(min(1.0, self._fraction + RATE_RECOVERY_STEP))
+
+    def _on_failure(self, e: Exception, attempt: int) -> float:
+        """Records a failed attempt; returns the backoff before the next one."""
+        ceiling = min(GEMINI_BACKOFF_MAX_SECONDS, GEMINI_BACKOFF_BASE_SECONDS * 2 ** attempt)
+        now = time.monotonic()
+        with self._lock:
+            self.stats["failures"] += 1
+            probing, self._probing = self._probing, False
+            if is_unavailable(e) and not is_rate_limited(e):
+                self._failures += 1
+                if probing or self._failures >= self.failure_threshold:
+                    if not probing:
+                        print(f"{self.name}: {self._failures} consecutive failures, suspending calls for {self.cooldown:.0f}s")
+                    self._opened_until = now + self.cooldown
+            else:
+                # The upstream answered, so it is up; quota errors slow everyone down instead
+                self._failures = 0
+                self._opened_until = 0.0
+                if is_rate_limited(e):
+                    self.stats["rate_limited"] += 1
+                    self._set_fraction(max(RATE_MIN_FRACTION, self._fraction / 2))
+                    self._paused_until = max(self._paused_until, now + ceiling)
+        # Full jitter spreads the retries of callers that failed together
+        return random.uniform(0, ceiling)
+
+    def _abandon(self):
+        """A call was cancelled midway; let the next one probe a half-open circuit."""
+        with self._lock:
+            self._probing = False
+
+    def _should_retry(self, e: Exception, attempt: int) -> bool:
+        if attempt >= self.max_retries or not is_retryable(e):
+            return False
+        self.stats["retries"] += 1
+        return True
+
+    # --- calls ---
+
+    def call(self, func: Callable[..., T], *args, tokens: int = 0, **kwargs) -> T:
+        """Calls `func(*args, **kwargs)` within the quota, retrying retryable errors."""
+        attempt = 0
+        while True:
+            time.sleep(self._admit(tokens))
+            try:
+                result = func(*args, **kwargs)
+            except BaseException as e:
+                if not isinstance(e, Exception):
+                    self._abandon()
+                    raise
+                backoff = self._on_failure(e, attempt)
+                if not self._should_retry(e, attempt):
+                    raise
+                print(f"{self.name} call failed ({e}); retry {attempt + 1}/{self.max_retries} in {backoff:.1f}s")
+                time.sleep(backoff)
+                attempt += 1
+                continue
+            self._on_success()
+            return result
+
+    async def acall(self, factory: Callable[[], Awaitable[T]], tokens: int = 0) -> T:
+        """Async variant of call(); `factory` returns a fresh awaitable per attempt."""
+        attempt = 0
+        while True:
+            await asyncio.sleep(self._admit(tokens))
+            try:
+                result = await factory()
+            except BaseException as e:
+                if not isinstance(e, Exception):
+                    self._abandon()
+                    raise
+                backoff = self._on_failure(e, attempt)
+                if not self._should_retry(e, attempt):
+                    raise
+                print(f"{self.name} call failed ({e}); retry {attempt + 1}/{self.max_retries} in {backoff:.1f}s")
+                await asyncio.sleep(backoff)
+                attempt += 1
+                continue
+            self._on_success()
+            return result
+
+    @asynccontextmanager
+    async def guard(self, tokens: int = 0):
+        """
+        Admits one call and records its outcome, without retrying; for
+        streamed responses that cannot be replayed once output was sent.
+        """
+        await asyncio.sleep(self._admit(tokens))
+        try:
+            yield
+        except BaseException as e:
+            if isinstance(e, Exception):
+                self._on_failure(e, 0)
+            else:
+                self._abandon()
+            raise
+        self._on_success()
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            if not self._opened_until:
+                circuit = "closed"
+            elif now < self._opened_until:
+                circuit = "open"
+            else:
+                circuit = "half-open"
+            return {
+                "rpm": self.rpm,
+                "tpm": self.tpm,
+                "rate_fraction": round(self._fraction, 3),
+                "paused_seconds": round(max(0.0, self._paused_until - now), 1),
+                "circuit": circuit,
+                **self.stats,
+            }
+
+
+_LIMITERS: Dict[str, GeminiLimiter] = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+def get_limiter(upstream: str) -> GeminiLimiter:
+    """Return the process-wide limiter for "llm" or "embedding" calls, creating it on first use."""
+    with _LIMITERS_LOCK:
+        limiter = _LIMITERS.get(upstream)
+        if limiter is None:
+            if upstream == "llm":
+                limiter = GeminiLimiter("llm", LLM_RPM, LLM_TPM, LLM_OUTPUT_TOKENS_ESTIMATE)
+            elif upstream == "embedding":
+                limiter = GeminiLimiter("embedding", EMBED_RPM, EMBED_TPM)
+            else:
+                raise KeyError(f"Unknown upstream '{upstream}'")
+            _LIMITERS[upstream] = limiter
+        return limiter
+
+
+def limiter_stats() -> Dict[str, dict]:
+    return {upstream: get_limiter(upstream).snapshot() for upstream in ("llm", "embedding")}
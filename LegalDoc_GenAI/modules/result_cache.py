@@ -0,0 +1,168 @@
+# modules/result_cache.py
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from typing import Optional
+
+# "memory" (per-worker LRU), "sqlite" (shared by all workers on the host) or "none"
+RESULT_CACHE_BACKEND = os.getenv("RESULT_CACHE_BACKEND", "memory").lower()
+RESULT_CACHE_TTL_SECONDS = int(os.getenv("RESULT_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "10000"))
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", "data/cache/results.sqlite3")
+
+
+def make_result_key(document_content: str, operation: str, prompt_version: str, model: str,
+                    language: str = "", department: str = "") -> str:
+    """Key for an LLM result: content hash plus everything that changes the output."""
+    content_digest = hashlib.sha256(document_content.encode("utf-8")).hexdigest()
+    raw = "\x00".join([operation, prompt_version, model, language or "", department or "", content_digest])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class MemoryLRUBackend:
+    """In-process LRU; fastest, but private to one worker."""
+
+    def __init__(self, max_entries: int = RESULT_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: int):
+        with self._lock:
+            self._data[key] = (time.time() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteBackend:
+    """SQLite-backed LRU shared by every worker process using the same file."""
+
+    def __init__(self, path: str = RESULT_CACHE_PATH, max_entries: int = RESULT_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_results_last_access ON results(last_access)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE results SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            return row[0]
+
+    def set(self, key: str, value: str, ttl: int):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, now + ttl, now)
+            )
+            # Other workers write to the same file, so count rather than track in memory
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()
+            if count > self.max_entries:
+                self._conn.execute("DELETE FROM results WHERE expires_at < ?", (now,))
+                self._conn.execute(
+                    "DELETE FROM results WHERE key IN "
+                    "(SELECT key FROM results ORDER BY last_access ASC LIMIT ?)",
+                    (max(0, count - self.max_entries),)
+                )
+            self._conn.commit()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+
+class ResultCache:
+    """TTL cache for deterministic LLM results, stored as JSON strings."""
+
+    def __init__(self, backend, ttl: int = RESULT_CACHE_TTL_SECONDS):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[str]:
+        if self.backend is None:
+            return None
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: str):
+        if self.backend is not None:
+            self.backend.set(key, value, self.ttl)
+
+    def delete(self, key: str):
+        if self.backend is not None:
+            self.backend.delete(key)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__ if self.backend is not None else None,
+            "entries": len(self.backend) if self.backend is not None else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+def _make_backend():
+    if RESULT_CACHE_BACKEND == "sqlite":
+        return SQLiteBackend()
+    if RESULT_CACHE_BACKEND == "memory":
+        return MemoryLRUBackend()
+    return None
+
+
+result_cache = ResultCache(_make_backend())
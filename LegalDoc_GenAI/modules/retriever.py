@@ -6,16 +6,33 @@ from langchain.prompts import PromptTemplate
 from langchain_core.runnables import RunnablePassthrough
 from langchain_core.prompts import ChatPromptTemplate
 from langchain.schema import Document
-from typing import Optional
+from collections import Counter
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 
-# UPDATED: Import only Pinecone-related items
-from modules.embedding_store import USE_PINECONE, query_pinecone, PINECONE_INDEX_NAME
+from modules.embedding_store import USE_PINECONE, USE_LOCAL_INDEX, query_namespaces, PINECONE_INDEX_NAME
+from modules.lexical_index import get_lexical_index, tokenize
+from modules.concurrency import limit, run_blocking, run_limited
+from modules.rate_limiter import get_limiter
+from modules.tokens import count_tokens, split_by_token_budget
 
 load_dotenv()
 
 LLM_MODEL = os.getenv("LLM_MODEL", "gemini-2.0-flash")
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
+# "hybrid" fuses BM25 and vector results; "dense" uses the vector backend only
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid").lower()
+# Candidates fetched from each retriever before fusion and MMR pick the final top_k
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "20"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+# 1.0 ranks by relevance only; lower values penalize chunks similar to ones already picked
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+# Tokens of retrieved text per prompt, counted with modules/tokens, after overlapping chunks are merged
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "1200"))
+# Most recent chat messages (and their token cap) included so follow-up questions resolve; 0 disables
+CHAT_CONTEXT_MAX_MESSAGES = int(os.getenv("CHAT_CONTEXT_MAX_MESSAGES", "4"))
+CHAT_CONTEXT_MAX_TOKENS = int(os.getenv("CHAT_CONTEXT_MAX_TOKENS", "300"))
+
 PROMPT = """You are an expert assistant for KMRL (Kochi Metro Rail Limited).
 Your role is to provide clear and concise answers based on the provided document context.
 
@@ -25,11 +42,12 @@ Instructions:
 - Extract only the most essential points to answer the question.
 - If the context is missing, give short, practical legal advice. 
 - Always reply in the same language as the question, if user explicitly mentions language, then give response in that language.
+- Use the recent conversation, if any, only to understand what the question refers to.
 
 
 Context:
 {context}
-
+{history}
 Question:
 {question}
 
@@ -48,31 +66,237 @@ def get_llm():
         _llm_instance = ChatGoogleGenerativeAI(
             model=LLM_MODEL,
             temperature=0.2,
-            google_api_key=GOOGLE_API_KEY
+            google_api_key=GOOGLE_API_KEY,
+            # The shared limiter retries; a retrying client would multiply its attempts
+            max_retries=1
         )
     return _llm_instance
 
-def answer_query(query: str, top_k: int = 4, index_path: str = None, conversation_id: Optional[str] = None) -> str:
-    results = []
+def _doc_key(doc: Document) -> Tuple[str, str]:
+    # Chunk IDs are content hashes, so identical boilerplate in two documents shares one; keep both
+    meta = doc.metadata or {}
+    return str(meta.get("document_id")), str(meta.get("chunk_id") or hash(doc.page_content))
+
+def _reciprocal_rank_fusion(rankings: List[List[Document]], k: int = RRF_K) -> List[Tuple[Document, float]]:
+    """Scores each chunk by the sum of 1 / (k + rank) over the rankings it appears in."""
+    scores: Dict[Tuple[str, str], float] = {}
+    docs: Dict[Tuple[str, str], Document] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = _doc_key(doc)
+            docs.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(((docs[key], score) for key, score in scores.items()), key=lambda ds: ds[1], reverse=True)
+
+def _cosine(a: Counter, b: Counter, norm_a: float, norm_b: float) -> float:
+    if not norm_a or not norm_b:
+        return 0.0
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(count * b.get(term, 0) for term, count in a.items()) / (norm_a * norm_b)
+
+def _mmr(candidates: List[Tuple[Document, float]], top_k: int, lambda_: float = MMR_LAMBDA) -> List[Document]:
+    """
+    Maximal marginal relevance over fused candidates. Similarity between
+    chunks is the cosine of their term counts, which is enough to catch the
+    near-duplicates produced by overlapping chunks without fetching vectors.
+    """
+    if not candidates:
+        return []
+    top_score = candidates[0][1] or 1.0
+    terms = [Counter(tokenize(doc.page_content)) for doc, _ in candidates]
+    norms = [sum(c * c for c in t.values()) ** 0.5 for t in terms]
+    selected: List[int] = []
+    remaining = list(range(len(candidates)))
+    while remaining and len(selected) < top_k:
+        def gain(i):
+            redundancy = max((_cosine(terms[i], terms[j], norms[i], norms[j]) for j in selected), default=0.0)
+            return lambda_ * candidates[i][1] / top_score - (1.0 - lambda_) * redundancy
+        best = max(remaining, key=gain)
+        selected.append(best)
+        remaining.remove(best)
+    return [candidates[i][0] for i in selected]
+
+def _lexical_search(query: str, namespaces: List[str], top_k: int) -> List[Document]:
+    """
+    BM25 results of every namespace merged by score. IDF is per document, so
+    scores only roughly compare across documents; RRF then uses ranks only.
+    """
+    lexical_index = get_lexical_index()
+    hits = []
+    for namespace in namespaces:
+        for _, score, meta in lexical_index.search(namespace, query, top_k):
+            hits.append((score, Document(page_content=meta.get("text", ""), metadata={**meta, "document_id": namespace})))
+    hits.sort(key=lambda hit: hit[0], reverse=True)
+    return [doc for _, doc in hits[:top_k]]
 
-    if USE_PINECONE:
-        if conversation_id:
-            results = query_pinecone(query, top_k=top_k, index_name=PINECONE_INDEX_NAME, namespace=conversation_id)
+def _retrieve(query: str, top_k: int, namespaces: List[str]):
+    if USE_PINECONE or USE_LOCAL_INDEX:
+        if namespaces:
+            fetch_k = max(top_k, RETRIEVAL_CANDIDATES)
+            # Same call for both backends; embedding_store routes to Pinecone or the local index
+            dense = query_namespaces(query, namespaces, top_k=fetch_k, index_name=PINECONE_INDEX_NAME)
+            rankings = [dense]
+            if RETRIEVAL_MODE == "hybrid":
+                # Exact clause numbers, tender IDs and section references are found by BM25
+                rankings.append(_lexical_search(query, namespaces, fetch_k))
+            return _mmr(_reciprocal_rank_fusion(rankings), top_k)
         else:
-            raise ValueError("Pinecone query requires a conversation_id.")
+            raise ValueError("Vector query requires at least one document namespace.")
     else:
-        # Since FAISS is removed, this block is an error.
-        raise RuntimeError("FAISS is no longer supported.")
+        raise RuntimeError("No vector backend configured. Set PINECONE_API_KEY_2 or VECTOR_BACKEND=local.")
+
+_PASSAGE_SEPARATOR = "\n\n---\n\n"
+
+def _offsets(meta: dict, text: str) -> Optional[Tuple[int, int]]:
+    """A chunk's (start, end) in its document's text, if its metadata has offsets that match the text."""
+    start, end = meta.get("char_start"), meta.get("char_end")
+    # Pinecone returns numeric metadata as floats
+    if not isinstance(start, (int, float)) or not isinstance(end, (int, float)):
+        return None
+    start, end = int(start), int(end)
+    return (start, end) if end - start == len(text) else None
+
+def _passages(results: List[Document]) -> List[dict]:
+    """
+    Retrieved chunks as passages in relevance order. Chunks of the same
+    document that overlap or touch are merged by their character offsets, so
+    the overlap between neighbouring chunks appears once; chunks without
+    offsets are dropped when their text is already in another passage.
+    """
+    by_document: Dict[Optional[str], List[dict]] = {}
+    loose: List[dict] = []
+    for rank, doc in enumerate(results):
+        meta = doc.metadata or {}
+        passage = {"document_id": meta.get("document_id"), "source": meta.get("source", "document"),
+                   "text": doc.page_content, "rank": rank}
+        span = _offsets(meta, doc.page_content)
+        if span:
+            passage["start"], passage["end"] = span
+            by_document.setdefault(passage["document_id"], []).append(passage)
+        else:
+            loose.append(passage)
+
+    passages: List[dict] = []
+    for group in by_document.values():
+        group.sort(key=lambda p: p["start"])
+        current = group[0]
+        for passage in group[1:]:
+            if passage["start"] > current["end"]:
+                passages.append(current)
+                current = passage
+                continue
+            if passage["end"] > current["end"]:
+                current["text"] += passage["text"][current["end"] - passage["start"]:]
+                current["end"] = passage["end"]
+            # A merged passage ranks as its most relevant chunk
+            current["rank"] = min(current["rank"], passage["rank"])
+        passages.append(current)
 
-    context = "\n\n---\n\n".join([d.page_content for d in results]) if results else "No specific document content available."
+    for passage in loose:
+        if not any(passage["text"] in other["text"] for other in passages):
+            passages.append(passage)
+    return sorted(passages, key=lambda p: p["rank"])
+
+def _build_context(results, max_tokens: int = CONTEXT_MAX_TOKENS) -> str:
+    """
+    Merged, deduplicated passages, most relevant first, up to `max_tokens`.
+    Passages that do not fit are skipped for smaller ones; the most relevant
+    one is always included, cut to the budget if needed.
+    """
+    passages = _passages(results)
+    # Name the source of each excerpt once they come from more than one document
+    multi_document = len({p["document_id"] for p in passages}) > 1
+    separator_tokens = count_tokens(_PASSAGE_SEPARATOR)
+    parts: List[str] = []
+    used = 0
+    for passage in passages:
+        part = f"[{passage['source']}]\n{passage['text']}" if multi_document else passage["text"]
+        n = count_tokens(part) + (separator_tokens if parts else 0)
+        if used + n > max_tokens:
+            if parts:
+                continue
+            part = split_by_token_budget(part, max_tokens)[0]
+            n = count_tokens(part)
+        parts.append(part)
+        used += n
+    context = _PASSAGE_SEPARATOR.join(parts) if parts else "No specific document content available."
 
     language_hint = "Respond in the same language as the question if possible."
 
-    full_context = f"{context}\n\n{language_hint}"
+    return f"{context}\n\n{language_hint}"
+
+def _build_history(chat_history: Optional[List[Dict]], max_messages: int = CHAT_CONTEXT_MAX_MESSAGES,
+                   max_tokens: int = CHAT_CONTEXT_MAX_TOKENS) -> str:
+    """
+    The most recent messages before the current question, oldest first, as
+    long as they fit `max_tokens`; empty when there are none.
+    """
+    if not chat_history or max_messages <= 0:
+        return ""
+    lines: List[str] = []
+    used = 0
+    for message in reversed(list(chat_history)[-max_messages:]):
+        speaker = "User" if message.get("role") == "user" else "Assistant"
+        line = f"{speaker}: {' '.join(message.get('text', '').split())}"
+        n = count_tokens(line)
+        if used + n > max_tokens:
+            break
+        lines.append(line)
+        used += n
+    if not lines:
+        return ""
+    return "\nRecent conversation:\n" + "\n".join(reversed(lines)) + "\n"
+
+def _prompt_tokens(inputs: dict) -> int:
+    return count_tokens(PROMPT) + sum(count_tokens(v) for v in inputs.values())
+
+def answer_query(query: str, top_k: int = 4, index_path: str = None, namespaces: Optional[List[str]] = None,
+                 chat_history: Optional[List[Dict]] = None) -> str:
+    """`chat_history` holds the messages before `query`; the most recent ones are added to the prompt."""
+    results = _retrieve(query, top_k, namespaces)
+    full_context = _build_context(results)
 
     llm = get_llm()
     rag_chain = prompt | llm
 
-    resp = rag_chain.invoke({"context": full_context, "question": query}).content
+    inputs = {"context": full_context, "history": _build_history(chat_history), "question": query}
+    resp = get_limiter("llm").call(rag_chain.invoke, inputs, tokens=_prompt_tokens(inputs)).content
+
+    return resp
+
+async def aanswer_query(query: str, top_k: int = 4, namespaces: Optional[List[str]] = None,
+                        chat_history: Optional[List[Dict]] = None) -> str:
+    """Async variant of answer_query: retrieval runs off-loop, generation uses ainvoke."""
+    results = await run_blocking("vector", _retrieve, query, top_k, namespaces)
+    full_context = _build_context(results)
+
+    rag_chain = prompt | get_llm()
+    inputs = {"context": full_context, "history": _build_history(chat_history), "question": query}
+    resp = await get_limiter("llm").acall(lambda: run_limited("llm", rag_chain.ainvoke, inputs), tokens=_prompt_tokens(inputs))
+
+    return resp.content
+
+def _source_info(doc: Document) -> dict:
+    """Metadata describing a retrieved chunk, without the chunk text."""
+    return {k: v for k, v in (doc.metadata or {}).items() if k != "text"}
+
+async def astream_answer_query(query: str, top_k: int = 4, namespaces: Optional[List[str]] = None,
+                               chat_history: Optional[List[Dict]] = None) -> AsyncIterator[dict]:
+    """
+    Streams an answer as events: one {"type": "context", "sources": [...]} event
+    as soon as retrieval finishes, then {"type": "token", "text": ...} events as
+    the LLM generates them.
+    """
+    results = await run_blocking("vector", _retrieve, query, top_k, namespaces)
+    yield {"type": "context", "sources": [_source_info(d) for d in results]}
 
-    return resp
\ No newline at end of file
+    full_context = _build_context(results)
+    rag_chain = prompt | get_llm()
+    inputs = {"context": full_context, "history": _build_history(chat_history), "question": query}
+    # Admitted by the shared limiter, before taking a concurrency slot, but not retried:
+    # tokens may already have been sent
+    async with get_limiter("llm").guard(tokens=_prompt_tokens(inputs)), limit("llm"):
+        async for chunk in rag_chain.astream(inputs):
+            if chunk.content:
+                yield {"type": "token", "text": chunk.content}
@@ -0,0 +1,231 @@
+# modules/session_store.py
+import os
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional
+
+from modules.chatbot import CHAT_HISTORY_MAX_MESSAGES, init_chat
+
+# "memory" (per-worker LRU) or "sqlite" (shared by all workers on the host)
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory").lower()
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", str(24 * 3600)))
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "10000"))
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "data/sessions.sqlite3")
+# How often the SQLite backend purges expired and excess sessions while writing
+SESSION_SWEEP_INTERVAL_SECONDS = int(os.getenv("SESSION_SWEEP_INTERVAL_SECONDS", "60"))
+
+
+@dataclass
+class _Session:
+    namespace: Optional[str]
+    last_access: float
+    chat_history: Deque[Dict] = field(default_factory=init_chat)
+
+
+class MemorySessionStore:
+    """
+    In-process LRU of conversations with a TTL on inactivity.
+
+    Sessions are kept in access order, so the least recently used one is
+    always at the front: lookups, appends and evictions are all O(1).
+    """
+
+    def __init__(self, max_sessions: int = SESSION_MAX_SESSIONS, ttl: int = SESSION_TTL_SECONDS,
+                 max_messages: int = CHAT_HISTORY_MAX_MESSAGES):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_messages = max_messages
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _touch(self, conversation_id: str, now: float) -> Optional[_Session]:
+        session = self._sessions.get(conversation_id)
+        if session is None:
+            return None
+        if session.last_access + self.ttl < now:
+            del self._sessions[conversation_id]
+            return None
+        session.last_access = now
+        self._sessions.move_to_end(conversation_id)
+        return session
+
+    def _evict(self, now: float):
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if len(self._sessions) <= self.max_sessions and oldest.last_access + self.ttl >= now:
+                break
+            self._sessions.popitem(last=False)
+
+    def _create(self, conversation_id: str, namespace: Optional[str], now: float) -> _Session:
+        session = _Session(namespace, now, init_chat(self.max_messages))
+        self._sessions[conversation_id] = session
+        self._sessions.move_to_end(conversation_id)
+        self._evict(now)
+        return session
+
+    @staticmethod
+    def _as_dict(session: _Session) -> dict:
+        return {"namespace": session.namespace, "chat_history": list(session.chat_history)}
+
+    def get(self, conversation_id: str) -> Optional[dict]:
+        with self._lock:
+            session = self._touch(conversation_id, time.time())
+            return self._as_dict(session) if session else None
+
+    def create(self, conversation_id: str, namespace: Optional[str] = None) -> dict:
+        with self._lock:
+            return self._as_dict(self._create(conversation_id, namespace, time.time()))
+
+    def append_message(self, conversation_id: str, role: str, text: str) -> List[Dict]:
+        """Appends to the conversation (starting a fresh one if unknown) and returns its history."""
+        now = time.time()
+        with self._lock:
+            session = self._touch(conversation_id, now) or self._create(conversation_id, None, now)
+            session.chat_history.append({"role": role, "text": text})
+            return list(session.chat_history)
+
+    def delete(self, conversation_id: str):
+        with self._lock:
+            self._sessions.pop(conversation_id, None)
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class SQLiteSessionStore:
+    """
+    Sessions in a SQLite file shared by every worker process on the host.
+
+    Messages carry a per-conversation sequence number, so appending and
+    trimming the history to `max_messages` are primary-key operations.
+    Expired and least recently used sessions are purged periodically.
+    """
+
+    def __init__(self, path: str = SESSION_DB_PATH, max_sessions: int = SESSION_MAX_SESSIONS,
+                 ttl: int = SESSION_TTL_SECONDS, max_messages: int = CHAT_HISTORY_MAX_MESSAGES):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_messages = max_messages
+        self._last_sweep = 0.0
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " conversation_id TEXT PRIMARY KEY,"
+            " namespace TEXT,"
+            " next_seq INTEGER NOT NULL DEFAULT 0,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_last_access ON sessions(last_access)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            " conversation_id TEXT NOT NULL REFERENCES sessions(conversation_id) ON DELETE CASCADE,"
+            " seq INTEGER NOT NULL,"
+            " role TEXT NOT NULL,"
+            " text TEXT NOT NULL,"
+            " PRIMARY KEY (conversation_id, seq))"
+        )
+        self._conn.commit()
+
+    def _touch(self, conversation_id: str, now: float) -> Optional[tuple]:
+        row = self._conn.execute(
+            "SELECT namespace, next_seq, last_access FROM sessions WHERE conversation_id = ?", (conversation_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[2] + self.ttl < now:
+            self._conn.execute("DELETE FROM sessions WHERE conversation_id = ?", (conversation_id,))
+            return None
+        self._conn.execute("UPDATE sessions SET last_access = ? WHERE conversation_id = ?", (now, conversation_id))
+        return row
+
+    def _create(self, conversation_id: str, namespace: Optional[str], now: float):
+        self._conn.execute("DELETE FROM sessions WHERE conversation_id = ?", (conversation_id,))
+        self._conn.execute(
+            "INSERT INTO sessions (conversation_id, namespace, next_seq, last_access) VALUES (?, ?, 0, ?)",
+            (conversation_id, namespace, now)
+        )
+        self._maybe_sweep(now)
+        return (namespace, 0, now)
+
+    def _maybe_sweep(self, now: float):
+        if now - self._last_sweep < SESSION_SWEEP_INTERVAL_SECONDS:
+            return
+        self._last_sweep = now
+        self._conn.execute("DELETE FROM sessions WHERE last_access < ?", (now - self.ttl,))
+        # Other workers write to the same file, so trim by rank rather than a counter kept in memory
+        self._conn.execute(
+            "DELETE FROM sessions WHERE conversation_id IN "
+            "(SELECT conversation_id FROM sessions ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (self.max_sessions,)
+        )
+
+    def _history(self, conversation_id: str) -> List[Dict]:
+        rows = self._conn.execute(
+            "SELECT role, text FROM messages WHERE conversation_id = ? ORDER BY seq", (conversation_id,)
+        ).fetchall()
+        return [{"role": role, "text": text} for role, text in rows]
+
+    def get(self, conversation_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._touch(conversation_id, time.time())
+            self._conn.commit()
+            if row is None:
+                return None
+            return {"namespace": row[0], "chat_history": self._history(conversation_id)}
+
+    def create(self, conversation_id: str, namespace: Optional[str] = None) -> dict:
+        with self._lock:
+            self._create(conversation_id, namespace, time.time())
+            self._conn.commit()
+            return {"namespace": namespace, "chat_history": []}
+
+    def append_message(self, conversation_id: str, role: str, text: str) -> List[Dict]:
+        """Appends to the conversation (starting a fresh one if unknown) and returns its history."""
+        now = time.time()
+        with self._lock:
+            row = self._touch(conversation_id, now) or self._create(conversation_id, None, now)
+            seq = row[1]
+            self._conn.execute(
+                "INSERT INTO messages (conversation_id, seq, role, text) VALUES (?, ?, ?, ?)",
+                (conversation_id, seq, role, text)
+            )
+            self._conn.execute(
+                "UPDATE sessions SET next_seq = ? WHERE conversation_id = ?", (seq + 1, conversation_id)
+            )
+            # Only the message that just fell out of the window needs deleting
+            self._conn.execute(
+                "DELETE FROM messages WHERE conversation_id = ? AND seq = ?",
+                (conversation_id, seq - self.max_messages)
+            )
+            self._conn.commit()
+            return self._history(conversation_id)
+
+    def delete(self, conversation_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE conversation_id = ?", (conversation_id,))
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+_SESSION_STORE = None
+_SESSION_STORE_LOCK = threading.Lock()
+
+
+def get_session_store():
+    """Return the process-wide session store, creating it on first use."""
+    global _SESSION_STORE
+    with _SESSION_STORE_LOCK:
+        if _SESSION_STORE is None:
+            _SESSION_STORE = SQLiteSessionStore() if SESSION_BACKEND == "sqlite" else MemorySessionStore()
+        return _SESSION_STORE
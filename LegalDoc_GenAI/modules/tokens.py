@@ -0,0 +1,91 @@
+# modules/tokens.py
+import os
+import re
+from functools import lru_cache
+from typing import Callable, List
+
+import tiktoken
+
+# Gemini does not ship a local tokenizer; cl100k_base is a close enough proxy for budgeting
+TOKEN_ENCODING = os.getenv("TOKEN_ENCODING", "cl100k_base")
+
+
+class _ApproxEncoding:
+    """~4 characters per token; used when the BPE file cannot be loaded (e.g. offline hosts)."""
+
+    def encode(self, text: str, disallowed_special=()) -> List[str]:
+        return [text[i:i + 4] for i in range(0, len(text), 4)]
+
+    def decode(self, tokens: List[str]) -> str:
+        return "".join(tokens)
+
+    def count(self, text: str) -> int:
+        return -(-len(text) // 4)
+
+
+@lru_cache(maxsize=None)
+def get_encoding(name: str = TOKEN_ENCODING):
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        print(f"Could not load tiktoken encoding '{name}', falling back to ~4 chars per token: {e}")
+        return _ApproxEncoding()
+
+
+@lru_cache(maxsize=None)
+def get_token_counter(name: str = TOKEN_ENCODING) -> Callable[[str], int]:
+    """Fastest available token-count function; special tokens are counted as plain text."""
+    enc = get_encoding(name)
+    if isinstance(enc, _ApproxEncoding):
+        return enc.count
+    return lambda text: len(enc.encode_ordinary(text))
+
+
+def count_tokens(text: str) -> int:
+    return get_token_counter()(text)
+
+
+def split_by_token_budget(text: str, max_tokens: int) -> List[str]:
+    """
+    Split text into sections of at most `max_tokens` tokens.
+
+    Sections are packed from whole paragraphs where possible, then whole
+    lines; only a single line longer than the budget is cut on token
+    boundaries.
+    """
+    enc = get_encoding()
+    sections: List[str] = []
+
+    # (split pattern, joiner) from coarsest to finest
+    levels = [(r"\n\s*\n", "\n\n"), (r"\n", "\n")]
+
+    def _pack(text: str, level: int):
+        pattern, joiner = levels[level]
+        current: List[str] = []
+        current_tokens = 0
+        sep_tokens = len(enc.encode(joiner))
+        for piece in re.split(pattern, text):
+            if not piece.strip():
+                continue
+            n = len(enc.encode(piece, disallowed_special=()))
+            if n > max_tokens:
+                if current:
+                    sections.append(joiner.join(current))
+                    current, current_tokens = [], 0
+                if level + 1 < len(levels):
+                    _pack(piece, level + 1)
+                else:
+                    tokens = enc.encode(piece, disallowed_special=())
+                    for i in range(0, len(tokens), max_tokens):
+                        sections.append(enc.decode(tokens[i:i + max_tokens]))
+                continue
+            if current and current_tokens + sep_tokens + n > max_tokens:
+                sections.append(joiner.join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += n + sep_tokens
+        if current:
+            sections.append(joiner.join(current))
+
+    _pack(text, 0)
+    return sections
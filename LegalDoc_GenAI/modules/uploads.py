@@ -0,0 +1,67 @@
+# modules/uploads.py
+import os
+import hashlib
+import tempfile
+from pathlib import Path
+from dataclasses import dataclass
+from typing import List, Union
+
+from fastapi import UploadFile
+
+from modules.concurrency import run_blocking
+
+# Uploads up to this size are parsed straight from memory; larger ones are
+# spooled to an anonymous, uniquely named temporary file
+UPLOAD_MEMORY_MAX_BYTES = int(os.getenv("UPLOAD_MEMORY_MAX_BYTES", str(64 * 1024 * 1024)))
+UPLOAD_READ_BLOCK_BYTES = 1024 * 1024
+
+
+@dataclass
+class UploadedDocument:
+    filename: str
+    source: Union[bytes, Path]  # accepted by the loaders in modules/chunking and modules/extraction
+    content_hash: str  # same SHA-256 as artifact_store.content_hash
+    size: int
+
+    def close(self):
+        if isinstance(self.source, Path):
+            self.source.unlink(missing_ok=True)
+
+
+async def read_upload(file: UploadFile, memory_max_bytes: int = UPLOAD_MEMORY_MAX_BYTES) -> UploadedDocument:
+    """
+    Reads an upload in blocks, hashing as it goes. The caller must close()
+    the result to remove a spooled file.
+    """
+    filename = Path(file.filename or "").name
+    digest = hashlib.sha256()
+    blocks: List[bytes] = []
+    size = 0
+    spool = None
+    try:
+        while True:
+            block = await file.read(UPLOAD_READ_BLOCK_BYTES)
+            if not block:
+                break
+            digest.update(block)
+            size += len(block)
+            if spool is None and size > memory_max_bytes:
+                spool = tempfile.NamedTemporaryFile(prefix="upload-", suffix=Path(filename).suffix, delete=False)
+                await run_blocking("io", spool.writelines, blocks)
+                blocks = []
+            if spool is not None:
+                await run_blocking("io", spool.write, block)
+            else:
+                blocks.append(block)
+    except BaseException:
+        if spool is not None:
+            spool.close()
+            Path(spool.name).unlink(missing_ok=True)
+        raise
+
+    if spool is not None:
+        spool.close()
+        source = Path(spool.name)
+    else:
+        source = b"".join(blocks)
+    return UploadedDocument(filename=filename, source=source, content_hash=digest.hexdigest(), size=size)
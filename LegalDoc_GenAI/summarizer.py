@@ -1,67 +1,211 @@
 # LegalDoc_GenAI/summarizer.py
 
 import os
+import time
+import asyncio
+from functools import lru_cache
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain.output_parsers.pydantic import PydanticOutputParser
-from models import KmrlDocSummary, LastDateResponse, Department, DepartmentPredictionResponse
+from models import KmrlDocSummary, LastDateResponse, LastDateExtractor, Department, DepartmentPredictionResponse
 from datetime import date
-from pydantic import BaseModel, Field
 from typing import Optional, List
+from modules.concurrency import run_blocking, run_cpu, run_limited
+from modules.rate_limiter import get_limiter
+from modules.tokens import count_tokens, split_by_token_budget
+from modules.result_cache import result_cache, make_result_key
+from modules.date_extraction import prepass_last_date
+from modules.department_classifier import DEPARTMENT_CLASSIFIER_SKIP_LLM, classify_department
 
+SUMMARIZER_MODEL = "gemini-2.0-flash"
+
+# Bump the version of an operation whenever its prompt changes, so cached results are not reused
+PROMPT_VERSIONS = {
+    "summary": "1",
+    "department": "3",
+    "last_date": "4",
+}
+
+# Chains are stateless, so each (chain kind, department, api key) is built once and
+# reused by every request; all chains share one model client per api key.
+CHAIN_CACHE_SIZE = 64
+
+@lru_cache(maxsize=8)
 def get_model(api_key: str):
     return ChatGoogleGenerativeAI(
-        model="gemini-2.0-flash",
+        model=SUMMARIZER_MODEL,
         temperature=0.0,
         max_output_tokens=8192,
-        google_api_key=api_key
+        google_api_key=api_key,
+        # The shared limiter retries; a retrying client would multiply its attempts
+        max_retries=1
     )
 
-def generate_document_summary(document_content: str, language: str, department: str, google_api_key: str) -> KmrlDocSummary:
-    model = get_model(google_api_key)
-    parser = PydanticOutputParser(pydantic_object=KmrlDocSummary)
+# Documents up to this many tokens are summarized in one call; longer ones use map-reduce
+SUMMARY_SINGLE_CALL_MAX_TOKENS = int(os.getenv("SUMMARY_SINGLE_CALL_MAX_TOKENS", "24000"))
+SUMMARY_SECTION_TOKENS = int(os.getenv("SUMMARY_SECTION_TOKENS", "8000"))
+SUMMARY_MAP_CONCURRENCY = int(os.getenv("SUMMARY_MAP_CONCURRENCY", "8"))
 
-    department_instructions = {
-        "Operations Department": "Focus on actionable items, deadlines, and personnel. Financials and compliance are less critical.",
-        "Engineering & Maintenance Department": "Prioritize equipment details, actionable maintenance tasks, and safety risks. Financials are secondary.",
-        "Procurement & Stores Department": "Extract equipment details, financial implications (costs, vendors), and deadlines.",
-        "Safety & Regulatory Compliance Department": "Focus heavily on compliance risks, deadlines, and actionable items to ensure adherence.",
-        "Human Resources (HR)": "Extract information related to personnel, policy changes, and deadlines.",
-        "Finance & Accounts Department": "Prioritize financial implications, vendor details, and deadlines. Technical details are less important.",
-        "Executive / Board of Directors": "Provide a high-level summary focusing on key points, financial implications, and major risks."
-    }
+DEPARTMENT_INSTRUCTIONS = {
+    "Operations Department": "Focus on actionable items, deadlines, and personnel. Financials and compliance are less critical.",
+    "Engineering & Maintenance Department": "Prioritize equipment details, actionable maintenance tasks, and safety risks. Financials are secondary.",
+    "Procurement & Stores Department": "Extract equipment details, financial implications (costs, vendors), and deadlines.",
+    "Safety & Regulatory Compliance Department": "Focus heavily on compliance risks, deadlines, and actionable items to ensure adherence.",
+    "Human Resources (HR)": "Extract information related to personnel, policy changes, and deadlines.",
+    "Finance & Accounts Department": "Prioritize financial implications, vendor details, and deadlines. Technical details are less important.",
+    "Executive / Board of Directors": "Provide a high-level summary focusing on key points, financial implications, and major risks."
+}
 
-    specific_instruction = department_instructions.get(department, "Provide a balanced summary covering all key aspects.")
+def _summary_system_message(department: str) -> str:
+    specific_instruction = DEPARTMENT_INSTRUCTIONS.get(department, "Provide a balanced summary covering all key aspects.")
+    return f"You are an expert assistant for KMRL (Kochi Metro Rail Limited). Your task is to summarize documents for the {department}. {specific_instruction} Respond in a structured format."
+
+@lru_cache(maxsize=CHAIN_CACHE_SIZE)
+def _build_summary_chain(department: str, google_api_key: str):
+    model = get_model(google_api_key)
+    parser = PydanticOutputParser(pydantic_object=KmrlDocSummary)
 
     prompt = ChatPromptTemplate.from_messages([
-        ("system", f"You are an expert assistant for KMRL (Kochi Metro Rail Limited). Your task is to summarize documents for the {department}. {specific_instruction} Respond in a structured format."),
+        ("system", _summary_system_message(department)),
         ("human", "Summarize the following document for the {department} in {language}. "
          "The document content is: \n\n{document_content}\n\n"
          "{format_instructions}"
         )
     ]).partial(format_instructions=parser.get_format_instructions())
     
-    chain = prompt | model | parser
-    
-    try:
-        summary = chain.invoke({
+    return prompt | model | parser
+
+@lru_cache(maxsize=CHAIN_CACHE_SIZE)
+def _build_section_chain(department: str, google_api_key: str):
+    """Map step: summarize one section of a long document."""
+    model = get_model(google_api_key)
+    parser = PydanticOutputParser(pydantic_object=KmrlDocSummary)
+
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", _summary_system_message(department)),
+        ("human", "The following is section {section_number} of {section_count} of a longer document. "
+         "Summarize this section for the {department} in {language}, keeping every deadline, figure and named "
+         "party it mentions. The section content is: \n\n{document_content}\n\n"
+         "{format_instructions}"
+        )
+    ]).partial(format_instructions=parser.get_format_instructions())
+
+    return prompt | model | parser
+
+@lru_cache(maxsize=CHAIN_CACHE_SIZE)
+def _build_reduce_chain(department: str, google_api_key: str):
+    """Reduce step: merge section summaries into one document summary."""
+    model = get_model(google_api_key)
+    parser = PydanticOutputParser(pydantic_object=KmrlDocSummary)
+
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", _summary_system_message(department)),
+        ("human", "Below are summaries of consecutive sections of one document, in order. Combine them into a "
+         "single summary of the whole document for the {department} in {language}. Merge duplicates, keep the "
+         "most important points, and pick one category and urgency level for the whole document. "
+         "Section summaries: \n\n{document_content}\n\n"
+         "{format_instructions}"
+        )
+    ]).partial(format_instructions=parser.get_format_instructions())
+
+    return prompt | model | parser
+
+def _result_key(operation: str, document_content: str, language: str = "", department: str = "") -> str:
+    return make_result_key(document_content, operation, PROMPT_VERSIONS[operation], SUMMARIZER_MODEL, language, department)
+
+def _input_tokens(inputs: dict) -> int:
+    return sum(count_tokens(v) for v in inputs.values() if isinstance(v, str))
+
+async def _ainvoke(chain, inputs: dict):
+    """Runs a chain within the shared LLM quota and concurrency limit, retrying throttled and failed calls."""
+    return await get_limiter("llm").acall(lambda: run_limited("llm", chain.ainvoke, inputs), tokens=_input_tokens(inputs))
+
+def _section_inputs(sections: List[str], language: str, department: str) -> List[dict]:
+    return [
+        {
             "language": language,
             "department": department,
-            "document_content": document_content
-        })
-        return summary
-    except Exception as e:
-        return KmrlDocSummary(
-            category="Error",
-            description="Could not generate a summary due to an error.",
-            key_points=[f"An error occurred: {str(e)}"],
-            urgency_level="Low"
-        )
+            "document_content": section,
+            "section_number": i + 1,
+            "section_count": len(sections),
+        }
+        for i, section in enumerate(sections)
+    ]
+
+def _partials_to_reduce_input(partials: List[KmrlDocSummary]) -> List[str]:
+    """Serialize partial summaries, grouping them so each group fits one reduce call."""
+    rendered = [f"Section {i + 1}:\n{p.model_dump_json(exclude_none=True)}" for i, p in enumerate(partials)]
+    groups, current, current_tokens = [], [], 0
+    for text in rendered:
+        n = count_tokens(text)
+        # At least two per group, so every reduce round shrinks the list
+        if len(current) >= 2 and current_tokens + n > SUMMARY_SINGLE_CALL_MAX_TOKENS:
+            groups.append("\n\n".join(current))
+            current, current_tokens = [], 0
+        current.append(text)
+        current_tokens += n
+    if current:
+        groups.append("\n\n".join(current))
+    return groups
+
+def _is_long(document_content: str) -> bool:
+    return count_tokens(document_content) > SUMMARY_SINGLE_CALL_MAX_TOKENS
+
+async def _map_reduce_summary(document_content: str, language: str, department: str, google_api_key: str) -> KmrlDocSummary:
+    sections = await run_cpu(split_by_token_budget, document_content, SUMMARY_SECTION_TOKENS)
+    print(f"Long document: summarizing {len(sections)} sections concurrently")
+
+    map_slots = asyncio.Semaphore(SUMMARY_MAP_CONCURRENCY)
 
-def predict_department(document_content: str, google_api_key: str) -> DepartmentPredictionResponse:
+    async def _run(chain, inputs):
+        async with map_slots:
+            return await _ainvoke(chain, inputs)
+
+    section_chain = _build_section_chain(department, google_api_key)
+    # A section that fails even after retries fails the summary rather than silently going missing
+    partials = await asyncio.gather(
+        *[_run(section_chain, inputs) for inputs in _section_inputs(sections, language, department)]
+    )
+
+    reduce_chain = _build_reduce_chain(department, google_api_key)
+    # Reduce hierarchically if the partial summaries themselves exceed one call
+    while True:
+        groups = _partials_to_reduce_input(partials)
+        partials = await asyncio.gather(*[
+            _run(reduce_chain, {"language": language, "department": department, "document_content": g})
+            for g in groups
+        ])
+        if len(partials) == 1:
+            return partials[0]
+
+async def agenerate_document_summary(document_content: str, language: str, department: str, google_api_key: str, use_cache: bool = True) -> KmrlDocSummary:
     """
-    Predicts all relevant departments for a given document.
+    Summarizes a document for a department. Results are cached by content,
+    language and department; use_cache=False forces a fresh call (the new
+    result still replaces the cached one).
     """
+    key = _result_key("summary", document_content, language, department)
+    if use_cache:
+        cached = await run_blocking("io", result_cache.get, key)
+        if cached is not None:
+            return KmrlDocSummary.model_validate_json(cached)
+
+    # Tokenizing a large tender takes long enough to stall other requests
+    if await run_cpu(_is_long, document_content):
+        summary = await _map_reduce_summary(document_content, language, department, google_api_key)
+    else:
+        chain = _build_summary_chain(department, google_api_key)
+        summary = await _ainvoke(chain, {
+            "language": language,
+            "department": department,
+            "document_content": document_content
+        })
+
+    await run_blocking("io", result_cache.set, key, summary.model_dump_json())
+    return summary
+
+@lru_cache(maxsize=CHAIN_CACHE_SIZE)
+def _build_department_chain(google_api_key: str):
     model = get_model(google_api_key)
     parser = PydanticOutputParser(pydantic_object=DepartmentPredictionResponse)
 
@@ -70,37 +214,99 @@ def predict_department(document_content: str, google_api_key: str) -> Department
         ("human", "Document content: \n\n{document_content}\n\n{format_instructions}")
     ]).partial(format_instructions=parser.get_format_instructions())
 
-    chain = prompt | model | parser
+    return prompt | model | parser
 
-    try:
-        response = chain.invoke({"document_content": document_content})
+def _local_department_fallback(local, error: Exception) -> DepartmentPredictionResponse:
+    """
+    The low-confidence local prediction, when the LLM fails; not cached, so the
+    next request asks the LLM again. Without one the error is raised.
+    """
+    if not local.departments:
+        raise error
+    print(f"Department prediction fell back to the local classifier: {error}")
+    return DepartmentPredictionResponse(predicted_departments=local.departments)
+
+async def apredict_department(document_content: str, google_api_key: str, use_cache: bool = True) -> DepartmentPredictionResponse:
+    """Predicts all relevant departments for a given document."""
+    key = _result_key("department", document_content)
+    if use_cache:
+        cached = await run_blocking("io", result_cache.get, key)
+        if cached is not None:
+            return DepartmentPredictionResponse.model_validate_json(cached)
+
+    # The local classifier settles clear-cut documents in milliseconds; the LLM sees the rest
+    local = await run_cpu(classify_department, document_content)
+    if DEPARTMENT_CLASSIFIER_SKIP_LLM and local.is_confident:
+        response = DepartmentPredictionResponse(predicted_departments=local.departments)
+        await run_blocking("io", result_cache.set, key, response.model_dump_json())
         return response
+
+    chain = _build_department_chain(google_api_key)
+
+    try:
+        response = await _ainvoke(chain, {"document_content": document_content})
     except Exception as e:
-        # Fallback in case of an error to a default list
-        return DepartmentPredictionResponse(predicted_departments=[Department.OPERATIONS])
+        return _local_department_fallback(local, e)
 
+    await run_blocking("io", result_cache.set, key, response.model_dump_json())
+    return response
 
-def extract_last_date(document_content: str, google_api_key: str) -> Optional[date]:
-    """
-    Extracts the last date to take action from a document.
-    """
-    model = get_model(google_api_key)
-    
-    class LastDateExtractor(BaseModel):
-        last_date: Optional[date] = Field(None, description="The last date to take action, in YYYY-MM-DD format. Return null if not found.")
 
+@lru_cache(maxsize=CHAIN_CACHE_SIZE)
+def _build_last_date_chain(google_api_key: str):
+    model = get_model(google_api_key)
     parser = PydanticOutputParser(pydantic_object=LastDateExtractor)
     
     prompt = ChatPromptTemplate.from_messages([
         ("system", "You are an expert legal assistant. Extract the final deadline or last date for action mentioned in the document. The date should be in YYYY-MM-DD format."),
-        ("human", "Document content: \n\n{document_content}\n\n{format_instructions}")
+        ("human", "Excerpts of the document around every date it mentions: \n\n{document_content}\n\n{format_instructions}")
     ]).partial(format_instructions=parser.get_format_instructions())
 
-    chain = prompt | model | parser
-    
-    try:
-        response = chain.invoke({"document_content": document_content})
-        return response.last_date
-    except Exception as e:
-        print(f"Error extracting date: {e}")
-        return None
\ No newline at end of file
+    return prompt | model | parser
+
+async def aextract_last_date(document_content: str, google_api_key: str, use_cache: bool = True) -> Optional[date]:
+    """Extracts the last date to take action from a document."""
+    key = _result_key("last_date", document_content)
+    if use_cache:
+        cached = await run_blocking("io", result_cache.get, key)
+        if cached is not None:
+            return LastDateResponse.model_validate_json(cached).last_date
+
+    # Most circulars state the deadline plainly; only ambiguous ones reach the LLM, and then only the date windows
+    prepass = await run_cpu(prepass_last_date, document_content)
+    if prepass.decided:
+        await run_blocking("io", result_cache.set, key, LastDateResponse(last_date=prepass.last_date).model_dump_json())
+        return prepass.last_date
+
+    chain = _build_last_date_chain(google_api_key)
+
+    # Errors are raised: None would be indistinguishable from a document without a deadline
+    response = await _ainvoke(chain, {"document_content": prepass.context})
+
+    await run_blocking("io", result_cache.set, key, LastDateResponse(last_date=response.last_date).model_dump_json())
+    return response.last_date
+
+
+# Synchronous entry points for scripts and notebooks; the service awaits the
+# async functions above. Not for use inside a running event loop.
+
+def generate_document_summary(document_content: str, language: str, department: str, google_api_key: str, use_cache: bool = True) -> KmrlDocSummary:
+    return asyncio.run(agenerate_document_summary(document_content, language, department, google_api_key, use_cache))
+
+def predict_department(document_content: str, google_api_key: str, use_cache: bool = True) -> DepartmentPredictionResponse:
+    return asyncio.run(apredict_department(document_content, google_api_key, use_cache))
+
+def extract_last_date(document_content: str, google_api_key: str, use_cache: bool = True) -> Optional[date]:
+    return asyncio.run(aextract_last_date(document_content, google_api_key, use_cache))
+
+
+def warm_up_chains(google_api_key: str) -> float:
+    """Builds every chain for the known departments ahead of the first request; returns seconds taken."""
+    start = time.perf_counter()
+    for department in Department:
+        _build_summary_chain(department.value, google_api_key)
+        _build_section_chain(department.value, google_api_key)
+        _build_reduce_chain(department.value, google_api_key)
+    _build_department_chain(google_api_key)
+    _build_last_date_chain(google_api_key)
+    return time.perf_counter() - start
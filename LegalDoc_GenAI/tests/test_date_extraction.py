@@ -0,0 +1,41 @@
+# tests/test_date_extraction.py
+from datetime import date
+
+from modules.date_extraction import find_date_candidates, prepass_last_date
+
+
+def test_corrigendum_takes_the_revised_date():
+    result = prepass_last_date("Corrigendum: the bid due date is extended from 10.03.2026 to 24.03.2026.")
+    assert result.decided
+    assert result.last_date == date(2026, 3, 24)
+
+
+def test_plain_deadline_is_decided_locally():
+    result = prepass_last_date("Last date for submission of bids: 15.03.2026. Issued on 01.02.2026.")
+    assert result.decided
+    assert result.last_date == date(2026, 3, 15)
+
+
+def test_dates_without_cues_go_to_the_llm():
+    result = prepass_last_date("Works to be completed within 45 days of 01.04.2026.")
+    assert not result.decided
+    assert "01.04.2026" in result.context
+
+
+def test_text_without_dates_goes_to_the_llm():
+    text = "Bids are accepted until the fifteenth of next month."
+    result = prepass_last_date(text)
+    assert not result.decided
+    assert result.context == text
+
+
+def test_dotted_section_numbers_are_not_dates():
+    assert find_date_candidates("As per clause 2.1.12 the bidder shall comply.") == []
+    assert find_date_candidates("Refer to 4.2.1.12 of the conditions.") == []
+    values = [c.value for c in find_date_candidates("Clause 2.1.12: submit on or before 05.04.2026.")]
+    assert values == [date(2026, 4, 5)]
+
+
+def test_overlapping_patterns_yield_one_candidate():
+    candidates = find_date_candidates("Bids are due 2026-03-24 and on 24th March 2026.")
+    assert sorted(c.value for c in candidates) == [date(2026, 3, 24)] * 2
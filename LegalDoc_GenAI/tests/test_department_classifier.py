@@ -0,0 +1,23 @@
+# tests/test_department_classifier.py
+from models import Department
+from modules.department_classifier import DepartmentClassifier
+
+
+def test_clear_tender_skips_the_llm():
+    scores = DepartmentClassifier().classify(
+        "e-Tender notice: KMRL invites bids through e-procurement. Earnest money deposit (EMD) with the "
+        "technical bid; pre-bid meeting on 05.03.2026; last date for bid submission 20.03.2026."
+    )
+    assert scores.is_confident
+    assert scores.departments[0] == Department.PROCUREMENT_STORES
+
+
+def test_single_matching_word_goes_to_the_llm():
+    for text in ["document", "Please find the minutes attached."]:
+        assert not DepartmentClassifier().classify(text).is_confident
+
+
+def test_unknown_vocabulary_goes_to_the_llm():
+    scores = DepartmentClassifier().classify("Thank you for your email. I will get back to you next week.")
+    assert not scores.is_confident
+    assert scores.confidence == 0.0
@@ -0,0 +1,95 @@
+# tests/test_rate_limiter.py
+import asyncio
+
+import pytest
+from google.api_core import exceptions as google_exceptions
+from langchain_core.exceptions import OutputParserException
+
+from modules import concurrency, rate_limiter
+from modules.concurrency import run_limited
+from modules.rate_limiter import GeminiLimiter, is_rate_limited, is_retryable, is_unavailable
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "GEMINI_BACKOFF_BASE_SECONDS", 0.0)
+
+
+def _failing(error):
+    calls = []
+
+    def func():
+        calls.append(1)
+        raise error
+
+    return func, calls
+
+
+def test_parse_error_quoting_model_output_is_not_retried():
+    # Malformed KmrlDocSummary output echoes field names and document text
+    error = OutputParserException(
+        'Failed to parse KmrlDocSummary from completion {"deadlines": ["quota 429 unavailable, timed out"]}'
+    )
+    assert not is_rate_limited(error)
+    assert not is_unavailable(error)
+    assert not is_retryable(error)
+
+    limiter = GeminiLimiter("test", max_retries=5, failure_threshold=3, cooldown=30)
+    func, calls = _failing(error)
+    for _ in range(3):
+        with pytest.raises(OutputParserException):
+            limiter.call(func)
+    assert len(calls) == 3
+    assert limiter.stats["retries"] == 0
+    assert limiter.snapshot()["circuit"] == "closed"
+
+
+def test_plain_error_mentioning_quota_is_not_retried():
+    assert not is_retryable(ValueError("Clause 7: the quota of 429 units is unavailable before the deadline"))
+
+
+def test_outages_are_classified_by_type_and_status_code():
+    assert is_unavailable(google_exceptions.ServiceUnavailable("down"))
+    assert is_rate_limited(google_exceptions.ResourceExhausted("slow down"))
+
+    class HTTPError(Exception):
+        status_code = 503
+
+    assert is_unavailable(HTTPError("upstream"))
+
+
+def test_repeated_outages_open_the_circuit():
+    limiter = GeminiLimiter("test", max_retries=1, failure_threshold=2, cooldown=30)
+    func, calls = _failing(google_exceptions.ServiceUnavailable("down"))
+    with pytest.raises(google_exceptions.ServiceUnavailable):
+        limiter.call(func)
+    assert len(calls) == 2
+    assert limiter.snapshot()["circuit"] == "open"
+    with pytest.raises(rate_limiter.CircuitOpenError):
+        limiter.call(func)
+
+
+def test_backoff_releases_the_concurrency_slot(monkeypatch):
+    monkeypatch.setitem(concurrency.UPSTREAM_LIMITS, "llm", 1)
+    monkeypatch.setattr(rate_limiter.random, "uniform", lambda a, b: 0.2)
+    limiter = GeminiLimiter("test", max_retries=1)
+    order = []
+
+    async def flaky():
+        if not order:
+            order.append("failed")
+            raise google_exceptions.ServiceUnavailable("down")
+        order.append("retried")
+
+    async def other():
+        order.append("other")
+
+    async def main():
+        await asyncio.gather(
+            limiter.acall(lambda: run_limited("llm", flaky)),
+            limiter.acall(lambda: run_limited("llm", other)),
+        )
+
+    asyncio.run(main())
+    # The other call takes the only slot while the failed one backs off
+    assert order == ["failed", "other", "retried"]
@@ -1,16 +1,11 @@
 # app/utils.py
 # (Example for PDF, you can expand for other formats)
-import fitz  # PyMuPDF
+from modules.extraction import PdfSource, extract_pdf_text
 
-def extract_text_from_pdf(file_path: str) -> str:
-    """Extracts text from a PDF file."""
-    text = ""
+def extract_text_from_pdf(source: PdfSource) -> str:
+    """Extracts text from a PDF given its path or its bytes."""
     try:
-        doc = fitz.open(file_path)
-        for page in doc:
-            text += page.get_text()
-        doc.close()
+        return extract_pdf_text(source)
     except Exception as e:
         print(f"Error extracting text from PDF: {e}")
         return ""
-    return text
\ No newline at end of file
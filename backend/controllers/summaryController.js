@@ -132,7 +132,7 @@ export async function regenerateSummary(req, res) {
     });
 
     // Step 2: Call FastAPI service
-    const summaryData = await getSummaryFromFastAPI({ path: tempFilePath }, language,department);
+    const summaryData = await getSummaryFromFastAPI({ path: tempFilePath }, language,department, true);
 
     // Step 3: Insert into summaries table
     const resQuery = `UPDATE summaries SET summary = $1 WHERE doc_id = $2 AND language = $3 AND department = $4 RETURNING *`
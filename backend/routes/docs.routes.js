@@ -73,14 +73,15 @@ router.post("/upload", verifyJWT, upload.single("docs"), async (req, res) => {
 
     const userId = req.user.id;
     let lastDate = null;
+    let predictedDepartments = null;
 
-    // --- Extract last_date from FastAPI ---
+    // --- Extract last_date and related departments from FastAPI in one call ---
     try {
       const formData = new FormData();
       formData.append("file", req.file.buffer, req.file.originalname);
 
-      const dateResponse = await axios.post(
-        `${FASTAPI_URL}/extract-last-date/`,
+      const analyzeResponse = await axios.post(
+        `${FASTAPI_URL}/analyze/`,
         formData,
         {
           headers: {
@@ -88,10 +89,12 @@ router.post("/upload", verifyJWT, upload.single("docs"), async (req, res) => {
           },
         }
       );
-      lastDate = dateResponse.data.last_date;
+      lastDate = analyzeResponse.data.last_date;
+      predictedDepartments = analyzeResponse.data.predicted_departments;
       console.log(`Extracted last date: ${lastDate}`);
+      console.log("Analyze timings:", analyzeResponse.data.timings);
     } catch (llmError) {
-      console.error("Error extracting date from document:", llmError.message);
+      console.error("Error analyzing document:", llmError.message);
     }
 
     // --- Save document in docs table ---
@@ -119,26 +122,11 @@ router.post("/upload", verifyJWT, upload.single("docs"), async (req, res) => {
       );
     }
 
-    // --- Call GenAI server to get related departments ---
+    // --- Related departments come from the analyze call above ---
     let relatedDepartments = [];
-    try {
-      const formData = new FormData();
-      formData.append("file", req.file.buffer, req.file.originalname);
-
-      const genAiResponse = await axios.post(
-        `${FASTAPI_URL}/predict-department/`,
-        formData,
-        {
-          headers: {
-            ...formData.getHeaders(),
-          },
-        }
-      );
-      console.log(genAiResponse.data)
-      relatedDepartments = genAiResponse.data.predicted_departments;
-    } catch (genAiError) {
-      console.error("Error getting related departments:", genAiError.message);
-
+    if (predictedDepartments) {
+      relatedDepartments = predictedDepartments;
+    } else {
       // fallback: assign user’s own department
       const userDeptResult = await pool.query(
         `SELECT department FROM users WHERE id = $1`,
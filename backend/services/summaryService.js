@@ -6,12 +6,14 @@ import fs from 'fs';
 // The URL of your FastAPI server
 const FASTAPI_URL = process.env.FASTAPI_URL || 'http://localhost:8000';
 
-export async function getSummaryFromFastAPI(file, language,department) {
+export async function getSummaryFromFastAPI(file, language,department, regenerate = false) {
   try {
     const formData = new FormData();
     formData.append('file', fs.createReadStream(file.path));
     formData.append('language', language);
     formData.append('department',department)
+    // Bypass the FastAPI result cache when the user explicitly regenerates
+    formData.append('regenerate', String(regenerate))
 
     const response = await axios.post(`${FASTAPI_URL}/summarize/`, formData, {
       headers: {